@@ -116,6 +116,23 @@ def limited(items, request, max_limit=CONF.osapi_max_limit):
                     will cause exc.HTTPBadRequest() exceptions to be raised.
     :kwarg max_limit: The maximum number of items to return from 'items'
     """
+    offset, limit = _get_offset_limit(request, max_limit)
+    range_end = offset + limit
+    return items[offset:range_end]
+
+
+def get_query_limit(request, max_limit=CONF.osapi_max_limit):
+    """Return how many items limited() may need for request.
+
+    Lets callers bound a database query to the items that limited() can
+    return from its result, instead of fetching them all.
+    """
+    offset, limit = _get_offset_limit(request, max_limit)
+    return offset + limit
+
+
+def _get_offset_limit(request, max_limit):
+    """Extract the offset and the effective limit from request or fail."""
     try:
         offset = int(request.GET.get('offset', 0))
     except ValueError:
@@ -136,9 +153,7 @@ def limited(items, request, max_limit=CONF.osapi_max_limit):
         msg = _('offset param must be positive')
         raise webob.exc.HTTPBadRequest(explanation=msg)
 
-    limit = min(max_limit, limit or max_limit)
-    range_end = offset + limit
-    return items[offset:range_end]
+    return offset, min(max_limit, limit or max_limit)
 
 
 def limited_by_marker(items, request, max_limit=CONF.osapi_max_limit):
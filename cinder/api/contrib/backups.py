@@ -28,6 +28,7 @@ from cinder import backup as backupAPI
 from cinder import exception
 from cinder.i18n import _
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import strutils
 from cinder import utils
 
 LOG = logging.getLogger(__name__)
@@ -106,7 +107,7 @@ class CreateDeserializer(wsgi.MetadataXMLDeserializer):
         backup_node = self.find_first_child_named(node, 'backup')
 
         attributes = ['container', 'display_name',
-                      'display_description', 'volume_id']
+                      'display_description', 'volume_id', 'incremental']
 
         for attr in attributes:
             if backup_node.getAttribute(attr):
@@ -246,6 +247,11 @@ class BackupsController(wsgi.Controller):
         container = backup.get('container', None)
         name = backup.get('name', None)
         description = backup.get('description', None)
+        try:
+            incremental = strutils.bool_from_string(
+                backup.get('incremental', False), strict=True)
+        except ValueError as error:
+            raise exc.HTTPBadRequest(explanation=unicode(error))
 
         LOG.info(_("Creating backup of volume %(volume_id)s in container"
                    " %(container)s"),
@@ -254,9 +260,12 @@ class BackupsController(wsgi.Controller):
 
         try:
             new_backup = self.backup_api.create(context, name, description,
-                                                volume_id, container)
+                                                volume_id, container,
+                                                incremental=incremental)
         except exception.InvalidVolume as error:
             raise exc.HTTPBadRequest(explanation=error.msg)
+        except exception.InvalidBackup as error:
+            raise exc.HTTPBadRequest(explanation=error.msg)
         except exception.VolumeNotFound as error:
             raise exc.HTTPNotFound(explanation=error.msg)
         except exception.ServiceNotFound as error:
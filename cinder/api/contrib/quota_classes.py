@@ -74,23 +74,28 @@ class QuotaClassSetsController(wsgi.Controller):
                      " in request body."))
             raise webob.exc.HTTPBadRequest(explanation=msg)
 
-        for key in body['quota_class_set'].keys():
-            if key in QUOTAS:
-                try:
-                    value = int(body['quota_class_set'][key])
-                except ValueError:
-                    msg = _("Quota class limit must be specified as an"
-                            " integer value.")
-                    raise webob.exc.HTTPBadRequest(explanation=msg)
-                if value < -1:
-                    msg = _("Quota class limit must be -1 or greater.")
-                    raise webob.exc.HTTPBadRequest(explanation=msg)
-                try:
-                    db.quota_class_update(context, quota_class, key, value)
-                except exception.QuotaClassNotFound:
-                    db.quota_class_create(context, quota_class, key, value)
-                except exception.AdminRequired:
-                    raise webob.exc.HTTPForbidden()
+        try:
+            for key in body['quota_class_set'].keys():
+                if key in QUOTAS:
+                    try:
+                        value = int(body['quota_class_set'][key])
+                    except ValueError:
+                        msg = _("Quota class limit must be specified as an"
+                                " integer value.")
+                        raise webob.exc.HTTPBadRequest(explanation=msg)
+                    if value < -1:
+                        msg = _("Quota class limit must be -1 or greater.")
+                        raise webob.exc.HTTPBadRequest(explanation=msg)
+                    try:
+                        db.quota_class_update(context, quota_class, key,
+                                              value)
+                    except exception.QuotaClassNotFound:
+                        db.quota_class_create(context, quota_class, key,
+                                              value)
+                    except exception.AdminRequired:
+                        raise webob.exc.HTTPForbidden()
+        finally:
+            QUOTAS.invalidate_limits()
         return {'quota_class_set': QUOTAS.get_class_quotas(context,
                                                            quota_class)}
 
@@ -116,17 +116,20 @@ class QuotaSetsController(wsgi.Controller):
             msg = _("Bad key(s) in quota set: %s") % ",".join(bad_keys)
             raise webob.exc.HTTPBadRequest(explanation=msg)
 
-        for key in body['quota_set'].keys():
-            if key in NON_QUOTA_KEYS:
-                continue
-
-            value = self._validate_quota_limit(body['quota_set'][key])
-            try:
-                db.quota_update(context, project_id, key, value)
-            except exception.ProjectQuotaNotFound:
-                db.quota_create(context, project_id, key, value)
-            except exception.AdminRequired:
-                raise webob.exc.HTTPForbidden()
+        try:
+            for key in body['quota_set'].keys():
+                if key in NON_QUOTA_KEYS:
+                    continue
+
+                value = self._validate_quota_limit(body['quota_set'][key])
+                try:
+                    db.quota_update(context, project_id, key, value)
+                except exception.ProjectQuotaNotFound:
+                    db.quota_create(context, project_id, key, value)
+                except exception.AdminRequired:
+                    raise webob.exc.HTTPForbidden()
+        finally:
+            QUOTAS.invalidate_limits()
         return {'quota_set': self._get_quotas(context, id)}
 
     @wsgi.serializers(xml=QuotaTemplate)
@@ -145,6 +148,8 @@ class QuotaSetsController(wsgi.Controller):
             db.quota_destroy_all_by_project(context, id)
         except exception.AdminRequired:
             raise webob.exc.HTTPForbidden()
+        finally:
+            QUOTAS.invalidate_limits()
 
 
 class Quotas(extensions.ExtensionDescriptor):
@@ -367,6 +367,41 @@ class VolumeActionsController(wsgi.Controller):
         self.volume_api.update(context, volume, update_dict)
         return webob.Response(status_int=200)
 
+    @wsgi.action('os-wait-status')
+    def _wait_status(self, req, id, body):
+        """Wait for the status of a volume to change."""
+        context = req.environ['cinder.context']
+        try:
+            volume = self.volume_api.get(context, id)
+        except exception.VolumeNotFound as error:
+            raise webob.exc.HTTPNotFound(explanation=error.msg)
+
+        params = body['os-wait-status'] or {}
+        if not isinstance(params, dict):
+            msg = _("Invalid request body")
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+
+        statuses = params.get('status')
+        if isinstance(statuses, basestring):
+            statuses = [statuses]
+        elif statuses is not None and not isinstance(statuses, list):
+            msg = _("'status' not string or list")
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+
+        timeout = params.get('timeout')
+        if timeout is not None:
+            try:
+                timeout = int(timeout)
+            except (ValueError, TypeError):
+                timeout = -1
+            if timeout < 0:
+                msg = _("Timeout must be a positive integer.")
+                raise webob.exc.HTTPBadRequest(explanation=msg)
+
+        status = self.volume_api.wait_status(context, volume, statuses,
+                                             timeout)
+        return {'os-wait-status': {'id': id, 'status': status}}
+
 
 class Volume_actions(extensions.ExtensionDescriptor):
     """Enable volume actions
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import inspect
 import math
 import time
@@ -132,6 +133,18 @@ class Request(webob.Request):
             return None
         return resources.get(resource_id)
 
+    def get_etag(self, *parts):
+        """Return the entity tag of a response built from parts.
+
+        The parts must change whenever the response does, e.g. the ids,
+        update times and metadata of the resources it shows.  The content
+        type and URL of the response are accounted for.
+        """
+        data = jsonutils.dumps([self.best_match_content_type(),
+                                self.application_url] + list(parts),
+                               default=six.text_type, sort_keys=True)
+        return hashlib.md5(data).hexdigest()
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'cinder.best_content_type' not in self.environ:
@@ -957,8 +970,14 @@ class Resource(wsgi.Application):
             else:
                 response = action_result
 
-            # Run post-processing extensions
-            if resp_obj:
+            if resp_obj and 'cinder.etag' in request.environ:
+                resp_obj['ETag'] = '"%s"' % request.environ['cinder.etag']
+
+            # Run post-processing extensions, a response which is not
+            # modified has no body for them to extend
+            if resp_obj and resp_obj.code == 304:
+                _set_request_id_header(request, resp_obj)
+            elif resp_obj:
                 _set_request_id_header(request, resp_obj)
                 # Do a preserialize to set up the response object
                 serializers = getattr(meth, 'wsgi_serializers', {})
@@ -1129,6 +1148,18 @@ class Controller(object):
 
         return True
 
+    @staticmethod
+    def conditional_response(req, etag, build):
+        """Return the response built by build(), tagged with etag.
+
+        If the request has a matching If-None-Match header, a 304 Not
+        Modified response is returned instead, without calling build().
+        """
+        req.environ['cinder.etag'] = etag
+        if etag in req.if_none_match:
+            return ResponseObject(None, code=304)
+        return build()
+
 
 class Fault(webob.exc.HTTPException):
     """Wrap webob.exc.HTTPException to provide API friendly response."""
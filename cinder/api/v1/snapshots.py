@@ -150,8 +150,11 @@ class SnapshotsController(wsgi.Controller):
         utils.remove_invalid_filter_options(context, search_opts,
                                             allowed_search_options)
 
+        # Only fetch the snapshots that common.limited() can return
+        limit = common.get_query_limit(req)
         snapshots = self.volume_api.get_all_snapshots(context,
-                                                      search_opts=search_opts)
+                                                      search_opts=search_opts,
+                                                      limit=limit)
         limited_list = common.limited(snapshots, req)
         req.cache_resource(limited_list)
         res = [entity_maker(context, snapshot) for snapshot in limited_list]
@@ -18,12 +18,17 @@ Module dedicated functions/classes dealing with rate limiting requests.
 """
 
 import collections
-import copy
+import errno
+import fcntl
+import hashlib
 import httplib
 import math
+import os
 import re
 import time
 
+from eventlet import greenthread
+from eventlet import tpool
 import webob.dec
 import webob.exc
 
@@ -31,6 +36,7 @@ from cinder.api.openstack import wsgi
 from cinder.api.views import limits as limits_views
 from cinder.api import xmlutil
 from cinder.i18n import _
+from cinder.openstack.common import fileutils
 from cinder.openstack.common import importutils
 from cinder.openstack.common import jsonutils
 from cinder import quota
@@ -46,6 +52,16 @@ PER_MINUTE = 60
 PER_HOUR = 60 * 60
 PER_DAY = 60 * 60 * 24
 
+# Number of users whose buckets are kept by MemoryBucketStore.
+DEFAULT_MAX_USERS = 10000
+
+# Seconds between two attempts to lock a bucket file held by another
+# worker.
+LOCK_RETRY_INTERVAL = 0.01
+
+# Seconds between two removals of idle bucket files by FileBucketStore.
+EXPIRE_INTERVAL = 5 * PER_MINUTE
+
 
 limits_nsmap = {None: xmlutil.XMLNS_COMMON_V10, 'atom': xmlutil.XMLNS_ATOM}
 
@@ -149,32 +165,47 @@ class Limit(object):
         if self.verb != verb or not re.match(self.regex, url):
             return
 
-        now = self._get_time()
+        state = [self.water_level, self.last_request, self.next_request,
+                 self.remaining]
+        delay = self.record(state, self._get_time())
+        (self.water_level, self.last_request, self.next_request,
+         self.remaining) = state
+        return delay
 
-        if self.last_request is None:
-            self.last_request = now
+    def new_state(self):
+        """Return the bucket state of a limit which was never hit."""
+        return [0, None, None, self.value]
 
-        leak_value = now - self.last_request
+    def record(self, state, now):
+        """Record a request in a bucket state of this limit.
+
+        @param state: [water_level, last_request, next_request, remaining]
+                      list, updated in place
+        @param now: time of the request
+        @return: delay in seconds if the request is over the limit, or None
+        """
+        water_level, last_request = state[0], state[1]
+        if last_request is None:
+            last_request = now
 
-        self.water_level -= leak_value
-        self.water_level = max(self.water_level, 0)
-        self.water_level += self.request_value
+        water_level = max(water_level - (now - last_request), 0)
+        water_level += self.request_value
 
-        difference = self.water_level - self.capacity
+        difference = water_level - self.capacity
 
-        self.last_request = now
+        state[1] = now
 
         if difference > 0:
-            self.water_level -= self.request_value
-            self.next_request = now + difference
+            state[0] = water_level - self.request_value
+            state[2] = now + difference
             return difference
 
         cap = self.capacity
-        water = self.water_level
         val = self.value
 
-        self.remaining = math.floor(((cap - water) / cap) * val)
-        self.next_request = now
+        state[0] = water_level
+        state[2] = now
+        state[3] = math.floor(((cap - water_level) / cap) * val)
 
     def _get_time(self):
         """Retrieve the current time. Broken out for testability."""
@@ -184,16 +215,24 @@ class Limit(object):
         """Display the string name of the unit."""
         return self.UNITS.get(self.unit, "UNKNOWN")
 
-    def display(self):
-        """Return a useful representation of this class."""
+    def display(self, state=None):
+        """Return a useful representation of this class.
+
+        @param state: bucket state to display instead of the one of this
+                      limit
+        """
+        if state is None:
+            next_request, remaining = self.next_request, self.remaining
+        else:
+            next_request, remaining = state[2], state[3]
         return {
             "verb": self.verb,
             "URI": self.uri,
             "regex": self.regex,
             "value": self.value,
-            "remaining": int(self.remaining),
+            "remaining": int(remaining),
             "unit": self.display_unit(),
-            "resetTime": int(self.next_request or self._get_time()),
+            "resetTime": int(next_request or self._get_time()),
         }
 
 # "Limit" format is a dictionary with the HTTP verb, human-readable URI,
@@ -211,7 +250,8 @@ DEFAULT_LIMITS = [
 class RateLimitingMiddleware(base_wsgi.Middleware):
     """Rate-limits requests passing through this middleware.
 
-    All limit information is stored in memory for this implementation.
+    Limit information is stored in memory, or in the bucket store given to
+    the limiter.
     """
 
     def __init__(self, application, limits=None, limiter=None, **kwargs):
@@ -268,16 +308,165 @@ class RateLimitingMiddleware(base_wsgi.Middleware):
         return self.application
 
 
+class MemoryBucketStore(object):
+    """Stores the buckets of the most recently seen users in memory."""
+
+    def __init__(self, max_users=DEFAULT_MAX_USERS):
+        """Initialize the new `MemoryBucketStore`.
+
+        @param max_users: Number of users whose buckets are kept, the least
+                          recently seen are evicted first
+        """
+        self.max_users = int(max_users)
+        self._buckets = collections.OrderedDict()
+
+    def get(self, key):
+        """Return the bucket states of a user, or None."""
+        return self._buckets.get(key)
+
+    def update(self, key, func):
+        """Update the bucket states of a user.
+
+        @param func: Called with the current states, or None, and returns
+                     the new states along with the result to return
+        """
+        states, result = func(self._buckets.pop(key, None))
+        self._buckets[key] = states
+        if len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+        return result
+
+
+class FileBucketStore(object):
+    """Stores the buckets in files shared by the API workers of a host.
+
+    The buckets of each user are in their own file of the directory,
+    locked while they are updated.  The files of users idle for longer
+    than the longest limit, whose buckets drained, are removed.
+    """
+
+    def __init__(self, path, max_idle=PER_DAY):
+        """Initialize the new `FileBucketStore`.
+
+        @param path: Directory of the bucket files, created if needed
+        @param max_idle: Seconds after which the buckets of an idle user
+                         are empty again and their file is removed
+        """
+        self.path = path
+        self.max_idle = max_idle
+        self._next_expire = 0
+        fileutils.ensure_tree(path)
+
+    def _path(self, key):
+        name = hashlib.sha1(jsonutils.dumps(key)).hexdigest()
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _load(bucket_file):
+        try:
+            return jsonutils.loads(bucket_file.read())
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _lock(bucket_file, operation):
+        """Lock a bucket file, sleeping while another worker holds it
+        rather than blocking every green thread of this one.
+        """
+        while True:
+            try:
+                fcntl.flock(bucket_file, operation | fcntl.LOCK_NB)
+                return
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            greenthread.sleep(LOCK_RETRY_INTERVAL)
+
+    def _expire(self):
+        """Remove the bucket files which weren't updated for max_idle."""
+        expired = time.time() - self.max_idle
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                if os.stat(path).st_mtime >= expired:
+                    continue
+                with open(path) as bucket_file:
+                    # Files being updated are left alone.  A worker which
+                    # opened the file before it is removed loses its
+                    # update, of buckets which had drained anyway.
+                    fcntl.flock(bucket_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    if os.fstat(bucket_file.fileno()).st_mtime < expired:
+                        os.unlink(path)
+            except (IOError, OSError):
+                # Removed by another worker, or locked.
+                continue
+
+    def get(self, key):
+        """Return the bucket states of a user, or None."""
+        try:
+            with open(self._path(key)) as bucket_file:
+                self._lock(bucket_file, fcntl.LOCK_SH)
+                return self._load(bucket_file)
+        except IOError:
+            return None
+
+    def update(self, key, func):
+        """Update the bucket states of a user.
+
+        @param func: Called with the current states, or None, and returns
+                     the new states along with the result to return
+        """
+        now = time.time()
+        if now >= self._next_expire:
+            self._next_expire = now + min(self.max_idle, EXPIRE_INTERVAL)
+            # Listing the directory isn't green.
+            tpool.execute(self._expire)
+
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+') as bucket_file:
+            self._lock(bucket_file, fcntl.LOCK_EX)
+            states, result = func(self._load(bucket_file))
+            bucket_file.seek(0)
+            bucket_file.truncate()
+            bucket_file.write(jsonutils.dumps(states))
+        return result
+
+
+def get_bucket_store(bucket_store=None, max_users=DEFAULT_MAX_USERS,
+                     max_idle=PER_DAY):
+    """Return the bucket store described by a string.
+
+    @param bucket_store: "memory", the default, or "file:<directory>"
+    @param max_users: Number of users whose buckets are kept in memory
+    @param max_idle: Seconds after which bucket files of idle users are
+                     removed
+    """
+    if not bucket_store or bucket_store == 'memory':
+        return MemoryBucketStore(max_users)
+    if bucket_store.startswith('file:'):
+        return FileBucketStore(bucket_store[len('file:'):], max_idle)
+    raise ValueError("Invalid bucket store specified")
+
+
 class Limiter(object):
-    """Rate-limit checking class which handles limits in memory."""
+    """Rate-limit checking class.
+
+    The limits of each verb are compiled into a dispatch table when the
+    limiter is created.  The buckets of the users are kept in memory, or
+    in files shared by the API workers when bucket_store is
+    "file:<directory>".
+    """
 
-    def __init__(self, limits, **kwargs):
+    def __init__(self, limits, bucket_store=None,
+                 max_users=DEFAULT_MAX_USERS, **kwargs):
         """Initialize the new `Limiter`.
 
         @param limits: List of `Limit` objects
+        @param bucket_store: Bucket store, or string describing it
+        @param max_users: Number of users whose buckets are kept in memory
         """
-        self.limits = copy.deepcopy(limits)
-        self.levels = collections.defaultdict(lambda: copy.deepcopy(limits))
+        self.limits = list(limits)
+        self.levels = {}
 
         # Pick up any per-user limit information
         for key, value in kwargs.items():
@@ -285,25 +474,71 @@ class Limiter(object):
                 username = key[len(LIMITS_PREFIX):]
                 self.levels[username] = self.parse_limits(value)
 
+        self._table = self._compile(self.limits)
+        self._tables = dict((username, self._compile(limits))
+                            for username, limits in self.levels.items())
+
+        if bucket_store is None or isinstance(bucket_store, basestring):
+            # The buckets of a limit are empty again once idle for its unit.
+            units = [limit.unit for level in
+                     [self.limits] + self.levels.values()
+                     for limit in level]
+            bucket_store = get_bucket_store(bucket_store, max_users,
+                                            max(units or [PER_DAY]))
+        self._store = bucket_store
+
+    @staticmethod
+    def _compile(limits):
+        """Return the (index, match, limit) tuples of the limits by verb."""
+        table = collections.defaultdict(list)
+        for index, limit in enumerate(limits):
+            table[limit.verb].append((index, re.compile(limit.regex).match,
+                                      limit))
+        return dict(table)
+
+    def _get_states(self, username, states):
+        """Return the states if they match the limits of the user."""
+        size = len(self.levels.get(username, self.limits))
+        if states is None or len(states) != size:
+            return [None] * size
+        return states
+
     def get_limits(self, username=None):
         """Return the limits for a given user."""
-        return [limit.display() for limit in self.levels[username]]
+        states = self._get_states(username, self._store.get(username))
+        return [limit.display(state or limit.new_state())
+                for limit, state in zip(self.levels.get(username,
+                                                        self.limits),
+                                        states)]
 
     def check_for_delay(self, verb, url, username=None):
         """Check the given verb/user/user triplet for limit.
 
         @return: Tuple of delay (in seconds) and error message (or None, None)
         """
-        delays = []
+        table = self._tables.get(username, self._table)
+        matches = [(index, limit)
+                   for index, match, limit in table.get(verb, ())
+                   if match(url)]
+        if not matches:
+            return None, None
+
+        now = matches[0][1]._get_time()
 
-        for limit in self.levels[username]:
-            delay = limit(verb, url)
-            if delay:
-                delays.append((delay, limit.error_message))
+        def record(states):
+            states = self._get_states(username, states)
+            delays = []
+            for index, limit in matches:
+                state = states[index] or limit.new_state()
+                delay = limit.record(state, now)
+                states[index] = state
+                if delay:
+                    delays.append((delay, limit.error_message))
+            return states, delays
 
+        delays = self._store.update(username, record)
         if delays:
-            delays.sort()
-            return delays[0]
+            return min(delays)
 
         return None, None
 
@@ -371,7 +606,7 @@ class Limiter(object):
 class WsgiLimiter(object):
     """Rate-limit checking from a WSGI application.
 
-    Uses an in-memory `Limiter`.
+    Uses a `Limiter`, in memory unless a bucket store is given.
 
     To use, POST ``/<username>`` with JSON data such as::
 
@@ -383,14 +618,23 @@ class WsgiLimiter(object):
     and receive a 204 No Content, or a 403 Forbidden with an X-Wait-Seconds
     header containing the number of seconds to wait before the action would
     succeed.
+
+    Several requests can be checked at once by POSTing a list of them, the
+    response is then a 200 OK with JSON data such as::
+
+        {
+            "delays": [[null, null], [60.0, "Only 1 GET request(s) ..."]]
+        }
     """
 
-    def __init__(self, limits=None):
+    def __init__(self, limits=None, **kwargs):
         """Initialize the new `WsgiLimiter`.
 
         @param limits: List of `Limit` objects
+
+        Other parameters are passed to the constructor for the limiter.
         """
-        self._limiter = Limiter(limits or DEFAULT_LIMITS)
+        self._limiter = Limiter(limits or DEFAULT_LIMITS, **kwargs)
 
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, request):
@@ -404,11 +648,24 @@ class WsgiLimiter(object):
             raise webob.exc.HTTPMethodNotAllowed()
 
         try:
-            info = dict(jsonutils.loads(request.body))
-        except ValueError:
+            info = jsonutils.loads(request.body)
+            if isinstance(info, list):
+                info = [dict(check) for check in info]
+            else:
+                info = dict(info)
+        except (TypeError, ValueError):
             raise webob.exc.HTTPBadRequest()
 
         username = request.path_info_pop()
+
+        if isinstance(info, list):
+            delays = [self._limiter.check_for_delay(check.get("verb"),
+                                                    check.get("path"),
+                                                    username)
+                      for check in info]
+            return webob.Response(body=jsonutils.dumps({"delays": delays}),
+                                  content_type="application/json")
+
         verb = info.get("verb")
         path = info.get("path")
 
@@ -431,8 +688,7 @@ class WsgiLimiterProxy(object):
         """
         self.limiter_address = limiter_address
 
-    def check_for_delay(self, verb, path, username=None):
-        body = jsonutils.dumps({"verb": verb, "path": path})
+    def _post(self, body, username):
         headers = {"Content-Type": "application/json"}
 
         conn = httplib.HTTPConnection(self.limiter_address)
@@ -442,13 +698,34 @@ class WsgiLimiterProxy(object):
         else:
             conn.request("POST", "/", body, headers)
 
-        resp = conn.getresponse()
+        return conn.getresponse()
+
+    def check_for_delay(self, verb, path, username=None):
+        body = jsonutils.dumps({"verb": verb, "path": path})
+        resp = self._post(body, username)
 
         if 200 >= resp.status < 300:
             return None, None
 
         return resp.getheader("X-Wait-Seconds"), resp.read() or None
 
+    def check_for_delays(self, requests, username=None):
+        """Check several requests of a user with a single call.
+
+        @param requests: List of (verb, path) tuples
+        @return: List of (delay, error) tuples, (None, None) for the
+                 requests which are not limited
+        """
+        body = jsonutils.dumps([{"verb": verb, "path": path}
+                                for verb, path in requests])
+        resp = self._post(body, username)
+
+        if resp.status != httplib.OK:
+            raise webob.exc.HTTPBadGateway()
+
+        return [tuple(delay)
+                for delay in jsonutils.loads(resp.read())["delays"]]
+
     # Note: This method gets called before the class is instantiated,
     # so this must be either a static method or a class method.  It is
     # used to develop a list of limits to feed to the constructor.
@@ -52,17 +52,26 @@ def _translate_snapshot_summary_view(context, snapshot):
     d['volume_id'] = snapshot['volume_id']
     d['status'] = snapshot['status']
     d['size'] = snapshot['volume_size']
+    d['metadata'] = _get_snapshot_metadata(snapshot)
+    return d
+
 
+def _get_snapshot_metadata(snapshot):
+    """Retrieve the metadata of the snapshot object."""
     if snapshot.get('snapshot_metadata'):
         metadata = snapshot.get('snapshot_metadata')
-        d['metadata'] = dict((item['key'], item['value']) for item in metadata)
+        return dict((item['key'], item['value']) for item in metadata)
     # avoid circular ref when vol is a Volume instance
     elif snapshot.get('metadata') and isinstance(snapshot.get('metadata'),
                                                  dict):
-        d['metadata'] = snapshot['metadata']
-    else:
-        d['metadata'] = {}
-    return d
+        return snapshot['metadata']
+    return {}
+
+
+def _snapshot_etag_parts(snapshot):
+    """Return what the views of a snapshot change with."""
+    return (snapshot['id'], snapshot.get('updated_at'), snapshot['status'],
+            _get_snapshot_metadata(snapshot))
 
 
 def make_snapshot(elem):
@@ -112,7 +121,11 @@ class SnapshotsController(wsgi.Controller):
             msg = _("Snapshot could not be found")
             raise exc.HTTPNotFound(explanation=msg)
 
-        return {'snapshot': _translate_snapshot_detail_view(context, snapshot)}
+        etag = req.get_etag(_snapshot_etag_parts(snapshot))
+        return self.conditional_response(
+            req, etag,
+            lambda: {'snapshot': _translate_snapshot_detail_view(context,
+                                                                 snapshot)})
 
     def delete(self, req, id):
         """Delete a snapshot."""
@@ -143,13 +156,17 @@ class SnapshotsController(wsgi.Controller):
         """Returns a list of snapshots, transformed through entity_maker."""
         context = req.environ['cinder.context']
 
-        #pop out limit and offset , they are not search_opts
         search_opts = req.GET.copy()
+        marker = search_opts.pop('marker', None)
+        sort_key = search_opts.pop('sort_key', 'created_at')
+        sort_dir = search_opts.pop('sort_dir', 'desc')
+        #pop out limit and offset , they are not search_opts
         search_opts.pop('limit', None)
         search_opts.pop('offset', None)
 
         #filter out invalid option
-        allowed_search_options = ('status', 'volume_id', 'name')
+        allowed_search_options = ('status', 'volume_id', 'name',
+                                  'changes-since')
         utils.remove_invalid_filter_options(context, search_opts,
                                             allowed_search_options)
 
@@ -158,12 +175,24 @@ class SnapshotsController(wsgi.Controller):
             search_opts['display_name'] = search_opts['name']
             del search_opts['name']
 
+        # Only fetch the snapshots that common.limited() can return
+        limit = common.get_query_limit(req)
         snapshots = self.volume_api.get_all_snapshots(context,
-                                                      search_opts=search_opts)
+                                                      search_opts=search_opts,
+                                                      marker=marker,
+                                                      limit=limit,
+                                                      sort_key=sort_key,
+                                                      sort_dir=sort_dir)
         limited_list = common.limited(snapshots, req)
         req.cache_resource(limited_list)
-        res = [entity_maker(context, snapshot) for snapshot in limited_list]
-        return {'snapshots': res}
+
+        def build():
+            return {'snapshots': [entity_maker(context, snapshot)
+                                  for snapshot in limited_list]}
+
+        etag = req.get_etag(*[_snapshot_etag_parts(snapshot)
+                              for snapshot in limited_list])
+        return self.conditional_response(req, etag, build)
 
     @wsgi.response(202)
     @wsgi.serializers(xml=SnapshotTemplate)
@@ -25,10 +25,18 @@ class ViewBuilder(common.ViewBuilder):
 
     _collection_name = "volumes"
 
+    # Volume columns used by summary(), enough to list volumes
+    summary_columns = ('id', 'display_name')
+
     def __init__(self):
         """Initialize view builder."""
         super(ViewBuilder, self).__init__()
 
+    def etag_parts(self, volume):
+        """Return what the detailed view of a volume changes with."""
+        return (volume['id'], volume.get('updated_at'), volume['status'],
+                self._get_volume_metadata(volume))
+
     def summary_list(self, request, volumes):
         """Show a list of volumes without many details."""
         return self._list_view(self.summary, request, volumes)
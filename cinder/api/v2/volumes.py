@@ -18,6 +18,7 @@
 
 import ast
 
+from oslo.config import cfg
 import webob
 from webob import exc
 
@@ -36,6 +37,9 @@ from cinder.volume import utils as volume_utils
 from cinder.volume import volume_types
 
 
+CONF = cfg.CONF
+CONF.import_opt('max_volumes_per_request', 'cinder.volume.api')
+
 LOG = logging.getLogger(__name__)
 SCHEDULER_HINTS_NAMESPACE =\
     "http://docs.openstack.org/block-service/ext/scheduler-hints/api/v2"
@@ -177,7 +181,9 @@ class VolumeController(wsgi.Controller):
 
         utils.add_visible_admin_metadata(vol)
 
-        return self._view_builder.detail(req, vol)
+        etag = req.get_etag(self._view_builder.etag_parts(vol))
+        return self.conditional_response(
+            req, etag, lambda: self._view_builder.detail(req, vol))
 
     def delete(self, req, id):
         """Delete a volume."""
@@ -231,23 +237,35 @@ class VolumeController(wsgi.Controller):
         if 'metadata' in filters:
             filters['metadata'] = ast.literal_eval(filters['metadata'])
 
+        if is_detail:
+            columns = None
+        else:
+            # The summary only shows a few columns, load only those
+            columns = self._view_builder.summary_columns
+
         volumes = self.volume_api.get_all(context, marker, limit, sort_key,
                                           sort_dir, filters,
-                                          viewable_admin_meta=True)
+                                          viewable_admin_meta=True,
+                                          columns=columns)
 
-        volumes = [dict(vol.iteritems()) for vol in volumes]
+        if is_detail:
+            volumes = [dict(vol.iteritems()) for vol in volumes]
 
-        for volume in volumes:
-            utils.add_visible_admin_metadata(volume)
+            for volume in volumes:
+                utils.add_visible_admin_metadata(volume)
 
         limited_list = common.limited(volumes, req)
+        req.cache_resource(limited_list)
 
         if is_detail:
-            volumes = self._view_builder.detail_list(req, limited_list)
+            etag = req.get_etag(*[self._view_builder.etag_parts(volume)
+                                  for volume in limited_list])
+            build = lambda: self._view_builder.detail_list(req, limited_list)
         else:
-            volumes = self._view_builder.summary_list(req, limited_list)
-        req.cache_resource(limited_list)
-        return volumes
+            # Summaries only show the loaded columns
+            etag = req.get_etag(*limited_list)
+            build = lambda: self._view_builder.summary_list(req, limited_list)
+        return self.conditional_response(req, etag, build)
 
     def _image_uuid_from_href(self, image_href):
         # If the image href was generated by nova api, strip image_href
@@ -378,6 +396,35 @@ class VolumeController(wsgi.Controller):
         kwargs['availability_zone'] = volume.get('availability_zone', None)
         kwargs['scheduler_hints'] = volume.get('scheduler_hints', None)
 
+        count = volume.get('count', 1)
+        try:
+            count = int(count)
+            if count < 1:
+                raise ValueError()
+        except (ValueError, TypeError):
+            msg = _("Volume count must be a positive integer.")
+            raise exc.HTTPBadRequest(explanation=msg)
+        if count > CONF.max_volumes_per_request:
+            msg = (_("Volume count must not exceed %d.") %
+                   CONF.max_volumes_per_request)
+            raise exc.HTTPBadRequest(explanation=msg)
+
+        if count > 1:
+            new_volumes = self.volume_api.create_volumes(
+                context,
+                count,
+                size,
+                volume.get('display_name'),
+                volume.get('display_description'),
+                **kwargs)
+            volumes = []
+            for new_volume in new_volumes:
+                new_volume = dict(new_volume.iteritems())
+                volumes.append(
+                    self._view_builder.detail(req, new_volume)['volume'])
+            return wsgi.ResponseObject({'volumes': volumes},
+                                       xml=VolumesTemplate)
+
         new_volume = self.volume_api.create(context,
                                             size,
                                             volume.get('display_name'),
@@ -394,7 +441,7 @@ class VolumeController(wsgi.Controller):
 
     def _get_volume_filter_options(self):
         """Return volume search options allowed by non-admin."""
-        return ('name', 'status', 'metadata')
+        return ('name', 'status', 'metadata', 'changes-since')
 
     @wsgi.serializers(xml=VolumeTemplate)
     def update(self, req, id, body):
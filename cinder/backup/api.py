@@ -69,6 +69,14 @@ class API(base.Base):
             msg = _('Backup status must be available or error')
             raise exception.InvalidBackup(reason=msg)
 
+        # Incremental backups share the objects of their parents, so a
+        # backup can only go once all of its children are gone.
+        children = self.db.backup_get_all(context.elevated(),
+                                          filters={'parent_id': backup_id})
+        if children:
+            msg = _('Incremental backups exist for this backup')
+            raise exception.InvalidBackup(reason=msg)
+
         self.db.backup_update(context, backup_id, {'status': 'deleting'})
         self.backup_rpcapi.delete_backup(context,
                                          backup['host'],
@@ -111,8 +119,26 @@ class API(base.Base):
         services = self.db.service_get_all_by_topic(ctxt, topic)
         return [srv['host'] for srv in services if not srv['disabled']]
 
+    def _get_parent_backup(self, context, volume_id, container):
+        """Return the backup an incremental backup is based on.
+
+        That is the most recent available backup of the volume, which must
+        be in the same container as the new backup.
+        """
+        backups = self.get_all(context, search_opts={'volume_id': volume_id,
+                                                     'status': 'available'})
+        if not backups:
+            msg = _('No backups available to do an incremental backup')
+            raise exception.InvalidBackup(reason=msg)
+        parent = max(backups, key=lambda backup: backup['created_at'])
+        if container is not None and container != parent['container']:
+            msg = _('Incremental backups must be stored in the container of '
+                    'their parent backup %s') % parent['container']
+            raise exception.InvalidBackup(reason=msg)
+        return parent
+
     def create(self, context, name, description, volume_id,
-               container, availability_zone=None):
+               container, availability_zone=None, incremental=False):
         """Make the RPC call to create a volume backup."""
         check_policy(context, 'create')
         volume = self.volume_api.get(context, volume_id)
@@ -123,6 +149,12 @@ class API(base.Base):
         if not self._is_backup_service_enabled(volume, volume_host):
             raise exception.ServiceNotFound(service_id='cinder-backup')
 
+        parent_id = None
+        if incremental:
+            parent = self._get_parent_backup(context, volume_id, container)
+            parent_id = parent['id']
+            container = parent['container']
+
         # do quota reserver before setting volume status and backup status
         try:
             reserve_opts = {'backups': 1,
@@ -169,7 +201,8 @@ class API(base.Base):
                    'status': 'creating',
                    'container': container,
                    'size': volume['size'],
-                   'host': volume_host, }
+                   'host': volume_host,
+                   'parent_id': parent_id, }
         try:
             backup = self.db.backup_create(context, options)
             QUOTAS.commit(context, reservations)
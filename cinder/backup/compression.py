@@ -0,0 +1,137 @@
+# Copyright (C) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compression algorithms available to backup drivers.
+
+A compressor is any object with compress(data) and decompress(data)
+methods.  Compressors are registered under the name that backup drivers
+record in their metadata, so that restores can find the same algorithm
+again.  zlib and bz2 ship with Python and are always available, faster
+algorithms are available when their Python bindings are installed.
+"""
+
+import bz2
+import zlib
+
+from cinder.i18n import _
+
+
+# Values of backup_compression_algorithm that disable compression.
+DISABLED = ('none', 'off', 'no')
+
+# Algorithms tried in turn by the 'auto' algorithm, fastest first.
+AUTO_ORDER = ('lz4', 'zstd', 'zlib')
+
+_loaders = {}
+_aliases = {}
+_compressors = {}
+
+
+def register_compressor(name, loader, aliases=()):
+    """Register a compressor.
+
+    loader is called without arguments the first time the compressor is
+    needed, and either returns the compressor or raises ImportError when
+    it is not available.
+    """
+    _loaders[name] = loader
+    _compressors.pop(name, None)
+    for alias in aliases:
+        _aliases[alias] = name
+
+
+def _load_lz4():
+    try:
+        from lz4 import block as lz4
+    except ImportError:
+        # Releases before 0.9 provide the block format at the top level.
+        import lz4
+        if not hasattr(lz4, 'compress'):
+            raise ImportError('lz4 does not provide compress()')
+    return lz4
+
+
+class _ZstdCompressor(object):
+    """Adapts the zstandard bindings to the compressor interface.
+
+    A compression context must not be used by two threads at once, and
+    chunks may be compressed in native threads, so one is made per call.
+    """
+
+    def __init__(self, zstandard):
+        self._zstandard = zstandard
+
+    def compress(self, data):
+        return self._zstandard.ZstdCompressor().compress(data)
+
+    def decompress(self, data):
+        return self._zstandard.ZstdDecompressor().decompress(data)
+
+
+def _load_zstd():
+    import zstandard
+    return _ZstdCompressor(zstandard)
+
+
+register_compressor('zlib', lambda: zlib, aliases=('gzip',))
+register_compressor('bz2', lambda: bz2, aliases=('bzip2',))
+register_compressor('lz4', _load_lz4)
+register_compressor('zstd', _load_zstd, aliases=('zstandard',))
+
+
+def _unsupported(algorithm):
+    err = _('unsupported compression algorithm: %s') % algorithm
+    return ValueError(unicode(err))
+
+
+def get_compressor(algorithm):
+    """Return the compressor of algorithm, or None if it is disabled.
+
+    Raises ValueError if the algorithm is unknown or its Python bindings
+    are not installed.
+    """
+    name = algorithm.lower()
+    if name in DISABLED:
+        return None
+    name = _aliases.get(name, name)
+    if name not in _compressors:
+        try:
+            loader = _loaders[name]
+            _compressors[name] = loader()
+        except (KeyError, ImportError):
+            raise _unsupported(algorithm)
+    return _compressors[name]
+
+
+def resolve(algorithm):
+    """Return the name to record for data compressed with algorithm.
+
+    'auto' resolves to the first available algorithm of AUTO_ORDER, and
+    'none' is returned when compression is disabled.  Raises ValueError
+    like get_compressor.
+    """
+    name = algorithm.lower()
+    if name in DISABLED:
+        return 'none'
+    if name == 'auto':
+        for candidate in AUTO_ORDER:
+            try:
+                get_compressor(candidate)
+            except ValueError:
+                continue
+            return candidate
+        raise _unsupported(algorithm)
+    get_compressor(name)
+    return name
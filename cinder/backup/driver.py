@@ -16,6 +16,8 @@
 """Base class for all backup drivers."""
 
 import abc
+import os
+import stat
 
 from oslo.config import cfg
 import six
@@ -38,6 +40,10 @@ CONF.register_opts(service_opts)
 
 LOG = logging.getLogger(__name__)
 
+# Size of the blocks compared when looking for chunks of zeroes.
+ZERO_BLOCK_SIZE = 64 * 1024
+ZERO_BLOCK = '\0' * ZERO_BLOCK_SIZE
+
 
 class BackupMetadataAPI(base.Base):
 
@@ -258,6 +264,41 @@ class BackupDriver(base.Base):
     def put_metadata(self, volume_id, json_metadata):
         self.backup_meta_api.put(volume_id, json_metadata)
 
+    @staticmethod
+    def _is_zero_chunk(data):
+        """Return True if data only holds zero bytes.
+
+        Data is compared block by block, so allocated chunks are usually
+        rejected after looking at their first block.
+        """
+        for offset in xrange(0, len(data), ZERO_BLOCK_SIZE):
+            block = data[offset:offset + ZERO_BLOCK_SIZE]
+            if block != ZERO_BLOCK[:len(block)]:
+                return False
+        return True
+
+    @staticmethod
+    def _skip_hole(volume_file, length):
+        """Skip over length bytes of zeroes in a regular file.
+
+        If volume_file is a regular file that does not extend past the
+        current position, it is extended by length bytes without writing
+        them, which leaves a hole in sparse files, and True is returned.
+        Otherwise False is returned and the caller has to zero the range.
+        """
+        try:
+            fileno = volume_file.fileno()
+            offset = volume_file.tell()
+        except (AttributeError, IOError):
+            return False
+        volume_file.flush()
+        file_stat = os.fstat(fileno)
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size > offset:
+            return False
+        volume_file.truncate(offset + length)
+        volume_file.seek(offset + length)
+        return True
+
     @abc.abstractmethod
     def backup(self, backup, volume_file, backup_metadata=False):
         """Start a backup of a specified volume."""
@@ -43,6 +43,7 @@ restore to a new volume (default).
 """
 
 import fcntl
+import functools
 import os
 import re
 import subprocess
@@ -86,6 +87,10 @@ service_opts = [
                help='RBD stripe unit to use when creating a backup image.'),
     cfg.IntOpt('backup_ceph_stripe_count', default=0,
                help='RBD stripe count to use when creating a backup image.'),
+    cfg.IntOpt('backup_ceph_connection_pool_size', default=4,
+               help='Maximum number of idle connections to the Ceph '
+                    'cluster kept open for reuse, for each pool. Set to 0 '
+                    'to connect for every operation.'),
     cfg.BoolOpt('restore_discard_excess_bytes', default=True,
                 help='If True, always discard excess bytes when restoring '
                      'volumes i.e. pad with zeroes.')
@@ -234,26 +239,34 @@ class CephBackupDriver(BackupDriver):
 
         return (old_format, features)
 
+    def _get_rados_connection_pool(self, pool=None):
+        pool = strutils.safe_encode(pool or self._ceph_backup_pool)
+        return rbd_driver.get_rados_connection_pool(
+            self.rados, self._ceph_backup_user, self._ceph_backup_conf, pool,
+            functools.partial(self._open_rados_connection, pool),
+            CONF.backup_ceph_connection_pool_size)
+
     def _connect_to_rados(self, pool=None):
         """Establish connection to the backup Ceph cluster."""
+        return self._get_rados_connection_pool(pool).get()
+
+    def _disconnect_from_rados(self, client, ioctx, pool=None, failed=False):
+        """Give a connection to the backup Ceph cluster back to the pool."""
+        self._get_rados_connection_pool(pool).put(client, ioctx,
+                                                  failed=failed)
+
+    def _open_rados_connection(self, pool):
         client = self.rados.Rados(rados_id=self._ceph_backup_user,
                                   conffile=self._ceph_backup_conf)
         try:
             client.connect()
-            pool_to_open = strutils.safe_encode(pool or self._ceph_backup_pool)
-            ioctx = client.open_ioctx(pool_to_open)
+            ioctx = client.open_ioctx(pool)
             return client, ioctx
         except self.rados.Error:
             # shutdown cannot raise an exception
             client.shutdown()
             raise
 
-    def _disconnect_from_rados(self, client, ioctx):
-        """Terminate connection with the backup Ceph cluster."""
-        # closing an ioctx cannot raise an exception
-        ioctx.close()
-        client.shutdown()
-
     def _get_backup_base_name(self, volume_id, backup_id=None,
                               diff_format=False):
         """Return name of base image used for backup.
@@ -298,6 +311,22 @@ class CephBackupDriver(BackupDriver):
                     volume.write(zeroes)
                     volume.flush()
 
+    def _skip_zero_bytes(self, dest, length):
+        """Move past length bytes of zeroes in dest without writing them.
+
+        RBD images get the range discarded, regular files are extended
+        sparsely when the range is past their end, and anything else has
+        zeroes written to it.
+        """
+        offset = dest.tell()
+        LOG.debug("Skipping %(length)s bytes of zeroes at offset %(offset)s" %
+                  {'length': length, 'offset': offset})
+        if self._file_is_rbd(dest):
+            self._discard_bytes(dest, offset, length)
+            dest.seek(offset + length)
+        elif not self._skip_hole(dest, length):
+            self._discard_bytes(dest, offset, length)
+
     def _transfer_data(self, src, src_name, dest, dest_name, length):
         """Transfer data between files (Python IO objects)."""
         LOG.debug("Transferring data between '%(src)s' and '%(dest)s'" %
@@ -319,8 +348,11 @@ class CephBackupDriver(BackupDriver):
 
                 return
 
-            dest.write(data)
-            dest.flush()
+            if self._is_zero_chunk(data):
+                self._skip_zero_bytes(dest, len(data))
+            else:
+                dest.write(data)
+                dest.flush()
             delta = (time.time() - before)
             rate = (self.chunk_size / delta) / 1024
             LOG.debug((_("Transferred chunk %(chunk)s of %(chunks)s "
@@ -339,8 +371,11 @@ class CephBackupDriver(BackupDriver):
                 if CONF.restore_discard_excess_bytes:
                     self._discard_bytes(dest, dest.tell(), rem)
             else:
-                dest.write(data)
-                dest.flush()
+                if self._is_zero_chunk(data):
+                    self._skip_zero_bytes(dest, len(data))
+                else:
+                    dest.write(data)
+                    dest.flush()
                 # yield to any other pending backups
                 eventlet.sleep(0)
 
@@ -28,19 +28,35 @@
                                     failed Swift operations (default: 10).
 :backup_compression_algorithm: Compression algorithm to use for volume
                                backups. Supported options are:
-                               None (to disable), zlib and bz2 (default: zlib)
+                               None (to disable), zlib, bz2, lz4, zstd and
+                               auto (default: zlib)
+:backup_compression_min_ratio: Store chunks uncompressed unless compression
+                               reduces their size by at least this ratio
+                               (default: 0, always compress).
+:backup_swift_concurrency: The number of Swift objects transferred in
+                           parallel by backup and restore (default: 1).
+:backup_swift_max_memory: The maximum number of bytes of volume data held
+                          in memory by parallel transfers
+                          (default: 524288000).
 """
 
+import collections
 import hashlib
+import itertools
 import json
 import os
 import socket
+import sys
+import time
 
 import eventlet
+from eventlet import pools
+from eventlet import tpool
 from oslo.config import cfg
 import six
 from swiftclient import client as swift
 
+from cinder.backup import compression
 from cinder.backup.driver import BackupDriver
 from cinder import exception
 from cinder.i18n import _
@@ -93,7 +109,25 @@ swiftbackup_service_opts = [
                help='The backoff time in seconds between Swift retries'),
     cfg.StrOpt('backup_compression_algorithm',
                default='zlib',
-               help='Compression algorithm (None to disable)'),
+               help='Compression algorithm (None to disable). One of zlib, '
+                    'bz2, lz4 or zstd, or auto to use the fastest one '
+                    'whose Python bindings are installed'),
+    cfg.FloatOpt('backup_compression_min_ratio',
+                 default=0.0,
+                 help='Chunks whose size is not reduced by at least this '
+                      'ratio by compression are stored uncompressed, for '
+                      'example 1.1 to require a saving of about 10%. 0 '
+                      'always stores chunks compressed'),
+    cfg.IntOpt('backup_swift_concurrency',
+               default=1,
+               help='The number of Swift objects uploaded or downloaded in '
+                    'parallel by a backup or restore'),
+    cfg.IntOpt('backup_swift_max_memory',
+               default=524288000,
+               help='The maximum number of bytes of volume data held in '
+                    'memory by parallel Swift transfers. Limits the '
+                    'effective backup_swift_concurrency to this value '
+                    'divided by backup_swift_object_size'),
 ]
 
 CONF = cfg.CONF
@@ -104,23 +138,15 @@ class SwiftBackupDriver(BackupDriver):
     """Provides backup, restore and delete of backup objects within Swift."""
 
     DRIVER_VERSION = '1.0.0'
-    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1'}
+    # The object list of incremental backups references objects of their
+    # parent backups, and sparse backups list holes instead of objects of
+    # zeroes, neither of which restores of version 1.0.0 understand.
+    EXTENDED_VERSION = '1.1.0'
+    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1',
+                              '1.1.0': '_restore_v1_1'}
 
     def _get_compressor(self, algorithm):
-        try:
-            if algorithm.lower() in ('none', 'off', 'no'):
-                return None
-            elif algorithm.lower() in ('zlib', 'gzip'):
-                import zlib as compressor
-                return compressor
-            elif algorithm.lower() in ('bz2', 'bzip2'):
-                import bz2 as compressor
-                return compressor
-        except ImportError:
-            pass
-
-        err = _('unsupported compression algorithm: %s') % algorithm
-        raise ValueError(unicode(err))
+        return compression.get_compressor(algorithm)
 
     def __init__(self, context, db_driver=None):
         super(SwiftBackupDriver, self).__init__(context, db_driver)
@@ -151,8 +177,9 @@ class SwiftBackupDriver(BackupDriver):
         self.data_block_size_bytes = CONF.backup_swift_object_size
         self.swift_attempts = CONF.backup_swift_retry_attempts
         self.swift_backoff = CONF.backup_swift_retry_backoff
-        self.compressor = \
-            self._get_compressor(CONF.backup_compression_algorithm)
+        self.compression_algorithm = \
+            compression.resolve(CONF.backup_compression_algorithm)
+        self.compressor = self._get_compressor(self.compression_algorithm)
         LOG.debug('Connect to %s in "%s" mode' % (CONF.backup_swift_url,
                                                   CONF.backup_swift_auth))
         if CONF.backup_swift_auth == 'single_user':
@@ -161,7 +188,11 @@ class SwiftBackupDriver(BackupDriver):
                             "but %(param)s not set")
                           % {'param': 'backup_swift_user'})
                 raise exception.ParameterNotFound(param='backup_swift_user')
-            self.conn = swift.Connection(
+        self.conn = self._create_connection()
+
+    def _create_connection(self):
+        if CONF.backup_swift_auth == 'single_user':
+            return swift.Connection(
                 authurl=CONF.backup_swift_url,
                 auth_version=CONF.backup_swift_auth_version,
                 tenant_name=CONF.backup_swift_tenant,
@@ -169,11 +200,45 @@ class SwiftBackupDriver(BackupDriver):
                 key=CONF.backup_swift_key,
                 retries=self.swift_attempts,
                 starting_backoff=self.swift_backoff)
-        else:
-            self.conn = swift.Connection(retries=self.swift_attempts,
-                                         preauthurl=self.swift_url,
-                                         preauthtoken=self.context.auth_token,
-                                         starting_backoff=self.swift_backoff)
+        return swift.Connection(retries=self.swift_attempts,
+                                preauthurl=self.swift_url,
+                                preauthtoken=self.context.auth_token,
+                                starting_backoff=self.swift_backoff)
+
+    def _transfer_window(self):
+        """Return the number of objects that may be in flight at once."""
+        budget = CONF.backup_swift_max_memory // self.data_block_size_bytes
+        return max(1, min(CONF.backup_swift_concurrency, budget))
+
+    @staticmethod
+    def _spawn_transfer(func, *args):
+        """Run a transfer in a new green thread and return the thread.
+
+        Failures are handed to _wait_transfer() instead of being raised in
+        the green thread, where the hub would print them.
+        """
+        def run():
+            try:
+                return func(*args), None
+            except Exception:
+                return None, sys.exc_info()
+        return eventlet.spawn(run)
+
+    @staticmethod
+    def _wait_transfer(thread):
+        """Return the result of a transfer, re-raising its failure."""
+        result, exc_info = thread.wait()
+        if exc_info is not None:
+            six.reraise(*exc_info)
+        return result
+
+    def _connection_pool(self, size):
+        """Return a pool of Swift connections for parallel transfers.
+
+        swiftclient connections can not be shared between green threads,
+        so each transfer in flight checks out a connection of its own.
+        """
+        return pools.Pool(max_size=size, create=self._create_connection)
 
     def _create_container(self, context, backup):
         backup_id = backup['id']
@@ -200,8 +265,9 @@ class SwiftBackupDriver(BackupDriver):
         LOG.debug('_generate_swift_object_name_prefix: %s' % prefix)
         return prefix
 
-    def _generate_object_names(self, backup):
-        prefix = backup['service_metadata']
+    def _generate_object_names(self, backup, prefix=None):
+        if prefix is None:
+            prefix = backup['service_metadata']
         swift_objects = self.conn.get_container(backup['container'],
                                                 prefix=prefix,
                                                 full_listing=True)[1]
@@ -215,13 +281,18 @@ class SwiftBackupDriver(BackupDriver):
         return filename
 
     def _write_metadata(self, backup, volume_id, container, object_list,
-                        volume_meta):
+                        volume_meta, parent_id=None):
         filename = self._metadata_filename(backup)
         LOG.debug('_write_metadata started, container name: %(container)s,'
                   ' metadata filename: %(filename)s' %
                   {'container': container, 'filename': filename})
         metadata = {}
-        metadata['version'] = self.DRIVER_VERSION
+        if parent_id or any(self._is_hole(obj) for obj in object_list):
+            metadata['version'] = self.EXTENDED_VERSION
+        else:
+            metadata['version'] = self.DRIVER_VERSION
+        if parent_id:
+            metadata['parent_id'] = parent_id
         metadata['backup_id'] = backup['id']
         metadata['volume_id'] = volume_id
         metadata['backup_name'] = backup['display_name']
@@ -285,43 +356,140 @@ class SwiftBackupDriver(BackupDriver):
                       'availability_zone': availability_zone,
                   })
         object_meta = {'id': 1, 'list': [], 'prefix': object_prefix,
-                       'volume_meta': None}
+                       'volume_meta': None,
+                       'parent_objects': self._get_parent_objects(backup),
+                       'stats': collections.Counter(),
+                       'start_time': time.time()}
         return object_meta, container
 
+    def _get_parent_objects(self, backup):
+        """Return the objects an incremental backup may reuse.
+
+        Objects of the parent backup are keyed by the offset and length of
+        their chunk, and only those with a SHA-256 fingerprint are included.
+        Returns None for full backups.
+        """
+        parent_id = backup.get('parent_id')
+        if not parent_id:
+            return None
+        parent = self.db.backup_get(self.context, parent_id)
+        try:
+            metadata = self._read_metadata(parent)
+        except socket.error as err:
+            raise exception.SwiftConnectionFailed(reason=err)
+        parent_objects = {}
+        for obj in metadata['objects']:
+            object_name, meta = obj.items()[0]
+            if 'sha256' in meta:
+                parent_objects[(meta['offset'], meta['length'])] = obj
+        LOG.debug('incremental backup %(backup_id)s of parent %(parent_id)s '
+                  'can reuse %(count)d objects' %
+                  {'backup_id': backup['id'], 'parent_id': parent_id,
+                   'count': len(parent_objects)})
+        return parent_objects
+
+    @staticmethod
+    def _make_hole(data, data_offset):
+        """Return the object list entry of a chunk of zeroes."""
+        LOG.debug('chunk at offset %d is all zeroes, not uploading it' %
+                  data_offset)
+        return {'hole': {'offset': data_offset, 'length': len(data)}}
+
+    @staticmethod
+    def _is_hole(metadata_object):
+        return 'hole' in metadata_object
+
+    @staticmethod
+    def _sha256(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def _find_parent_object(self, object_meta, data, data_offset, sha256):
+        """Return the parent object holding the same data, if any."""
+        parent_objects = object_meta['parent_objects']
+        if not parent_objects:
+            return None
+        obj = parent_objects.get((data_offset, len(data)))
+        if obj is None or obj.values()[0]['sha256'] != sha256:
+            return None
+        LOG.debug('chunk at offset %(offset)d is unchanged, reusing '
+                  '%(object_name)s' %
+                  {'offset': data_offset, 'object_name': obj.keys()[0]})
+        return obj
+
     def _backup_chunk(self, backup, container, data, data_offset, object_meta):
         """Backup data chunk based on the object metadata and offset."""
         object_prefix = object_meta['prefix']
         object_list = object_meta['list']
         object_id = object_meta['id']
-        object_name = '%s-%05d' % (object_prefix, object_id)
+        object_meta['stats']['read'] += len(data)
+        if self._is_zero_chunk(data):
+            object_list.append(self._make_hole(data, data_offset))
+            return
+        sha256 = self._sha256(data)
+        obj = self._find_parent_object(object_meta, data, data_offset, sha256)
+        if obj is None:
+            object_name = '%s-%05d' % (object_prefix, object_id)
+            obj = self._upload_chunk(self.conn, container, object_name, data,
+                                     data_offset, sha256,
+                                     object_meta['stats'])
+            object_id += 1
+        object_list.append(obj)
+        object_meta['list'] = object_list
+        object_meta['id'] = object_id
+        LOG.debug('Calling eventlet.sleep(0)')
+        eventlet.sleep(0)
+
+    def _compress_chunk(self, data, offload=False):
+        """Compress a data chunk, returning the algorithm used and the data.
+
+        The chunk is returned as is, with algorithm 'none', if compression
+        is disabled or does not reach backup_compression_min_ratio.
+        """
+        if self.compressor is None:
+            LOG.debug('not compressing data')
+            return 'none', data
+        algorithm = self.compression_algorithm
+        if offload:
+            compressed = tpool.execute(self.compressor.compress, data)
+        else:
+            compressed = self.compressor.compress(data)
+        LOG.debug('compressed %(data_size_bytes)d bytes of data '
+                  'to %(comp_size_bytes)d bytes using '
+                  '%(algorithm)s' %
+                  {
+                      'data_size_bytes': len(data),
+                      'comp_size_bytes': len(compressed),
+                      'algorithm': algorithm,
+                  })
+        if len(data) < CONF.backup_compression_min_ratio * len(compressed):
+            LOG.debug('compression ratio too low, storing data uncompressed')
+            return 'none', data
+        return algorithm, compressed
+
+    def _upload_chunk(self, conn, container, object_name, data, data_offset,
+                      sha256, stats, offload=False):
+        """Compress and upload a data chunk, returning its object metadata.
+
+        The sizes of the chunk before and after compression are added to
+        the 'uploaded' and 'stored' counts of stats.  With offload set,
+        compression runs in a native thread so that other green threads can
+        keep transferring data in the meantime.
+        """
         obj = {}
         obj[object_name] = {}
         obj[object_name]['offset'] = data_offset
         obj[object_name]['length'] = len(data)
+        obj[object_name]['sha256'] = sha256
         LOG.debug('reading chunk of data from volume')
-        if self.compressor is not None:
-            algorithm = CONF.backup_compression_algorithm.lower()
-            obj[object_name]['compression'] = algorithm
-            data_size_bytes = len(data)
-            data = self.compressor.compress(data)
-            comp_size_bytes = len(data)
-            LOG.debug('compressed %(data_size_bytes)d bytes of data '
-                      'to %(comp_size_bytes)d bytes using '
-                      '%(algorithm)s' %
-                      {
-                          'data_size_bytes': data_size_bytes,
-                          'comp_size_bytes': comp_size_bytes,
-                          'algorithm': algorithm,
-                      })
-        else:
-            LOG.debug('not compressing data')
-            obj[object_name]['compression'] = 'none'
+        data_size_bytes = len(data)
+        obj[object_name]['compression'], data = \
+            self._compress_chunk(data, offload)
 
         reader = six.StringIO(data)
         LOG.debug('About to put_object')
         try:
-            etag = self.conn.put_object(container, object_name, reader,
-                                        content_length=len(data))
+            etag = conn.put_object(container, object_name, reader,
+                                   content_length=len(data))
         except socket.error as err:
             raise exception.SwiftConnectionFailed(reason=err)
         LOG.debug('swift MD5 for %(object_name)s: %(etag)s' %
@@ -335,12 +503,72 @@ class SwiftBackupDriver(BackupDriver):
                     'swift %(etag)s is not the same as MD5 of object sent '
                     'to swift %(md5)s') % {'etag': etag, 'md5': md5}
             raise exception.InvalidBackup(reason=err)
-        object_list.append(obj)
-        object_id += 1
+        stats['uploaded'] += data_size_bytes
+        stats['stored'] += len(data)
+        return obj
+
+    def _upload_pooled_chunk(self, conns, container, object_name, data,
+                             data_offset, sha256, stats):
+        with conns.item() as conn:
+            return self._upload_chunk(conn, container, object_name, data,
+                                      data_offset, sha256, stats,
+                                      offload=True)
+
+    def _backup_chunks_parallel(self, backup, container, volume_file,
+                                object_meta, window):
+        """Backup the volume with up to window chunks in flight.
+
+        Chunks are read sequentially, then compressed and uploaded by
+        separate green threads.  Reading blocks while window chunks are
+        pending, which bounds memory use, and the object list is assembled
+        in read order whatever order the uploads complete in.
+        """
+        object_prefix = object_meta['prefix']
+        object_list = object_meta['list']
+        object_id = object_meta['id']
+        conns = self._connection_pool(window)
+        # (index in object_list, thread) of the uploads in flight
+        pending = collections.deque()
+
+        def wait_oldest():
+            index, thread = pending.popleft()
+            object_list[index] = self._wait_transfer(thread)
+
+        try:
+            while True:
+                if len(pending) >= window:
+                    wait_oldest()
+                data = volume_file.read(self.data_block_size_bytes)
+                data_offset = volume_file.tell()
+                if data == '':
+                    break
+                object_meta['stats']['read'] += len(data)
+                if self._is_zero_chunk(data):
+                    object_list.append(self._make_hole(data, data_offset))
+                    continue
+                sha256 = tpool.execute(self._sha256, data)
+                obj = self._find_parent_object(object_meta, data,
+                                               data_offset, sha256)
+                if obj is not None:
+                    object_list.append(obj)
+                    continue
+                object_name = '%s-%05d' % (object_prefix, object_id)
+                object_list.append(None)
+                pending.append((len(object_list) - 1,
+                                self._spawn_transfer(
+                                    self._upload_pooled_chunk, conns,
+                                    container, object_name, data,
+                                    data_offset, sha256,
+                                    object_meta['stats'])))
+                object_id += 1
+                data = None
+            while pending:
+                wait_oldest()
+        finally:
+            for index, thread in pending:
+                thread.kill()
         object_meta['list'] = object_list
         object_meta['id'] = object_id
-        LOG.debug('Calling eventlet.sleep(0)')
-        eventlet.sleep(0)
 
     def _finalize_backup(self, backup, container, object_meta):
         """Finalize the backup by updating its metadata on Swift."""
@@ -352,13 +580,38 @@ class SwiftBackupDriver(BackupDriver):
                                  backup['volume_id'],
                                  container,
                                  object_list,
-                                 volume_meta)
+                                 volume_meta,
+                                 parent_id=backup.get('parent_id'))
         except socket.error as err:
             raise exception.SwiftConnectionFailed(reason=err)
-        self.db.backup_update(self.context, backup['id'],
-                              {'object_count': object_id})
+        stats = self._backup_stats(object_meta)
+        LOG.debug('backup %(backup_id)s transferred %(throughput)s bytes/s '
+                  'with compression ratio %(compression_ratio)s' %
+                  dict(stats, backup_id=backup['id']))
+        stats['object_count'] = object_id
+        self.db.backup_update(self.context, backup['id'], stats)
         LOG.debug('backup %s finished.' % backup['id'])
 
+    @staticmethod
+    def _backup_stats(object_meta):
+        """Return the throughput and compression ratio of a backup.
+
+        The throughput is the number of bytes of volume data backed up per
+        second, and the compression ratio is the size of the data uploaded
+        divided by its compressed size.  Either is None when there is
+        nothing to measure.
+        """
+        stats = object_meta['stats']
+        elapsed = time.time() - object_meta['start_time']
+        throughput = None
+        if elapsed > 0:
+            throughput = int(stats['read'] / elapsed)
+        compression_ratio = None
+        if stats['stored']:
+            compression_ratio = float(stats['uploaded']) / stats['stored']
+        return {'throughput': throughput,
+                'compression_ratio': compression_ratio}
+
     def _backup_metadata(self, backup, object_meta):
         """Backup volume metadata.
 
@@ -378,13 +631,18 @@ class SwiftBackupDriver(BackupDriver):
         """Backup the given volume to Swift."""
 
         object_meta, container = self._prepare_backup(backup)
-        while True:
-            data = volume_file.read(self.data_block_size_bytes)
-            data_offset = volume_file.tell()
-            if data == '':
-                break
-            self._backup_chunk(backup, container, data,
-                               data_offset, object_meta)
+        window = self._transfer_window()
+        if window > 1:
+            self._backup_chunks_parallel(backup, container, volume_file,
+                                         object_meta, window)
+        else:
+            while True:
+                data = volume_file.read(self.data_block_size_bytes)
+                data_offset = volume_file.tell()
+                if data == '':
+                    break
+                self._backup_chunk(backup, container, data,
+                                   data_offset, object_meta)
 
         if backup_metadata:
             try:
@@ -398,11 +656,79 @@ class SwiftBackupDriver(BackupDriver):
 
         self._finalize_backup(backup, container, object_meta)
 
+    def _download_object(self, conn, backup, volume_id, metadata_object,
+                         offload=False):
+        """Download and decompress the data of one backup object."""
+        container = backup['container']
+        object_name = metadata_object.keys()[0]
+        LOG.debug('restoring object from swift. backup: %(backup_id)s, '
+                  'container: %(container)s, swift object name: '
+                  '%(object_name)s, volume: %(volume_id)s' %
+                  {
+                      'backup_id': backup['id'],
+                      'container': container,
+                      'object_name': object_name,
+                      'volume_id': volume_id,
+                  })
+        try:
+            (resp, body) = conn.get_object(container, object_name)
+        except socket.error as err:
+            raise exception.SwiftConnectionFailed(reason=err)
+        compression_algorithm = metadata_object[object_name]['compression']
+        decompressor = self._get_compressor(compression_algorithm)
+        if decompressor is not None:
+            LOG.debug('decompressing data using %s algorithm' %
+                      compression_algorithm)
+            if offload:
+                body = tpool.execute(decompressor.decompress, body)
+            else:
+                body = decompressor.decompress(body)
+        return body
+
+    def _download_pooled_object(self, conns, backup, volume_id,
+                                metadata_object):
+        with conns.item() as conn:
+            return self._download_object(conn, backup, volume_id,
+                                         metadata_object, offload=True)
+
+    def _download_objects_parallel(self, backup, volume_id, metadata_objects,
+                                   window):
+        """Yield the data of the backup objects in order, None for holes.
+
+        Up to window objects are downloaded and decompressed ahead of the
+        one being yielded, so that writing to the volume overlaps with the
+        transfers while memory use stays bounded.
+        """
+        conns = self._connection_pool(window)
+        pending = collections.deque()
+        objects = iter(metadata_objects)
+        try:
+            while True:
+                for metadata_object in objects:
+                    if self._is_hole(metadata_object):
+                        pending.append(None)
+                        continue
+                    pending.append(self._spawn_transfer(
+                        self._download_pooled_object, conns, backup,
+                        volume_id, metadata_object))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    break
+                thread = pending.popleft()
+                if thread is None:
+                    yield None
+                else:
+                    yield self._wait_transfer(thread)
+        finally:
+            for thread in pending:
+                if thread is not None:
+                    thread.kill()
+
     def _restore_v1(self, backup, volume_id, metadata, volume_file):
         """Restore a v1 swift volume backup from swift."""
         backup_id = backup['id']
         LOG.debug('v1 swift volume backup restore of %s started', backup_id)
-        container = backup['container']
         metadata_objects = metadata['objects']
         metadata_object_names = sum((obj.keys() for obj in metadata_objects),
                                     [])
@@ -416,30 +742,36 @@ class SwiftBackupDriver(BackupDriver):
                     'swift does not match object list stored in metadata')
             raise exception.InvalidBackup(reason=err)
 
-        for metadata_object in metadata_objects:
-            object_name = metadata_object.keys()[0]
-            LOG.debug('restoring object from swift. backup: %(backup_id)s, '
-                      'container: %(container)s, swift object name: '
-                      '%(object_name)s, volume: %(volume_id)s' %
-                      {
-                          'backup_id': backup_id,
-                          'container': container,
-                          'object_name': object_name,
-                          'volume_id': volume_id,
-                      })
-            try:
-                (resp, body) = self.conn.get_object(container, object_name)
-            except socket.error as err:
-                raise exception.SwiftConnectionFailed(reason=err)
-            compression_algorithm = metadata_object[object_name]['compression']
-            decompressor = self._get_compressor(compression_algorithm)
-            if decompressor is not None:
-                LOG.debug('decompressing data using %s algorithm' %
-                          compression_algorithm)
-                decompressed = decompressor.decompress(body)
-                volume_file.write(decompressed)
+        self._restore_objects(backup, volume_id, metadata_objects,
+                              volume_file)
+        LOG.debug('v1 swift volume backup restore of %s finished',
+                  backup_id)
+
+    def _write_hole(self, volume_file, length):
+        """Restore length bytes of zeroes to the volume."""
+        LOG.debug('restoring hole of %d bytes' % length)
+        if not self._skip_hole(volume_file, length):
+            volume_file.write('\0' * length)
+
+    def _restore_objects(self, backup, volume_id, metadata_objects,
+                         volume_file):
+        """Write the data of the backup objects to the volume in order."""
+        window = self._transfer_window()
+        if window > 1:
+            chunks = self._download_objects_parallel(backup, volume_id,
+                                                     metadata_objects, window)
+        else:
+            chunks = (None if self._is_hole(metadata_object) else
+                      self._download_object(self.conn, backup, volume_id,
+                                            metadata_object)
+                      for metadata_object in metadata_objects)
+
+        for metadata_object, data in itertools.izip(metadata_objects, chunks):
+            if data is None:
+                self._write_hole(volume_file,
+                                 metadata_object['hole']['length'])
             else:
-                volume_file.write(body)
+                volume_file.write(data)
 
             # force flush every write to avoid long blocking write on close
             volume_file.flush()
@@ -457,7 +789,41 @@ class SwiftBackupDriver(BackupDriver):
             # threads can run, allowing for among other things the service
             # status to be updated
             eventlet.sleep(0)
-        LOG.debug('v1 swift volume backup restore of %s finished',
+
+    def _restore_v1_1(self, backup, volume_id, metadata, volume_file):
+        """Restore a v1.1 (incremental or sparse) swift volume backup.
+
+        Unchanged chunks of an incremental backup are stored in objects of
+        its parent backups, under their prefixes, so the object list is
+        checked against the objects of every prefix it refers to.  Holes
+        in the object list are restored as zeroes.
+        """
+        backup_id = backup['id']
+        LOG.debug('v1.1 swift volume backup restore of %(backup_id)s '
+                  '(parent %(parent_id)s) started' %
+                  {'backup_id': backup_id,
+                   'parent_id': metadata.get('parent_id')})
+        metadata_objects = metadata['objects']
+        object_names_by_prefix = collections.defaultdict(set)
+        for obj in metadata_objects:
+            if self._is_hole(obj):
+                continue
+            object_name = obj.keys()[0]
+            prefix = object_name.rsplit('-', 1)[0]
+            object_names_by_prefix[prefix].add(object_name)
+
+        for prefix, object_names in object_names_by_prefix.iteritems():
+            swift_object_names = set(self._generate_object_names(backup,
+                                                                 prefix))
+            if not object_names <= swift_object_names:
+                err = _('restore_backup aborted, objects of backup prefix '
+                        '%s listed in metadata are missing from swift') % \
+                    prefix
+                raise exception.InvalidBackup(reason=err)
+
+        self._restore_objects(backup, volume_id, metadata_objects,
+                              volume_file)
+        LOG.debug('v1.1 swift volume backup restore of %s finished',
                   backup_id)
 
     def restore(self, backup, volume_id, volume_file):
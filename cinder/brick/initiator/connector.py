@@ -15,10 +15,10 @@
 
 import os
 import socket
-import time
 
 from cinder.brick import exception
 from cinder.brick import executor
+from cinder.brick.initiator import device_waiter
 from cinder.brick.initiator import host_driver
 from cinder.brick.initiator import linuxfc
 from cinder.brick.initiator import linuxscsi
@@ -172,6 +172,7 @@ class ISCSIConnector(InitiatorConnector):
                  device_scan_attempts=DEVICE_SCAN_ATTEMPTS_DEFAULT,
                  *args, **kwargs):
         self._linuxscsi = linuxscsi.LinuxSCSI(root_helper, execute)
+        self._device_waiter = device_waiter.DeviceWaiter()
         super(ISCSIConnector, self).__init__(root_helper, driver=driver,
                                              execute=execute,
                                              device_scan_attempts=
@@ -220,12 +221,7 @@ class ISCSIConnector(InitiatorConnector):
         host_device = self._get_device_path(connection_properties)
 
         # The /dev/disk/by-path/... node is not always present immediately
-        # TODO(justinsb): This retry-with-delay is a pattern, move to utils?
-        tries = 0
-        while not os.path.exists(host_device):
-            if tries >= self.device_scan_attempts:
-                raise exception.VolumeDeviceNotFound(device=host_device)
-
+        def _rescan(tries):
             LOG.warn(_("ISCSI volume not yet found at: %(host_device)s. "
                        "Will rescan & retry.  Try number: %(tries)s"),
                      {'host_device': host_device,
@@ -234,9 +230,10 @@ class ISCSIConnector(InitiatorConnector):
             # The rescan isn't documented as being necessary(?), but it helps
             self._run_iscsiadm(connection_properties, ("--rescan",))
 
-            tries = tries + 1
-            if not os.path.exists(host_device):
-                time.sleep(tries ** 2)
+        found, tries = self._device_waiter.wait_with_rescan(
+            [host_device], self.device_scan_attempts, _rescan)
+        if found is None:
+            raise exception.VolumeDeviceNotFound(device=host_device)
 
         if tries != 0:
             LOG.debug("Found iSCSI node %(host_device)s "
@@ -555,6 +552,7 @@ class FibreChannelConnector(InitiatorConnector):
                  *args, **kwargs):
         self._linuxscsi = linuxscsi.LinuxSCSI(root_helper, execute)
         self._linuxfc = linuxfc.LinuxFibreChannel(root_helper, execute)
+        self._device_waiter = device_waiter.DeviceWaiter()
         super(FibreChannelConnector, self).__init__(root_helper, driver=driver,
                                                     execute=execute,
                                                     device_scan_attempts=
@@ -614,42 +612,29 @@ class FibreChannelConnector(InitiatorConnector):
         # The /dev/disk/by-path/... node is not always present immediately
         # We only need to find the first device.  Once we see the first device
         # multipath will have any others.
-        def _wait_for_device_discovery(host_devices):
-            tries = self.tries
-            for device in host_devices:
-                LOG.debug("Looking for Fibre Channel dev %(device)s",
-                          {'device': device})
-                if os.path.exists(device):
-                    self.host_device = device
-                    # get the /dev/sdX device.  This is used
-                    # to find the multipath device.
-                    self.device_name = os.path.realpath(device)
-                    raise loopingcall.LoopingCallDone()
-
-            if self.tries >= self.device_scan_attempts:
-                msg = _("Fibre Channel volume device not found.")
-                LOG.error(msg)
-                raise exception.NoFibreChannelVolumeDeviceFound()
+        LOG.debug("Looking for Fibre Channel devs %(devices)s",
+                  {'devices': host_devices})
 
+        def _rescan(tries):
             LOG.warn(_("Fibre volume not yet found. "
                        "Will rescan & retry.  Try number: %(tries)s"),
                      {'tries': tries})
 
             self._linuxfc.rescan_hosts(hbas)
-            self.tries = self.tries + 1
-
-        self.host_device = None
-        self.device_name = None
-        self.tries = 0
-        timer = loopingcall.FixedIntervalLoopingCall(
-            _wait_for_device_discovery, host_devices)
-        timer.start(interval=2).wait()
 
-        tries = self.tries
-        if self.host_device is not None and self.device_name is not None:
-            LOG.debug("Found Fibre Channel volume %(name)s "
-                      "(after %(tries)s rescans)",
-                      {'name': self.device_name, 'tries': tries})
+        self.host_device, self.tries = self._device_waiter.wait_with_rescan(
+            host_devices, self.device_scan_attempts, _rescan, interval=2)
+        if self.host_device is None:
+            msg = _("Fibre Channel volume device not found.")
+            LOG.error(msg)
+            raise exception.NoFibreChannelVolumeDeviceFound()
+
+        # get the /dev/sdX device.  This is used
+        # to find the multipath device.
+        self.device_name = os.path.realpath(self.host_device)
+        LOG.debug("Found Fibre Channel volume %(name)s "
+                  "(after %(tries)s rescans)",
+                  {'name': self.device_name, 'tries': self.tries})
 
         # see if the new drive is part of a multipath
         # device.  If so, we'll use the multipath device.
@@ -0,0 +1,169 @@
+# Copyright 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Waiting for device nodes, such as the /dev/disk/by-path links of volumes.
+
+The directories of the devices are watched with inotify, so that waiters
+wake up as soon as udev creates the devices, and polled at a short
+interval where inotify isn't available.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import time
+
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Interval of the polling fallback.
+POLL_INTERVAL = 0.1
+# Events of a watched directory may be missed, for instance if it is
+# removed and created again, so devices are checked at least this often.
+WATCH_RECHECK_INTERVAL = 1
+
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_CLOEXEC = 0o2000000
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        libc_name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, 'inotify_init1'):
+            libc = False
+        _libc = libc
+    return _libc
+
+
+class _InotifyWatch(object):
+    """Watches directories for new entries."""
+
+    def __init__(self, directories):
+        libc = _get_libc()
+        if not libc:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        try:
+            for directory in directories:
+                wd = libc.inotify_add_watch(self._fd, directory,
+                                            _IN_CREATE | _IN_MOVED_TO)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(),
+                                  'inotify_add_watch failed', directory)
+        except Exception:
+            self.close()
+            raise
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for entries to be added."""
+        readable = select.select([self._fd], [], [], timeout)[0]
+        if readable:
+            # The events don't matter, only that there were some.  A
+            # single read never blocks, events left over only wake up the
+            # next wait early.
+            try:
+                os.read(self._fd, 4096)
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _first_existing(paths):
+    for path in paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class DeviceWaiter(object):
+    """Waits for any of a list of device paths to appear."""
+
+    def __init__(self, use_inotify=True, poll_interval=POLL_INTERVAL):
+        self.use_inotify = use_inotify
+        self.poll_interval = poll_interval
+
+    def _watch(self, paths):
+        if not self.use_inotify:
+            return None
+        directories = set(os.path.dirname(path) for path in paths)
+        try:
+            return _InotifyWatch(directories)
+        except OSError as e:
+            LOG.debug("Polling for devices %(paths)s, they can't be "
+                      "watched: %(error)s", {'paths': paths, 'error': e})
+            return None
+
+    def wait(self, paths, timeout):
+        """Wait up to timeout seconds for any of paths to exist.
+
+        :returns: the first of paths that exists, or None at the deadline
+        """
+        deadline = time.time() + timeout
+        found = _first_existing(paths)
+        if found is not None or timeout <= 0:
+            return found
+
+        watch = self._watch(paths)
+        try:
+            while True:
+                # Check again once watched, the device may have just
+                # appeared.
+                found = _first_existing(paths)
+                remaining = deadline - time.time()
+                if found is not None or remaining <= 0:
+                    return found
+                if watch is not None:
+                    watch.wait(min(remaining, WATCH_RECHECK_INTERVAL))
+                else:
+                    time.sleep(min(remaining, self.poll_interval))
+        finally:
+            if watch is not None:
+                watch.close()
+
+    def wait_with_rescan(self, paths, attempts, rescan, interval=None):
+        """Wait for any of paths to exist, rescanning while they don't.
+
+        Whenever none of paths exists, rescan is called with the number of
+        the try and the waiter waits up to interval seconds, or the square
+        of the number of tries when interval is None, returning as soon as
+        one of them appears.  The whole wait is bounded by the sum of those
+        waits, however long the rescans take.
+
+        :returns: a tuple of the first of paths that exists, or None if
+                  none did after all attempts, and the number of rescans
+        """
+        waits = [interval or tries ** 2 for tries in range(1, attempts + 1)]
+        deadline = time.time() + sum(waits)
+        tries = 0
+        found = _first_existing(paths)
+        while found is None and tries < attempts:
+            rescan(tries)
+            tries += 1
+            timeout = min(waits[tries - 1], deadline - time.time())
+            found = self.wait(paths, timeout)
+        return found, tries
@@ -23,9 +23,12 @@ import re
 import stat
 import time
 
+from eventlet import event
+
 from cinder.brick import exception
 from cinder.brick import executor
 from cinder.i18n import _
+from cinder.openstack.common import excutils
 from cinder.openstack.common import fileutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import processutils as putils
@@ -34,6 +37,86 @@ from cinder import utils
 LOG = logging.getLogger(__name__)
 
 
+class TargetInventory(object):
+    """In-memory inventory of the targets of a target helper.
+
+    Listing the targets of a host with thousands of them is slow, so the
+    inventory lists them once, with the list_targets callable returning a
+    dict of target info keyed by iqn, and then follows the targets the
+    helper creates and removes.  Helpers invalidate it when a command
+    fails, and looking up a target missing from the inventory lists the
+    targets again, so that changes made behind the helper's back are seen.
+
+    Only one listing runs at a time, later lookups wait for it, and the
+    targets added and removed while it runs are applied to its result.
+    """
+
+    def __init__(self, list_targets):
+        self._list_targets = list_targets
+        self._targets = None
+        # (iqn, info) for each target added or removed while the targets
+        # are listed, with an info of None for a removed target, or None
+        # when not listing.
+        self._changes = None
+        # Set when the inventory is invalidated while the targets are
+        # listed.
+        self._invalidated = False
+        self._listed = None
+
+    def refresh(self):
+        """List the targets again and return them."""
+        if self._listed is not None:
+            return self._listed.wait()
+
+        listed = self._listed = event.Event()
+        self._changes = []
+        self._invalidated = False
+        try:
+            targets = self._list_targets()
+        except Exception as exc:
+            with excutils.save_and_reraise_exception():
+                self._listed = self._changes = None
+                listed.send_exception(exc)
+
+        for iqn, info in self._changes:
+            if info is None:
+                targets.pop(iqn, None)
+            else:
+                targets[iqn] = info
+        if not self._invalidated:
+            self._targets = targets
+        self._listed = self._changes = None
+        listed.send(targets)
+        return targets
+
+    def get(self, iqn):
+        """Return the info of the target iqn, or None if it doesn't exist."""
+        targets = self._targets
+        if targets is None or iqn not in targets:
+            targets = self.refresh()
+        return targets.get(iqn)
+
+    def cached(self):
+        """Return the targets as last listed, or None if not listed."""
+        return self._targets
+
+    def add(self, iqn, info):
+        if self._changes is not None:
+            self._changes.append((iqn, info))
+        if self._targets is not None:
+            self._targets[iqn] = info
+
+    def remove(self, iqn):
+        if self._changes is not None:
+            self._changes.append((iqn, None))
+        if self._targets is not None:
+            self._targets.pop(iqn, None)
+
+    def invalidate(self):
+        self._invalidated = True
+        self._targets = None
+
+
 class TargetAdmin(executor.Executor):
     """iSCSI target administration.
 
@@ -43,10 +126,15 @@ class TargetAdmin(executor.Executor):
     def __init__(self, cmd, root_helper, execute):
         super(TargetAdmin, self).__init__(root_helper, execute=execute)
         self._cmd = cmd
+        self.inventory = TargetInventory(self._get_targets)
 
     def _run(self, *args, **kwargs):
         self._execute(self._cmd, *args, run_as_root=True, **kwargs)
 
+    def _get_targets(self):
+        """List the targets, for the inventory."""
+        raise NotImplementedError()
+
     def create_iscsi_target(self, name, tid, lun, path,
                             chap_auth=None, **kwargs):
         """Create an iSCSI target and logical unit."""
@@ -104,36 +192,73 @@ class TgtAdm(TargetAdmin):
         self.volumes_dir = volumes_dir
 
     def _get_target(self, iqn):
-        (out, err) = self._execute('tgt-admin', '--show', run_as_root=True)
-        lines = out.split('\n')
-        for line in lines:
-            if iqn in line:
-                parsed = line.split()
-                tid = parsed[1]
-                return tid[:-1]
+        target = self.inventory.get(iqn)
+        if target is None:
+            return None
+        return target['tid']
 
-        return None
-
-    def _verify_backing_lun(self, iqn, tid):
-        backing_lun = True
-        capture = False
-        target_info = []
+    def _get_targets(self):
+        """Return the tid and LUNs of every target, from a single listing.
 
+        :returns: a dict of {'tid': tid, 'luns': [LUN numbers]} for each
+                  target, keyed by iqn
+        """
         (out, err) = self._execute('tgt-admin', '--show', run_as_root=True)
-        lines = out.split('\n')
-
-        for line in lines:
-            if iqn in line and "Target %s" % tid in line:
-                capture = True
-            if capture:
-                target_info.append(line)
-            if iqn not in line and 'Target ' in line:
-                capture = False
-
-        if '        LUN: 1' not in target_info:
-            backing_lun = False
+        return self._parse_targets(out)
+
+    @staticmethod
+    def _parse_targets(out):
+        targets = {}
+        luns = None
+        for line in out.split('\n'):
+            if line.startswith('Target '):
+                parsed = line.split()
+                luns = []
+                targets[parsed[2]] = {'tid': parsed[1][:-1], 'luns': luns}
+            elif luns is not None and line.strip().startswith('LUN: '):
+                luns.append(int(line.split(':')[1]))
+        return targets
+
+    def _target_exists(self, iqn, tid):
+        """Check if target tid is still iqn, without listing all targets."""
+        try:
+            (out, err) = self._execute('tgtadm', '--lld', 'iscsi',
+                                       '--op', 'show', '--mode', 'target',
+                                       '--tid', tid, run_as_root=True)
+        except putils.ProcessExecutionError:
+            return False
+        return iqn in out
+
+    def _get_new_target(self, iqn):
+        """Return the tid of the target tgt-admin --update made for iqn.
+
+        tgt-admin gives a new target the tid after the highest one, so
+        once the targets are listed only that target is shown and added
+        to the inventory, rather than listing all of them again.
+        """
+        targets = self.inventory.cached()
+        if targets is not None:
+            if iqn in targets:
+                return targets[iqn]['tid']
+            tids = [int(target['tid']) for target in targets.values()]
+            tid = str(max(tids or [0]) + 1)
+            try:
+                (out, err) = self._execute('tgtadm', '--lld', 'iscsi',
+                                           '--op', 'show', '--mode',
+                                           'target', '--tid', tid,
+                                           run_as_root=True)
+            except putils.ProcessExecutionError:
+                out = ''
+            target = self._parse_targets(out).get(iqn)
+            if target is not None:
+                self.inventory.add(iqn, target)
+                return tid
+        return self._get_target(iqn)
 
-        return backing_lun
+    def _verify_backing_lun(self, iqn, tid):
+        target = self.inventory.get(iqn)
+        return (target is not None and target['tid'] == tid and
+                1 in target['luns'])
 
     def _recreate_backing_lun(self, iqn, tid, name, path):
         LOG.warning(_('Attempting recreate of backing lun...'))
@@ -158,6 +283,9 @@ class TgtAdm(TargetAdmin):
                         "iscsi backing lun for volume "
                         "id:%(vol_id)s: %(e)s")
                       % {'vol_id': name, 'e': e})
+        finally:
+            # The LUNs of the target changed, or failed to.
+            self.inventory.invalidate()
 
     def create_iscsi_target(self, name, tid, lun, path,
                             chap_auth=None, **kwargs):
@@ -200,30 +328,18 @@ class TgtAdm(TargetAdmin):
                                        run_as_root=True)
             LOG.debug("StdOut from tgt-admin --update: %s", out)
             LOG.debug("StdErr from tgt-admin --update: %s", err)
-
-            # Grab targets list for debug
-            # Consider adding a check for lun 0 and 1 for tgtadm
-            # before considering this as valid
-            (out, err) = self._execute('tgtadm',
-                                       '--lld',
-                                       'iscsi',
-                                       '--op',
-                                       'show',
-                                       '--mode',
-                                       'target',
-                                       run_as_root=True)
-            LOG.debug("Targets after update: %s" % out)
         except putils.ProcessExecutionError as e:
             LOG.warning(_("Failed to create iscsi target for volume "
                         "id:%(vol_id)s: %(e)s")
                         % {'vol_id': vol_id, 'e': e})
+            self.inventory.invalidate()
 
             #Don't forget to remove the persistent file we created
             os.unlink(volume_path)
             raise exception.ISCSITargetCreateFailed(volume_id=vol_id)
 
         iqn = '%s%s' % (self.iscsi_target_prefix, vol_id)
-        tid = self._get_target(iqn)
+        tid = self._get_new_target(iqn)
         if tid is None:
             LOG.error(_("Failed to create iscsi target for volume "
                         "id:%(vol_id)s. Please ensure your tgtd config file "
@@ -237,6 +353,10 @@ class TgtAdm(TargetAdmin):
         # or something related, so we're going to add some code
         # here that verifies the backing lun (lun 1) was created
         # and we'll try and recreate it if it's not there
+        if not self._verify_backing_lun(iqn, tid):
+            # The target may have been listed before the update added the
+            # backing lun to it.
+            self.inventory.invalidate()
         if not self._verify_backing_lun(iqn, tid):
             try:
                 self._recreate_backing_lun(iqn, tid, name, path)
@@ -268,6 +388,7 @@ class TgtAdm(TargetAdmin):
                             vol_uuid_file)
         else:
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
+        tid = self._get_target(iqn)
         try:
             # NOTE(vish): --force is a workaround for bug:
             #             https://bugs.launchpad.net/cinder/+bug/1159948
@@ -280,7 +401,9 @@ class TgtAdm(TargetAdmin):
             LOG.error(_("Failed to remove iscsi target for volume "
                         "id:%(vol_id)s: %(e)s")
                       % {'vol_id': vol_id, 'e': e})
+            self.inventory.invalidate()
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
+        self.inventory.remove(iqn)
 
         # NOTE(jdg): There's a bug in some versions of tgt that
         # will sometimes fail silently when using the force flag
@@ -292,7 +415,7 @@ class TgtAdm(TargetAdmin):
         # which the force was aded for but it will however address
         # the cases pointed out in bug:
         #    https://bugs.launchpad.net/cinder/+bug/1304122
-        if self._get_target(iqn):
+        if tid is not None and self._target_exists(iqn, tid):
             try:
                 LOG.warning(_('Silent failure of target removal '
                               'detected, retry....'))
@@ -304,6 +427,7 @@ class TgtAdm(TargetAdmin):
                 LOG.error(_("Failed to remove iscsi target for volume "
                             "id:%(vol_id)s: %(e)s")
                           % {'vol_id': vol_id, 'e': e})
+                self.inventory.invalidate()
                 raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
 
         # NOTE(jdg): This *should* be there still but incase
@@ -477,15 +601,21 @@ class LioAdm(TargetAdmin):
             raise
 
     def _get_target(self, iqn):
+        target = self.inventory.get(iqn)
+        if target is None:
+            return None
+        return target['tid']
+
+    def _get_targets(self):
         (out, err) = self._execute('cinder-rtstool',
                                    'get-targets',
                                    run_as_root=True)
-        lines = out.split('\n')
-        for line in lines:
-            if iqn in line:
-                return line
-
-        return None
+        targets = {}
+        for line in out.split('\n'):
+            line = line.strip()
+            if line:
+                targets[line] = {'tid': line}
+        return targets
 
     def create_iscsi_target(self, name, tid, lun, path,
                             chap_auth=None, **kwargs):
@@ -520,10 +650,14 @@ class LioAdm(TargetAdmin):
             LOG.error(_("Failed to create iscsi target for volume "
                         "id:%s.") % vol_id)
             LOG.error("%s" % e)
+            self.inventory.invalidate()
 
             raise exception.ISCSITargetCreateFailed(volume_id=vol_id)
 
         iqn = '%s%s' % (self.iscsi_target_prefix, vol_id)
+        # rtstool names the target after the iqn, and fails if it can't
+        # create it.
+        self.inventory.add(iqn, {'tid': iqn})
         tid = self._get_target(iqn)
         if tid is None:
             LOG.error(_("Failed to create iscsi target for volume "
@@ -546,7 +680,9 @@ class LioAdm(TargetAdmin):
             LOG.error(_("Failed to remove iscsi target for volume "
                         "id:%s.") % vol_id)
             LOG.error("%s" % e)
+            self.inventory.invalidate()
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
+        self.inventory.remove(iqn)
 
     def show_target(self, tid, iqn=None, **kwargs):
         if iqn is None:
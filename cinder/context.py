@@ -20,6 +20,8 @@
 import copy
 import uuid
 
+from oslo.config import cfg
+
 from cinder.i18n import _
 from cinder.openstack.common import local
 from cinder.openstack.common import log as logging
@@ -27,6 +29,7 @@ from cinder.openstack.common import timeutils
 from cinder import policy
 
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -182,3 +185,22 @@ def get_admin_context(read_deleted="no"):
                           is_admin=True,
                           read_deleted=read_deleted,
                           overwrite=False)
+
+
+def get_internal_tenant_context():
+    """Build and return the Cinder internal tenant context.
+
+    The context is only good for internal Cinder operations, it has no auth
+    token to make requests to other services with.  Returns None when the
+    internal tenant is not configured.
+    """
+    project_id = CONF.cinder_internal_tenant_project_id
+    user_id = CONF.cinder_internal_tenant_user_id
+
+    if project_id and user_id:
+        return RequestContext(user_id=user_id,
+                              project_id=project_id,
+                              is_admin=True)
+    LOG.warn(_('Unable to get internal tenant context: missing required '
+               'config parameters.'))
+    return None
@@ -19,6 +19,7 @@
 """Implementation of SQLAlchemy backend."""
 
 
+import collections
 import functools
 import sys
 import threading
@@ -32,7 +33,7 @@ from oslo.db import options
 from oslo.db.sqlalchemy import session as db_session
 import osprofiler.sqlalchemy
 import sqlalchemy
-from sqlalchemy import or_
+from sqlalchemy import case, or_
 from sqlalchemy.orm import joinedload, joinedload_all
 from sqlalchemy.orm import RelationshipProperty
 from sqlalchemy.sql.expression import literal_column
@@ -250,10 +251,31 @@ def model_query(context, *args, **kwargs):
     return query
 
 
+def _sync_data_get(data_get, context, project_id, session, sync_data,
+                   volume_type_id=None):
+    """Return data_get(project_id), querying it only once per sync_data.
+
+    The sync functions of a resource family, like volumes and gigabytes,
+    are refreshed from the same aggregate query, which is then only run
+    once when quota_reserve refreshes several of them with the same
+    sync_data dict.
+    """
+    if sync_data is None:
+        return data_get(context, project_id, volume_type_id=volume_type_id,
+                        session=session)
+    key = (data_get, project_id, volume_type_id)
+    data = sync_data
+    if key not in data:
+        data[key] = data_get(context, project_id,
+                             volume_type_id=volume_type_id, session=session)
+    return data[key]
+
+
 def _sync_volumes(context, project_id, session, volume_type_id=None,
-                  volume_type_name=None):
-    (volumes, gigs) = _volume_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+                  volume_type_name=None, sync_data=None):
+    (volumes, gigs) = _sync_data_get(
+        _volume_data_get_for_project, context, project_id, session, sync_data,
+        volume_type_id=volume_type_id)
     key = 'volumes'
     if volume_type_name:
         key += '_' + volume_type_name
@@ -261,9 +283,10 @@ def _sync_volumes(context, project_id, session, volume_type_id=None,
 
 
 def _sync_snapshots(context, project_id, session, volume_type_id=None,
-                    volume_type_name=None):
-    (snapshots, gigs) = _snapshot_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+                    volume_type_name=None, sync_data=None):
+    (snapshots, gigs) = _sync_data_get(
+        _snapshot_data_get_for_project, context, project_id, session,
+        sync_data, volume_type_id=volume_type_id)
     key = 'snapshots'
     if volume_type_name:
         key += '_' + volume_type_name
@@ -271,30 +294,33 @@ def _sync_snapshots(context, project_id, session, volume_type_id=None,
 
 
 def _sync_backups(context, project_id, session, volume_type_id=None,
-                  volume_type_name=None):
-    (backups, gigs) = _backup_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+                  volume_type_name=None, sync_data=None):
+    (backups, gigs) = _sync_data_get(
+        _backup_data_get_for_project, context, project_id, session, sync_data,
+        volume_type_id=volume_type_id)
     key = 'backups'
     return {key: backups}
 
 
 def _sync_gigabytes(context, project_id, session, volume_type_id=None,
-                    volume_type_name=None):
-    (_junk, vol_gigs) = _volume_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+                    volume_type_name=None, sync_data=None):
+    (_junk, vol_gigs) = _sync_data_get(
+        _volume_data_get_for_project, context, project_id, session, sync_data,
+        volume_type_id=volume_type_id)
     key = 'gigabytes'
     if volume_type_name:
         key += '_' + volume_type_name
     if CONF.no_snapshot_gb_quota:
         return {key: vol_gigs}
-    (_junk, snap_gigs) = _snapshot_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+    (_junk, snap_gigs) = _sync_data_get(
+        _snapshot_data_get_for_project, context, project_id, session,
+        sync_data, volume_type_id=volume_type_id)
     return {key: vol_gigs + snap_gigs}
 
 
 def _sync_consistencygroups(context, project_id, session,
                             volume_type_id=None,
-                            volume_type_name=None):
+                            volume_type_name=None, sync_data=None):
     (_junk, groups) = _consistencygroup_data_get_for_project(
         context, project_id, session=session)
     key = 'consistencygroups'
@@ -302,10 +328,11 @@ def _sync_consistencygroups(context, project_id, session,
 
 
 def _sync_backup_gigabytes(context, project_id, session, volume_type_id=None,
-                           volume_type_name=None):
+                           volume_type_name=None, sync_data=None):
     key = 'backup_gigabytes'
-    (_junk, backup_gigs) = _backup_data_get_for_project(
-        context, project_id, volume_type_id=volume_type_id, session=session)
+    (_junk, backup_gigs) = _sync_data_get(
+        _backup_data_get_for_project, context, project_id, session, sync_data,
+        volume_type_id=volume_type_id)
     return {key: backup_gigs}
 
 
@@ -749,12 +776,18 @@ def _reservation_create(context, uuid, usage, project_id, resource, delta,
 # code always acquires the lock on quota_usages before acquiring the lock
 # on reservations.
 
-def _get_quota_usages(context, session, project_id):
+def _get_quota_usages(context, session, project_id, resources=None):
     # Broken out for testability
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-        filter_by(project_id=project_id).\
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+        filter_by(project_id=project_id)
+    if resources is not None:
+        # Only lock the usages of the given resources
+        query = query.filter(models.QuotaUsage.resource.in_(resources))
+    # Lock the rows in the same order in every transaction, to avoid
+    # deadlocks between concurrent ones
+    rows = query.order_by(models.QuotaUsage.id).\
         with_lockmode('update').\
         all()
     return dict((row.resource, row) for row in rows)
@@ -770,11 +803,16 @@ def quota_reserve(context, resources, quotas, deltas, expire,
         if project_id is None:
             project_id = context.project_id
 
-        # Get the current usages
-        usages = _get_quota_usages(context, session, project_id)
+        # Get the current usages of the resources to reserve
+        usages = _get_quota_usages(context, session, project_id,
+                                   resources=deltas.keys())
 
-        # Handle usage refresh
-        work = set(deltas.keys())
+        # Handle usage refresh, in the order of the resource names so
+        # that concurrent transactions create missing usages in the same
+        # order
+        work = sorted(deltas.keys(), reverse=True)
+        # Aggregate queries shared by the sync functions of this call
+        sync_data = {}
         while work:
             resource = work.pop()
 
@@ -812,8 +850,14 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                 updates = sync(elevated, project_id,
                                volume_type_id=volume_type_id,
                                volume_type_name=volume_type_name,
-                               session=session)
+                               session=session, sync_data=sync_data)
                 for res, in_use in updates.items():
+                    # The sync routine may refresh a resource whose usage
+                    # has not been locked yet
+                    if res not in usages:
+                        usages.update(_get_quota_usages(
+                            context, session, project_id, resources=[res]))
+
                     # Make sure we have a destination for the usage!
                     if res not in usages:
                         usages[res] = _quota_usage_create(
@@ -833,7 +877,8 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                     # by the call to the sync routine, and we don't
                     # want to double-sync, we make sure all refreshed
                     # resources are dropped from the work set.
-                    work.discard(res)
+                    if res in work:
+                        work.remove(res)
 
                     # NOTE(Vek): We make the assumption that the sync
                     #            routine actually refreshes the
@@ -973,24 +1018,69 @@ def quota_destroy_all_by_project(context, project_id):
             reservation_ref.delete(session=session)
 
 
-@require_admin_context
 @_retry_on_deadlock
-def reservation_expire(context):
+def _reservation_expire_batch(context, current_time, batch_size):
+    """Roll back up to batch_size expired reservations in one transaction.
+
+    :returns: number of reservations rolled back
+    """
     session = get_session()
     with session.begin():
-        current_time = timeutils.utcnow()
-        results = model_query(context, models.Reservation, session=session,
-                              read_deleted="no").\
-            filter(models.Reservation.expire < current_time).\
-            all()
+        query = model_query(context, models.Reservation.id,
+                            models.Reservation.usage_id,
+                            models.Reservation.delta,
+                            session=session, read_deleted="no").\
+            filter(models.Reservation.expire < current_time)
+        if batch_size:
+            query = query.limit(batch_size)
+        results = query.all()
+
+        if not results:
+            return 0
+
+        # Sum the deltas to give back to each usage, and update all of
+        # them in a single statement
+        reserved = collections.defaultdict(int)
+        for _reservation_id, usage_id, delta in results:
+            if delta >= 0:
+                reserved[usage_id] += delta
+        if reserved:
+            model_query(context, models.QuotaUsage, session=session,
+                        read_deleted="no").\
+                filter(models.QuotaUsage.id.in_(reserved.keys())).\
+                update({'reserved': (models.QuotaUsage.reserved -
+                                     case(reserved,
+                                          value=models.QuotaUsage.id,
+                                          else_=0))},
+                       synchronize_session=False)
+
+        reservation_ids = [result[0] for result in results]
+        model_query(context, models.Reservation, session=session).\
+            filter(models.Reservation.id.in_(reservation_ids)).\
+            update({'deleted': True,
+                    'deleted_at': timeutils.utcnow(),
+                    'updated_at': literal_column('updated_at')},
+                   synchronize_session=False)
 
-        if results:
-            for reservation in results:
-                if reservation.delta >= 0:
-                    reservation.usage.reserved -= reservation.delta
-                    reservation.usage.save(session=session)
+    return len(results)
+
+
+@require_admin_context
+def reservation_expire(context, batch_size=None):
+    """Roll back the reservations which have expired.
+
+    The reservations are rolled back by batches of at most batch_size,
+    each in its own transaction, to bound how long locks are held.
 
-                reservation.delete(session=session)
+    :returns: number of reservations rolled back
+    """
+    current_time = timeutils.utcnow()
+    expired = 0
+    while True:
+        count = _reservation_expire_batch(context, current_time, batch_size)
+        expired += count
+        if not batch_size or count < batch_size:
+            return expired
 
 
 ###################
@@ -1078,6 +1168,29 @@ def volume_data_get_for_host(context, host, count_only=False):
         return (result[0] or 0, result[1] or 0)
 
 
+@require_admin_context
+def volume_data_get_for_all_hosts(context, count_only=False):
+    if count_only:
+        rows = model_query(context,
+                           models.Volume.host,
+                           func.count(models.Volume.id),
+                           read_deleted="no").\
+            group_by(models.Volume.host).\
+            all()
+        return dict((host, count or 0) for host, count in rows)
+    else:
+        rows = model_query(context,
+                           models.Volume.host,
+                           func.count(models.Volume.id),
+                           func.sum(models.Volume.size),
+                           read_deleted="no").\
+            group_by(models.Volume.host).\
+            all()
+        # NOTE(vish): convert None to 0
+        return dict((host, (count or 0, size or 0))
+                    for host, count, size in rows)
+
+
 @require_admin_context
 def _volume_data_get_for_project(context, project_id, volume_type_id=None,
                                  session=None):
@@ -1194,7 +1307,14 @@ def volume_detached(context, volume_id):
 
 
 @require_context
-def _volume_get_query(context, session=None, project_only=False):
+def _volume_get_query(context, session=None, project_only=False,
+                      columns=None):
+    if columns:
+        # Only the given columns, without loading any relationship
+        return model_query(context,
+                           *[getattr(models.Volume, column)
+                             for column in columns],
+                           session=session, project_only=project_only)
     if is_admin_context(context):
         return model_query(context, models.Volume, session=session,
                            project_only=project_only).\
@@ -1227,9 +1347,22 @@ def volume_get(context, volume_id):
     return _volume_get(context, volume_id)
 
 
+@require_context
+def volume_status_get(context, volume_id):
+    result = _volume_get_query(context, project_only=True,
+                               columns=('status',)).\
+        filter_by(id=volume_id).\
+        first()
+
+    if not result:
+        raise exception.VolumeNotFound(volume_id=volume_id)
+
+    return result.status
+
+
 @require_admin_context
 def volume_get_all(context, marker, limit, sort_key, sort_dir,
-                   filters=None):
+                   filters=None, columns=None):
     """Retrieves all volumes.
 
     :param context: context to query under
@@ -1242,16 +1375,22 @@ def volume_get_all(context, marker, limit, sort_key, sort_dir,
                     'no_migration_targets'=True causes volumes with either
                     a NULL 'migration_status' or a 'migration_status' that
                     does not start with 'target:' to be retrieved.
+    :param columns: names of the only columns to load; when given, a dict
+                    of those columns is returned for each volume instead
+                    of a Volume with its relationships
     :returns: list of matching volumes
     """
     session = get_session()
     with session.begin():
         # Generate the query
         query = _generate_paginate_query(context, session, marker, limit,
-                                         sort_key, sort_dir, filters)
+                                         sort_key, sort_dir, filters,
+                                         columns=columns)
         # No volumes would match, return empty list
         if query is None:
             return []
+        if columns:
+            return [row._asdict() for row in query.all()]
         return query.all()
 
 
@@ -1270,7 +1409,12 @@ def volume_get_all_by_host(context, host):
             host_attr = getattr(models.Volume, 'host')
             conditions = [host_attr == host,
                           host_attr.op('LIKE')(host + '#%')]
-            result = _volume_get_query(context).filter(or_(*conditions)).all()
+            # Both forms sort at or after host, and databases generally
+            # can't use an index for LIKE, so bound the scan of the host
+            # index by that.
+            result = _volume_get_query(context).\
+                filter(host_attr >= host).\
+                filter(or_(*conditions)).all()
             return result
     elif not host:
         return []
@@ -1284,7 +1428,7 @@ def volume_get_all_by_group(context, group_id):
 
 @require_context
 def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
-                              sort_dir, filters=None):
+                              sort_dir, filters=None, columns=None):
     """"Retrieves all volumes in a project.
 
     :param context: context to query under
@@ -1298,6 +1442,9 @@ def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
                     'no_migration_targets'=True causes volumes with either
                     a NULL 'migration_status' or a 'migration_status' that
                     does not start with 'target:' to be retrieved.
+    :param columns: names of the only columns to load; when given, a dict
+                    of those columns is returned for each volume instead
+                    of a Volume with its relationships
     :returns: list of matching volumes
     """
     session = get_session()
@@ -1308,15 +1455,23 @@ def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
         filters['project_id'] = project_id
         # Generate the query
         query = _generate_paginate_query(context, session, marker, limit,
-                                         sort_key, sort_dir, filters)
+                                         sort_key, sort_dir, filters,
+                                         columns=columns)
         # No volumes would match, return empty list
         if query is None:
             return []
+        if columns:
+            return [row._asdict() for row in query.all()]
         return query.all()
 
 
+def _changes_since_filter(model, changes_since):
+    """Return the criterion of rows created or updated since a time."""
+    return func.coalesce(model.updated_at, model.created_at) >= changes_since
+
+
 def _generate_paginate_query(context, session, marker, limit, sort_key,
-                             sort_dir, filters):
+                             sort_dir, filters, columns=None):
     """Generate the query to include the filters and the paginate options.
 
     Returns a query with sorting / pagination criteria added or None
@@ -1332,10 +1487,13 @@ def _generate_paginate_query(context, session, marker, limit, sort_key,
     :param filters: dictionary of filters; values that are lists,
                     tuples, sets, or frozensets cause an 'IN' test to
                     be performed, while exact matching ('==' operator)
-                    is used for other values
+                    is used for other values, except for 'changes-since'
+                    which selects the rows created or updated since the
+                    given datetime
+    :param columns: names of the only columns to query, see volume_get_all
     :returns: updated query or None
     """
-    query = _volume_get_query(context, session=session)
+    query = _volume_get_query(context, session=session, columns=columns)
 
     if filters:
         filters = filters.copy()
@@ -1355,6 +1513,10 @@ def _generate_paginate_query(context, session, marker, limit, sort_key,
                 LOG.debug(log_msg)
                 return None
 
+        if 'changes-since' in filters:
+            query = query.filter(_changes_since_filter(
+                models.Volume, filters.pop('changes-since')))
+
         # Apply exact match filters for everything else, ensure that the
         # filter value exists on the model
         for key in filters.keys():
@@ -1693,11 +1855,86 @@ def snapshot_get(context, snapshot_id):
     return _snapshot_get(context, snapshot_id)
 
 
+def _generate_snapshot_paginate_query(context, session, marker, limit,
+                                      sort_key, sort_dir, filters):
+    """Generate the snapshot query with filters and paginate options applied.
+
+    Returns None if the given filters will not yield any results, see
+    _generate_paginate_query for the meaning of the parameters.
+    """
+    query = model_query(context, models.Snapshot, session=session).\
+        options(joinedload('snapshot_metadata'))
+
+    if filters:
+        filters = filters.copy()
+
+        if 'changes-since' in filters:
+            query = query.filter(_changes_since_filter(
+                models.Snapshot, filters.pop('changes-since')))
+
+        # Holds the simple exact matches
+        filter_dict = {}
+
+        for key, value in filters.iteritems():
+            try:
+                column_attr = getattr(models.Snapshot, key)
+                # Do not allow relationship properties since those require
+                # schema specific knowledge
+                prop = getattr(column_attr, 'property')
+                if isinstance(prop, RelationshipProperty):
+                    log_msg = (_("'%s' filter key is not valid, "
+                                 "it maps to a relationship.")) % key
+                    LOG.debug(log_msg)
+                    return None
+            except AttributeError:
+                log_msg = _("'%s' filter key is not valid.") % key
+                LOG.debug(log_msg)
+                return None
+
+            if isinstance(value, (list, tuple, set, frozenset)):
+                query = query.filter(column_attr.in_(value))
+            else:
+                filter_dict[key] = value
+
+        if filter_dict:
+            query = query.filter_by(**filter_dict)
+
+    marker_snapshot = None
+    if marker is not None:
+        marker_snapshot = _snapshot_get(context, marker, session)
+
+    return sqlalchemyutils.paginate_query(query, models.Snapshot, limit,
+                                          [sort_key, 'created_at', 'id'],
+                                          marker=marker_snapshot,
+                                          sort_dir=sort_dir)
+
+
 @require_admin_context
-def snapshot_get_all(context):
-    return model_query(context, models.Snapshot).\
-        options(joinedload('snapshot_metadata')).\
-        all()
+def snapshot_get_all(context, filters=None, marker=None, limit=None,
+                     sort_key='created_at', sort_dir='desc'):
+    """Retrieves all snapshots.
+
+    :param context: context to query under
+    :param filters: dictionary of filters; values that are lists,
+                    tuples, sets, or frozensets cause an 'IN' test to
+                    be performed, while exact matching ('==' operator)
+                    is used for other values
+    :param marker: the last item of the previous page, used to determine the
+                   next page of results to return
+    :param limit: maximum number of items to return
+    :param sort_key: single attributes by which results should be sorted
+    :param sort_dir: direction in which results should be sorted (asc, desc)
+    :returns: list of matching snapshots
+    """
+    session = get_session()
+    with session.begin():
+        query = _generate_snapshot_paginate_query(context, session, marker,
+                                                  limit, sort_key, sort_dir,
+                                                  filters)
+        # No snapshots would match, return empty list
+        if query is None:
+            return []
+        return query.all()
 
 
 @require_context
@@ -1720,12 +1957,34 @@ def snapshot_get_all_for_cgsnapshot(context, cgsnapshot_id):
 
 
 @require_context
-def snapshot_get_all_by_project(context, project_id):
-    authorize_project_context(context, project_id)
-    return model_query(context, models.Snapshot).\
-        filter_by(project_id=project_id).\
-        options(joinedload('snapshot_metadata')).\
-        all()
+def snapshot_get_all_by_project(context, project_id, filters=None,
+                                marker=None, limit=None,
+                                sort_key='created_at', sort_dir='desc'):
+    """Retrieves all snapshots in a project.
+
+    :param context: context to query under
+    :param project_id: project for all snapshots being retrieved
+    :param filters: filters for the query, as for snapshot_get_all
+    :param marker: the last item of the previous page, used to determine the
+                   next page of results to return
+    :param limit: maximum number of items to return
+    :param sort_key: single attributes by which results should be sorted
+    :param sort_dir: direction in which results should be sorted (asc, desc)
+    :returns: list of matching snapshots
+    """
+    session = get_session()
+    with session.begin():
+        authorize_project_context(context, project_id)
+        # Add in the project filter without modifying the given filters
+        filters = filters.copy() if filters else {}
+        filters['project_id'] = project_id
+        query = _generate_snapshot_paginate_query(context, session, marker,
+                                                  limit, sort_key, sort_dir,
+                                                  filters)
+        # No snapshots would match, return empty list
+        if query is None:
+            return []
+        return query.all()
 
 
 @require_context
@@ -3137,3 +3396,64 @@ def cgsnapshot_destroy(context, cgsnapshot_id):
                     'deleted': True,
                     'deleted_at': timeutils.utcnow(),
                     'updated_at': literal_column('updated_at')})
+
+
+###############################
+
+
+def _image_volume_cache_query(session=None):
+    session = session or get_session()
+    return session.query(models.ImageVolumeCacheEntry)
+
+
+@require_admin_context
+def image_volume_cache_create(context, host, image_id, image_checksum,
+                              volume_id, size):
+    session = get_session()
+    with session.begin():
+        cache_entry = models.ImageVolumeCacheEntry()
+        cache_entry.host = host
+        cache_entry.image_id = image_id
+        cache_entry.image_checksum = image_checksum
+        cache_entry.volume_id = volume_id
+        cache_entry.size = size
+        session.add(cache_entry)
+        return cache_entry
+
+
+@require_admin_context
+def image_volume_cache_delete(context, volume_id):
+    session = get_session()
+    with session.begin():
+        _image_volume_cache_query(session).\
+            filter_by(volume_id=volume_id).\
+            delete()
+
+
+@require_admin_context
+def image_volume_cache_get_and_update_last_used(context, image_id, host):
+    session = get_session()
+    with session.begin():
+        entry = _image_volume_cache_query(session).\
+            filter_by(image_id=image_id, host=host).\
+            order_by(models.ImageVolumeCacheEntry.last_used.desc()).\
+            first()
+        if entry:
+            entry.last_used = timeutils.utcnow()
+            entry.save(session=session)
+        return entry
+
+
+@require_admin_context
+def image_volume_cache_get_by_volume_id(context, volume_id):
+    return _image_volume_cache_query().\
+        filter_by(volume_id=volume_id).\
+        first()
+
+
+@require_admin_context
+def image_volume_cache_get_all_for_host(context, host):
+    return _image_volume_cache_query().\
+        filter_by(host=host).\
+        order_by(models.ImageVolumeCacheEntry.last_used).\
+        all()
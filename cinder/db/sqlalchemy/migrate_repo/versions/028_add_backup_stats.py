@@ -0,0 +1,39 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import BigInteger, Column, Float, MetaData, Table
+
+
+def upgrade(migrate_engine):
+    """Add throughput and compression_ratio columns to backups."""
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    backups = Table('backups', meta, autoload=True)
+    # Bytes per second, of sparse volumes too, whose holes are counted
+    # but not uploaded, so it easily exceeds 32 bits.
+    throughput = Column('throughput', BigInteger)
+    backups.create_column(throughput)
+    compression_ratio = Column('compression_ratio', Float)
+    backups.create_column(compression_ratio)
+
+
+def downgrade(migrate_engine):
+    """Remove throughput and compression_ratio columns from backups."""
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    backups = Table('backups', meta, autoload=True)
+    backups.drop_column('throughput')
+    backups.drop_column('compression_ratio')
@@ -0,0 +1,86 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+from cinder.i18n import _
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# (table, columns) of the indexes, based on the queries
+# from: cinder/db/sqlalchemy/api.py
+INDEXES = [
+    # volume_get_all_by_host, volume_data_get_for_host and
+    # volume_data_get_for_all_hosts
+    ('volumes', ('host', 'deleted')),
+    # _volume_data_get_for_project and volume_get_all_by_project
+    ('volumes', ('project_id', 'deleted')),
+    # snapshot_get_all_for_volume
+    ('snapshots', ('volume_id', 'deleted')),
+    # _snapshot_data_get_for_project and snapshot_get_all_by_project
+    ('snapshots', ('project_id', 'deleted')),
+    # backup_get_all_by_host
+    ('backups', ('host', 'deleted')),
+    # _backup_data_get_for_project and backup_get_all_by_project
+    ('backups', ('project_id', 'deleted')),
+    # backup_get_all with a volume_id filter
+    ('backups', ('volume_id', 'deleted')),
+    # metadata loaded along with volumes and snapshots
+    ('volume_metadata', ('volume_id', 'deleted')),
+    ('volume_admin_metadata', ('volume_id', 'deleted')),
+    ('volume_glance_metadata', ('volume_id', 'deleted')),
+    ('snapshot_metadata', ('snapshot_id', 'deleted')),
+]
+
+
+def _index_name(table_name, columns):
+    return '%s_%s_idx' % (table_name, '_'.join(columns))
+
+
+def _get_index(table, columns):
+    """Return the index of table on exactly columns, in order, if any."""
+    for idx in table.indexes:
+        if tuple(idx.columns.keys()) == columns:
+            return idx
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name, columns in INDEXES:
+        table = Table(table_name, meta, autoload=True)
+        name = _index_name(table_name, columns)
+        if _get_index(table, columns):
+            LOG.info(_('Skipped adding %s because an equivalent index '
+                       'already exists.') % name)
+            continue
+        index = Index(name, *[table.c[column] for column in columns])
+        index.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name, columns in INDEXES:
+        table = Table(table_name, meta, autoload=True)
+        name = _index_name(table_name, columns)
+        index = _get_index(table, columns)
+        if index is not None and index.name == name:
+            index.drop(migrate_engine)
+        else:
+            LOG.info(_('Skipped removing %s because index does not '
+                       'exist.') % name)
@@ -23,7 +23,7 @@ from oslo.config import cfg
 from oslo.db.sqlalchemy import models
 from sqlalchemy import Column, Integer, String, Text, schema
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import ForeignKey, DateTime, Boolean
+from sqlalchemy import BigInteger, ForeignKey, DateTime, Boolean, Float
 from sqlalchemy.orm import relationship, backref
 
 from cinder.openstack.common import timeutils
@@ -477,6 +477,9 @@ class Backup(BASE, CinderBase):
     service = Column(String(255))
     size = Column(Integer)
     object_count = Column(Integer)
+    parent_id = Column(String(36))
+    throughput = Column(BigInteger)
+    compression_ratio = Column(Float)
 
 
 class Encryption(BASE, CinderBase):
@@ -520,6 +523,19 @@ class Transfer(BASE, CinderBase):
                           'Transfer.deleted == False)')
 
 
+class ImageVolumeCacheEntry(BASE, models.ModelBase):
+    """Represents a volume holding a cached image on a volume backend."""
+    __tablename__ = 'image_volume_cache_entries'
+    __table_args__ = {'mysql_engine': 'InnoDB'}
+    id = Column(Integer, primary_key=True, nullable=False)
+    host = Column(String(255), index=True, nullable=False)
+    image_id = Column(String(36), index=True, nullable=False)
+    image_checksum = Column(String(255))
+    volume_id = Column(String(36), nullable=False)
+    size = Column(Integer, nullable=False)
+    last_used = Column(DateTime, default=lambda: timeutils.utcnow())
+
+
 def register_models():
     """Register Models and create metadata.
 
@@ -539,7 +555,8 @@ def register_models():
               VolumeTypes,
               VolumeGlanceMetadata,
               ConsistencyGroup,
-              Cgsnapshot
+              Cgsnapshot,
+              ImageVolumeCacheEntry
               )
     engine = create_engine(CONF.database.connection, echo=False)
     for model in models:
@@ -0,0 +1,154 @@
+# Copyright (C) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of image volumes on a volume backend.
+
+The first volume created from an image on a backend is cloned into a
+volume owned by the Cinder internal tenant, and later volumes created from
+the same image on that backend are cloned from it instead of downloading
+the image from Glance again.  Entries are keyed by image id and checksum,
+and the least recently used ones are evicted to stay within the size and
+count limits of the backend.
+"""
+
+from oslo.config import cfg
+
+from cinder import exception
+from cinder.i18n import _
+from cinder.openstack.common import log as logging
+from cinder import rpc
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+class ImageVolumeCache(object):
+    def __init__(self, db, volume_api, max_cache_size_gb=0,
+                 max_cache_size_count=0):
+        self.db = db
+        self.volume_api = volume_api
+        self.max_cache_size_gb = int(max_cache_size_gb or 0)
+        self.max_cache_size_count = int(max_cache_size_count or 0)
+
+    def get_by_image_volume(self, context, volume_id):
+        return self.db.image_volume_cache_get_by_volume_id(context, volume_id)
+
+    def evict(self, context, cache_entry):
+        """Remove an entry from the cache, leaving its volume alone."""
+        LOG.debug('Evicting image cache entry: %s.' % _entry_str(cache_entry))
+        self.db.image_volume_cache_delete(context, cache_entry['volume_id'])
+        self._notify_cache_action(context, cache_entry['image_id'],
+                                  cache_entry['host'], 'evict')
+
+    def get_entry(self, context, volume_ref, image_id, image_meta):
+        """Return the cache entry to clone volume_ref from, if any.
+
+        An entry of an image whose checksum changed, or which is larger than
+        volume_ref, is evicted along with its volume so that the image is
+        cached again by the caller.
+        """
+        cache_entry = self.db.image_volume_cache_get_and_update_last_used(
+            context, image_id, volume_ref['host'])
+
+        if cache_entry:
+            checksum = image_meta.get('checksum')
+            if checksum and cache_entry['image_checksum'] != checksum:
+                LOG.debug('Image %s changed since it was cached.' % image_id)
+                self._delete_image_volume(context, cache_entry)
+                cache_entry = None
+            elif cache_entry['size'] > volume_ref['size']:
+                LOG.debug('Cached volume of image %(image_id)s is larger '
+                          'than volume %(volume_id)s.' %
+                          {'image_id': image_id,
+                           'volume_id': volume_ref['id']})
+                self._delete_image_volume(context, cache_entry)
+                cache_entry = None
+
+        action = 'hit' if cache_entry else 'miss'
+        self._notify_cache_action(context, image_id, volume_ref['host'],
+                                  action)
+        return cache_entry
+
+    def create_cache_entry(self, context, volume_ref, image_id, image_meta):
+        """Record volume_ref as the cached volume of an image."""
+        cache_entry = self.db.image_volume_cache_create(
+            context,
+            volume_ref['host'],
+            image_id,
+            image_meta.get('checksum'),
+            volume_ref['id'],
+            volume_ref['size'])
+        LOG.debug('New image cache entry created: %s.' %
+                  _entry_str(cache_entry))
+        return cache_entry
+
+    def ensure_space(self, context, space_required, host):
+        """Make room for a new entry of space_required GB on host.
+
+        Evicts the least recently used entries of host, and deletes their
+        volumes, until one more volume of space_required GB fits in the
+        limits.  Returns False if it can never fit.
+        """
+        if self.max_cache_size_gb and space_required > self.max_cache_size_gb:
+            return False
+
+        entries = self.db.image_volume_cache_get_all_for_host(context, host)
+        current_count = len(entries) + 1
+        current_size = sum(entry['size'] for entry in entries)
+        current_size += space_required
+
+        def _over_limits():
+            return ((self.max_cache_size_gb and
+                     current_size > self.max_cache_size_gb) or
+                    (self.max_cache_size_count and
+                     current_count > self.max_cache_size_count))
+
+        while entries and _over_limits():
+            entry = entries.pop(0)
+            self._delete_image_volume(context, entry)
+            current_size -= entry['size']
+            current_count -= 1
+        return True
+
+    def _delete_image_volume(self, context, cache_entry):
+        """Evict an entry and delete its volume."""
+        self.evict(context, cache_entry)
+        try:
+            volume = self.db.volume_get(context, cache_entry['volume_id'])
+            self.volume_api.delete(context, volume, force=True)
+        except exception.VolumeNotFound:
+            pass
+        except exception.CinderException as ex:
+            LOG.warn(_('Failed to delete cached image volume %(volume_id)s: '
+                       '%(error)s') % {'volume_id': cache_entry['volume_id'],
+                                       'error': ex})
+
+    def _notify_cache_action(self, context, image_id, host, action):
+        data = {
+            'image_id': image_id,
+            'host': host,
+        }
+        rpc.get_notifier('volume', CONF.host).info(
+            context, 'image_volume_cache.%s' % action, data)
+
+
+def _entry_str(cache_entry):
+    return ('{id: %(id)s, volume_id: %(volume_id)s, image_id: %(image_id)s, '
+            'host: %(host)s, size: %(size)s}' %
+            {'id': cache_entry['id'],
+             'volume_id': cache_entry['volume_id'],
+             'image_id': cache_entry['image_id'],
+             'host': cache_entry['host'],
+             'size': cache_entry['size']})
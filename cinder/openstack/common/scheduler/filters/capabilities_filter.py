@@ -26,14 +26,20 @@ LOG = logging.getLogger(__name__)
 class CapabilitiesFilter(filters.BaseHostFilter):
     """HostFilter to work with resource (instance & volume) type records."""
 
-    def _satisfies_extra_specs(self, capabilities, resource_type):
-        """Check that the capabilities provided by the services satisfy
-        the extra specs associated with the resource type.
-        """
-        extra_specs = resource_type.get('extra_specs', [])
-        if not extra_specs:
-            return True
+    # Compiled extra specs shared by all filter instances, keyed by the
+    # resource type id: {id: ((id, updated_at), extra_specs, matchers)}
+    _compiled_specs = {}
+
+    # The resource type most recently seen by this filter instance and its
+    # compiled matchers, as the same filter_properties are checked against
+    # every host of a request.
+    _resource_type = None
+    _matchers = None
 
+    @staticmethod
+    def _compile_extra_specs(extra_specs):
+        """Turn extra specs into a list of (scope, req, matcher) tuples."""
+        matchers = []
         for key, req in six.iteritems(extra_specs):
             # Either not scope format, or in capabilities scope
             scope = key.split(':')
@@ -41,16 +47,56 @@ class CapabilitiesFilter(filters.BaseHostFilter):
                 continue
             elif scope[0] == "capabilities":
                 del scope[0]
+            matchers.append((tuple(scope), req,
+                             extra_specs_ops.make_matcher(req)))
+        return matchers
+
+    def _get_matchers(self, resource_type):
+        """Return the compiled extra specs of the given resource type.
+
+        Compiled specs are reused across requests as long as the type's
+        id, updated_at and extra specs are unchanged.  The extra specs are
+        compared as well since updating them does not bump updated_at, and
+        the scheduler may add specs of its own to the request.
+        """
+        if resource_type is self._resource_type:
+            return self._matchers
+
+        extra_specs = resource_type.get('extra_specs', [])
+        type_id = resource_type.get('id')
+        if not extra_specs:
+            matchers = []
+        elif type_id is None:
+            matchers = self._compile_extra_specs(extra_specs)
+        else:
+            key = (type_id, resource_type.get('updated_at'))
+            cached = self._compiled_specs.get(type_id)
+            if (cached is not None and cached[0] == key and
+                    cached[1] == extra_specs):
+                matchers = cached[2]
+            else:
+                matchers = self._compile_extra_specs(extra_specs)
+                self._compiled_specs[type_id] = (key, dict(extra_specs),
+                                                 matchers)
+
+        self._resource_type = resource_type
+        self._matchers = matchers
+        return matchers
 
+    def _satisfies_extra_specs(self, capabilities, resource_type):
+        """Check that the capabilities provided by the services satisfy
+        the extra specs associated with the resource type.
+        """
+        for scope, req, matcher in self._get_matchers(resource_type):
             cap = capabilities
-            for index in range(len(scope)):
+            for key in scope:
                 try:
-                    cap = cap.get(scope[index], None)
+                    cap = cap.get(key, None)
                 except AttributeError:
                     return False
                 if cap is None:
                     return False
-            if not extra_specs_ops.match(cap, req):
+            if not matcher(cap):
                 LOG.debug(_("extra_spec requirement '%(req)s' does not match "
                           "'%(cap)s'"), {'req': req, 'cap': cap})
                 return False
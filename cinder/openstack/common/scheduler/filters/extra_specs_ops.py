@@ -22,51 +22,68 @@ from cinder.openstack.common import strutils
 # 2. Note that <or> is handled in a different way below.
 # 3. If the first word in the extra_specs is not one of the operators,
 #   it is ignored.
-_op_methods = {'=': lambda x, y: float(x) >= float(y),
-               '<in>': lambda x, y: y in x,
-               '<is>': lambda x, y: (strutils.bool_from_string(x) is
-                                     strutils.bool_from_string(y)),
-               '==': lambda x, y: float(x) == float(y),
-               '!=': lambda x, y: float(x) != float(y),
-               '>=': lambda x, y: float(x) >= float(y),
-               '<=': lambda x, y: float(x) <= float(y),
-               's==': operator.eq,
-               's!=': operator.ne,
-               's<': operator.lt,
-               's<=': operator.le,
-               's>': operator.gt,
-               's>=': operator.ge}
+# 4. Each method is paired with the conversion applied to the requested
+#   operand, so that the conversion only happens once per requirement.
+_op_methods = {'=': (float, lambda x, y: float(x) >= y),
+               '<in>': (None, lambda x, y: y in x),
+               '<is>': (strutils.bool_from_string,
+                        lambda x, y: strutils.bool_from_string(x) is y),
+               '==': (float, lambda x, y: float(x) == y),
+               '!=': (float, lambda x, y: float(x) != y),
+               '>=': (float, lambda x, y: float(x) >= y),
+               '<=': (float, lambda x, y: float(x) <= y),
+               's==': (None, operator.eq),
+               's!=': (None, operator.ne),
+               's<': (None, operator.lt),
+               's<=': (None, operator.le),
+               's>': (None, operator.gt),
+               's>=': (None, operator.ge)}
 
 
-def match(value, req):
-    words = req.split()
+def _never(value):
+    return False
 
-    op = method = None
-    if words:
-        op = words.pop(0)
-        method = _op_methods.get(op)
 
-    if op != '<or>' and not method:
-        return value == req
+def make_matcher(req):
+    """Compile an extra spec requirement into a predicate.
 
-    if value is None:
-        return False
+    The returned callable takes a capability value and gives the same
+    result as match(value, req), but the requirement string is parsed
+    only once, so it can be applied cheaply to many hosts.
+    """
+    words = req.split()
+    op = words[0] if words else None
 
     if op == '<or>':  # Ex: <or> v1 <or> v2 <or> v3
-        while True:
-            if words.pop(0) == value:
-                return True
-            if not words:
-                break
-            op = words.pop(0)  # remove a keyword <or>
-            if not words:
-                break
-        return False
-
-    try:
-        if words and method(value, words[0]):
-            return True
-    except ValueError:
-        pass
+        choices = tuple(words[1::2])
 
-    return False
+        def match_or(value):
+            return value is not None and value in choices
+        return match_or
+
+    if op not in _op_methods:
+        return lambda value: value == req
+
+    if len(words) < 2:
+        return _never
+
+    convert, method = _op_methods[op]
+    operand = words[1]
+    if convert is not None:
+        try:
+            operand = convert(operand)
+        except ValueError:
+            return _never
+
+    def match_op(value):
+        if value is None:
+            return False
+        try:
+            return bool(method(value, operand))
+        except ValueError:
+            return False
+    return match_op
+
+
+def match(value, req):
+    return make_matcher(req)(value)
@@ -18,6 +18,7 @@
 
 
 import datetime
+import time
 
 from oslo.config import cfg
 
@@ -56,12 +57,22 @@ quota_opts = [
     cfg.IntOpt('reservation_expire',
                default=86400,
                help='Number of seconds until a reservation expires'),
+    cfg.IntOpt('reservation_expire_batch_size',
+               default=500,
+               help='Maximum number of expired reservations rolled back '
+                    'in a single database transaction, 0 for no limit'),
     cfg.IntOpt('until_refresh',
                default=0,
                help='Count of reservations until usage is refreshed'),
     cfg.IntOpt('max_age',
                default=0,
                help='Number of seconds between subsequent usage refreshes'),
+    cfg.IntOpt('quota_limit_cache_ttl',
+               default=0,
+               help='Number of seconds quota limits are cached for in '
+                    'each process, 0 to only cache them for the duration '
+                    'of a request. Changes made through another process '
+                    'may take up to this long to be enforced'),
     cfg.StrOpt('quota_driver',
                default='cinder.quota.DbQuotaDriver',
                help='Default driver to use for quota checks'),
@@ -74,6 +85,59 @@ CONF = cfg.CONF
 CONF.register_opts(quota_opts)
 
 
+class QuotaLimitCache(object):
+    """Cache of the quota limits read from the database.
+
+    Limits are cached for the duration of a request, in its context, and
+    for quota_limit_cache_ttl seconds in the process if it is not 0.
+    invalidate() drops both after the limits are changed.  Usages are
+    never cached.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._generation = 0
+
+    def _request_entries(self, context):
+        if context is None:
+            return {}
+        entries = getattr(context, '_quota_limits', None)
+        if entries is None or entries[0] != self._generation:
+            entries = (self._generation, {})
+            context._quota_limits = entries
+        return entries[1]
+
+    def get(self, context, key, load):
+        """Return the limits cached under key, calling load() if needed."""
+        request_entries = self._request_entries(context)
+        if key in request_entries:
+            self.hits += 1
+            return request_entries[key]
+
+        ttl = CONF.quota_limit_cache_ttl
+        now = time.time()
+        expires, value = self._entries.get(key, (0, None))
+        if ttl > 0 and expires > now:
+            self.hits += 1
+        else:
+            self.misses += 1
+            value = load()
+            if ttl > 0:
+                self._entries[key] = (now + ttl, value)
+        request_entries[key] = value
+        return value
+
+    def invalidate(self):
+        """Drop all the cached limits."""
+        self._entries.clear()
+        self._generation += 1
+
+
+LIMIT_CACHE = QuotaLimitCache()
+
+
 class DbQuotaDriver(object):
 
     """Driver to perform check to enforcement of quotas.
@@ -92,10 +156,30 @@ class DbQuotaDriver(object):
 
         return db.quota_class_get(context, quota_class, resource_name)
 
+    def _get_default_quotas(self, context):
+        return LIMIT_CACHE.get(
+            context, ('default',),
+            lambda: db.quota_class_get_default(context))
+
+    def _get_class_quotas(self, context, quota_class):
+        return LIMIT_CACHE.get(
+            context, ('class', quota_class),
+            lambda: db.quota_class_get_all_by_name(context, quota_class))
+
+    def _get_project_quotas(self, context, project_id):
+        return LIMIT_CACHE.get(
+            context, ('project', project_id),
+            lambda: db.quota_get_all_by_project(context, project_id))
+
+    def invalidate_limits(self):
+        """Drop the cached quota limits after they were changed."""
+
+        LIMIT_CACHE.invalidate()
+
     def get_default(self, context, resource):
         """Get a specific default quota for a resource."""
 
-        default_quotas = db.quota_class_get_default(context)
+        default_quotas = self._get_default_quotas(context)
         return default_quotas.get(resource.name, resource.default)
 
     def get_defaults(self, context, resources):
@@ -111,7 +195,7 @@ class DbQuotaDriver(object):
         quotas = {}
         default_quotas = {}
         if CONF.use_default_quota_class:
-            default_quotas = db.quota_class_get_default(context)
+            default_quotas = self._get_default_quotas(context)
 
         for resource in resources.values():
             if resource.name not in default_quotas:
@@ -140,9 +224,9 @@ class DbQuotaDriver(object):
 
         quotas = {}
         default_quotas = {}
-        class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+        class_quotas = self._get_class_quotas(context, quota_class)
         if defaults:
-            default_quotas = db.quota_class_get_default(context)
+            default_quotas = self._get_default_quotas(context)
         for resource in resources.values():
             if resource.name in class_quotas:
                 quotas[resource.name] = class_quotas[resource.name]
@@ -177,7 +261,7 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self._get_project_quotas(context, project_id)
         if usages:
             project_usages = db.quota_usage_get_all_by_project(context,
                                                                project_id)
@@ -189,7 +273,7 @@ class DbQuotaDriver(object):
         if project_id == context.project_id:
             quota_class = context.quota_class
         if quota_class:
-            class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+            class_quotas = self._get_class_quotas(context, quota_class)
         else:
             class_quotas = {}
 
@@ -410,6 +494,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project(context, project_id)
+        self.invalidate_limits()
 
     def expire(self, context):
         """Expire reservations.
@@ -418,9 +503,17 @@ class DbQuotaDriver(object):
         any that have expired.
 
         :param context: The request context, for access checks.
+        :returns: the number of expired reservations
         """
 
-        db.reservation_expire(context)
+        start_time = time.time()
+        expired = db.reservation_expire(
+            context, batch_size=CONF.reservation_expire_batch_size)
+        if expired:
+            LOG.info(_("Expired %(expired)d reservations in %(time).2f "
+                       "seconds.") % {'expired': expired,
+                                      'time': time.time() - start_time})
+        return expired
 
 
 class BaseResource(object):
@@ -813,6 +906,15 @@ class QuotaEngine(object):
 
         self._driver.destroy_all_by_project(context, project_id)
 
+    def invalidate_limits(self):
+        """Drop the quota limits cached by the driver, if any.
+
+        Must be called after quota limits are changed.
+        """
+
+        if hasattr(self._driver, 'invalidate_limits'):
+            self._driver.invalidate_limits()
+
     def expire(self, context):
         """Expire reservations.
 
@@ -820,9 +922,10 @@ class QuotaEngine(object):
         any that have expired.
 
         :param context: The request context, for access checks.
+        :returns: the number of expired reservations
         """
 
-        self._driver.expire(context)
+        return self._driver.expire(context)
 
     def add_volume_type_opts(self, context, opts, volume_type_id):
         """Add volume type resource options.
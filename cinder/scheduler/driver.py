@@ -19,6 +19,8 @@
 Scheduler base class that all Schedulers should inherit from
 """
 
+import copy
+
 from oslo.config import cfg
 
 from cinder import db
@@ -92,6 +94,20 @@ class Scheduler(object):
         """Must override schedule method for scheduler to work."""
         raise NotImplementedError(_("Must implement schedule_create_volume"))
 
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties):
+        """Schedule several volumes created from the same request.
+
+        Schedulers can override this to place all the volumes with a single
+        pass over the hosts; by default each volume is scheduled on its own.
+
+        :returns: the request specs of the volumes which could not be placed
+        """
+        for request_spec in request_spec_list:
+            self.schedule_create_volume(context, request_spec,
+                                        copy.deepcopy(filter_properties))
+        return []
+
     def schedule_create_consistencygroup(self, context, group_id,
                                          request_spec_list,
                                          filter_properties_list):
@@ -20,6 +20,8 @@ You can customize this scheduler by specifying your own volume Filters and
 Weighing Functions.
 """
 
+import copy
+
 from oslo.config import cfg
 
 from cinder import exception
@@ -88,6 +90,66 @@ class FilterScheduler(driver.Scheduler):
         if not weighed_host:
             raise exception.NoValidHost(reason="No weighed hosts available")
 
+        # context is not serializable
+        filter_properties.pop('context', None)
+
+        self._create_volume_on_host(context, weighed_host, request_spec,
+                                    filter_properties)
+
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties):
+        """Schedule several volumes created from the same request.
+
+        The hosts are filtered once for the whole request.  Each volume is
+        then placed by weighing the remaining candidates again, after the
+        previous placements have been virtually consumed from them.
+
+        :returns: the request specs of the volumes which could not be placed
+        """
+        if not request_spec_list:
+            return []
+
+        if filter_properties is None:
+            filter_properties = {}
+        hosts = self._get_filtered_candidates(context, request_spec_list[0],
+                                              filter_properties)
+        if not hosts:
+            LOG.warning(_('No weighed hosts found for volume '
+                          'with properties: %s'),
+                        filter_properties['request_spec']['volume_type'])
+            return list(request_spec_list)
+
+        # context is not serializable
+        base_properties = dict((key, value) for key, value
+                               in filter_properties.iteritems()
+                               if key != 'context')
+
+        for index, request_spec in enumerate(request_spec_list):
+            if not hosts:
+                LOG.warning(_('No hosts left for %(count)d of the '
+                              '%(total)d requested volumes.'),
+                            {'count': len(request_spec_list) - index,
+                             'total': len(request_spec_list)})
+                return request_spec_list[index:]
+
+            weighed_hosts = self.host_manager.get_weighed_hosts(
+                hosts, filter_properties)
+            weighed_host = self._choose_top_host(weighed_hosts, request_spec)
+
+            # Drop the host from the candidates once the volumes placed on
+            # it so far leave no room for another one.
+            if not self.host_manager.get_filtered_hosts([weighed_host.obj],
+                                                        filter_properties):
+                hosts.remove(weighed_host.obj)
+
+            properties = copy.deepcopy(base_properties)
+            properties['request_spec'] = request_spec
+            self._create_volume_on_host(context, weighed_host, request_spec,
+                                        properties)
+        return []
+
+    def _create_volume_on_host(self, context, weighed_host, request_spec,
+                               filter_properties):
         host = weighed_host.obj.host
         volume_id = request_spec['volume_id']
         snapshot_id = request_spec['snapshot_id']
@@ -97,9 +159,6 @@ class FilterScheduler(driver.Scheduler):
         self._post_select_populate_filter_properties(filter_properties,
                                                      weighed_host.obj)
 
-        # context is not serializable
-        filter_properties.pop('context', None)
-
         self.volume_rpcapi.create_volume(context, updated_volume, host,
                                          request_spec, filter_properties,
                                          allow_reschedule=True,
@@ -253,6 +312,23 @@ class FilterScheduler(driver.Scheduler):
         """Returns a list of hosts that meet the required specs,
         ordered by their fitness.
         """
+        if filter_properties is None:
+            filter_properties = {}
+        hosts = self._get_filtered_candidates(context, request_spec,
+                                              filter_properties)
+        if not hosts:
+            return []
+
+        LOG.debug("Filtered %s" % hosts)
+        # weighted_host = WeightedHost() ... the best
+        # host for the job.
+        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
+                                                            filter_properties)
+        return weighed_hosts
+
+    def _get_filtered_candidates(self, context, request_spec,
+                                 filter_properties):
+        """Returns a list of hosts that meet the required specs."""
         elevated = context.elevated()
 
         volume_properties = request_spec['volume_properties']
@@ -266,8 +342,6 @@ class FilterScheduler(driver.Scheduler):
 
         config_options = self._get_configuration_options()
 
-        if filter_properties is None:
-            filter_properties = {}
         self._populate_retry(filter_properties, resource_properties)
 
         filter_properties.update({'context': context,
@@ -288,17 +362,8 @@ class FilterScheduler(driver.Scheduler):
         hosts = self.host_manager.get_all_host_states(elevated)
 
         # Filter local hosts based on requirements ...
-        hosts = self.host_manager.get_filtered_hosts(hosts,
-                                                     filter_properties)
-        if not hosts:
-            return []
-
-        LOG.debug("Filtered %s" % hosts)
-        # weighted_host = WeightedHost() ... the best
-        # host for the job.
-        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
-                                                            filter_properties)
-        return weighed_hosts
+        return self.host_manager.get_filtered_hosts(hosts,
+                                                    filter_properties)
 
     def _get_weighted_candidates_group(self, context, request_spec_list,
                                        filter_properties_list=None):
@@ -26,16 +26,18 @@ LOG = logging.getLogger(__name__)
 class AffinityFilter(filters.BaseHostFilter):
     def __init__(self):
         self.volume_api = volume.API()
+        # Filters are instantiated for every scheduling request, so this
+        # maps the hinted volume uuids to their back-ends for one request.
+        self._affinity_hosts = {}
 
+    def _get_affinity_uuids(self, filter_properties, hint):
+        """Return the list of volume uuids in the given scheduler hint.
 
-class DifferentBackendFilter(AffinityFilter):
-    """Schedule volume on a different back-end from a set of volumes."""
-
-    def host_passes(self, host_state, filter_properties):
-        context = filter_properties['context']
+        Returns None when the hint is not a uuid or a list of uuids.
+        """
         scheduler_hints = filter_properties.get('scheduler_hints') or {}
 
-        affinity_uuids = scheduler_hints.get('different_host', [])
+        affinity_uuids = scheduler_hints.get(hint, [])
 
         # scheduler hint verification: affinity_uuids can be a list of uuids
         # or single uuid.  The checks here is to make sure every single string
@@ -44,22 +46,47 @@ class DifferentBackendFilter(AffinityFilter):
         # like a uuid, it is better to fail the request than serving it wrong.
         if isinstance(affinity_uuids, list):
             for uuid in affinity_uuids:
-                if uuidutils.is_uuid_like(uuid):
-                    continue
-                else:
-                    return False
+                if not uuidutils.is_uuid_like(uuid):
+                    return None
         elif uuidutils.is_uuid_like(affinity_uuids):
             affinity_uuids = [affinity_uuids]
         else:
             # Not a list, not a string looks like uuid, don't pass it
             # to DB for query to avoid potential risk.
+            return None
+
+        return affinity_uuids
+
+    def _get_affinity_hosts(self, context, affinity_uuids):
+        """Return the set of back-ends hosting the given volumes.
+
+        The volumes are looked up with a single query the first time and
+        every host of the request is then checked against the cached set.
+        """
+        key = frozenset(affinity_uuids)
+        hosts = self._affinity_hosts.get(key)
+        if hosts is None:
+            volumes = self.volume_api.get_all(
+                context, filters={'id': affinity_uuids,
+                                  'deleted': False})
+            hosts = set(vol['host'] for vol in volumes)
+            self._affinity_hosts[key] = hosts
+        return hosts
+
+
+class DifferentBackendFilter(AffinityFilter):
+    """Schedule volume on a different back-end from a set of volumes."""
+
+    def host_passes(self, host_state, filter_properties):
+        context = filter_properties['context']
+        affinity_uuids = self._get_affinity_uuids(filter_properties,
+                                                  'different_host')
+        if affinity_uuids is None:
             return False
 
         if affinity_uuids:
-            return not self.volume_api.get_all(
-                context, filters={'host': host_state.host,
-                                  'id': affinity_uuids,
-                                  'deleted': False})
+            hosts = self._get_affinity_hosts(context, affinity_uuids)
+            return host_state.host not in hosts
 
         # With no different_host key
         return True
@@ -70,33 +97,14 @@ class SameBackendFilter(AffinityFilter):
 
     def host_passes(self, host_state, filter_properties):
         context = filter_properties['context']
-        scheduler_hints = filter_properties.get('scheduler_hints') or {}
-
-        affinity_uuids = scheduler_hints.get('same_host', [])
-
-        # scheduler hint verification: affinity_uuids can be a list of uuids
-        # or single uuid.  The checks here is to make sure every single string
-        # in the list looks like a uuid, otherwise, this filter will fail to
-        # pass.  Note that the filter does *NOT* ignore string doesn't look
-        # like a uuid, it is better to fail the request than serving it wrong.
-        if isinstance(affinity_uuids, list):
-            for uuid in affinity_uuids:
-                if uuidutils.is_uuid_like(uuid):
-                    continue
-                else:
-                    return False
-        elif uuidutils.is_uuid_like(affinity_uuids):
-            affinity_uuids = [affinity_uuids]
-        else:
-            # Not a list, not a string looks like uuid, don't pass it
-            # to DB for query to avoid potential risk.
+        affinity_uuids = self._get_affinity_uuids(filter_properties,
+                                                  'same_host')
+        if affinity_uuids is None:
             return False
 
         if affinity_uuids:
-            return self.volume_api.get_all(
-                context, filters={'host': host_state.host,
-                                  'id': affinity_uuids,
-                                  'deleted': False})
+            hosts = self._get_affinity_hosts(context, affinity_uuids)
+            return host_state.host in hosts
 
         # With no same_host key
         return True
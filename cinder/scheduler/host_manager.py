@@ -45,7 +45,13 @@ host_manager_opts = [
                 default=[
                     'CapacityWeigher'
                 ],
-                help='Which weigher class names to use for weighing hosts.')
+                help='Which weigher class names to use for weighing hosts.'),
+    cfg.IntOpt('scheduler_service_cache_ttl',
+               default=0,
+               help='Number of seconds the list of volume services is '
+                    'cached between scheduling requests.  The cache is '
+                    'refreshed early when a capability update arrives from '
+                    'a host that is not in it.  0 disables the cache.'),
 ]
 
 CONF = cfg.CONF
@@ -125,6 +131,12 @@ class HostState(object):
             service = {}
         self.service = ReadOnlyDict(service)
 
+    def update_service(self, service):
+        """Refresh the service record of this host and of its pools."""
+        self.service = ReadOnlyDict(service)
+        for pool in self.pools.itervalues():
+            pool.service = ReadOnlyDict(service)
+
     def update_from_volume_capability(self, capability, service=None):
         """Update information about a host from its volume_node info.
 
@@ -320,6 +332,12 @@ class HostManager(object):
     def __init__(self):
         self.service_states = {}  # { <host>: {<service>: {cap k : v}}}
         self.host_state_map = {}
+        # Flattened pool states built from host_state_map, rebuilt only
+        # when a host's capabilities change or a host comes or goes.
+        self.pool_state_map = {}
+        self._volume_services = None
+        self._volume_service_hosts = set()
+        self._volume_services_updated = None
         self.filter_handler = filters.HostFilterHandler('cinder.scheduler.'
                                                         'filters')
         self.filter_classes = self.filter_handler.get_all_classes()
@@ -428,27 +446,52 @@ class HostManager(object):
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[host] = capab_copy
 
+        if host not in self._volume_service_hosts:
+            # A new volume service, don't wait for the cache to expire
+            self._volume_services = None
+
         LOG.debug("Received %(service_name)s service update from "
                   "%(host)s: %(cap)s" %
                   {'service_name': service_name, 'host': host,
                    'cap': capabilities})
 
+    def _get_volume_services(self, context):
+        """Return the enabled volume services, cached for a short while."""
+        ttl = CONF.scheduler_service_cache_ttl
+        if (ttl > 0 and self._volume_services is not None and
+                not timeutils.is_older_than(self._volume_services_updated,
+                                            ttl)):
+            return self._volume_services
+
+        topic = CONF.volume_topic
+        volume_services = db.service_get_all_by_topic(context,
+                                                      topic,
+                                                      disabled=False)
+        self._volume_services = [dict(service.iteritems())
+                                 for service in volume_services]
+        self._volume_service_hosts = set(service['host']
+                                         for service in self._volume_services)
+        self._volume_services_updated = timeutils.utcnow()
+        return self._volume_services
+
     def get_all_host_states(self, context):
         """Returns a dict of all the hosts the HostManager knows about.
 
         Each of the consumable resources in HostState are
         populated with capabilities scheduler received from RPC.
 
+        Host states are updated incrementally: only hosts that reported
+        new capabilities since the previous call are refreshed, and the
+        flattened pool map is reused when no host changed.
+
         For example:
           {'192.168.1.100': HostState(), ...}
         """
 
         # Get resource usage across the available volume nodes:
-        topic = CONF.volume_topic
-        volume_services = db.service_get_all_by_topic(context,
-                                                      topic,
-                                                      disabled=False)
+        volume_services = self._get_volume_services(context)
         active_hosts = set()
+        changed = False
         for service in volume_services:
             host = service['host']
             if not utils.service_is_up(service):
@@ -459,13 +502,19 @@ class HostManager(object):
             if not host_state:
                 host_state = self.host_state_cls(host,
                                                  capabilities=capabilities,
-                                                 service=
-                                                 dict(service.iteritems()))
+                                                 service=service)
                 self.host_state_map[host] = host_state
-            # update capabilities and attributes in host_state
-            host_state.update_from_volume_capability(capabilities,
-                                                     service=
-                                                     dict(service.iteritems()))
+                updated = True
+            else:
+                updated = (host_state.capabilities.get('timestamp') !=
+                           (capabilities or {}).get('timestamp'))
+            if updated:
+                # update capabilities and attributes in host_state
+                host_state.update_from_volume_capability(capabilities,
+                                                         service=service)
+                changed = True
+            elif host_state.service.data is not service:
+                host_state.update_service(service)
             active_hosts.add(host)
 
         # remove non-active hosts from host_state_map
@@ -474,15 +523,18 @@ class HostManager(object):
             LOG.info(_("Removing non-active host: %(host)s from "
                        "scheduler cache.") % {'host': host})
             del self.host_state_map[host]
+            changed = True
 
         # build a pool_state map and return that map instead of host_state_map
-        all_pools = {}
-        for host in active_hosts:
-            state = self.host_state_map[host]
-            for key in state.pools:
-                pool = state.pools[key]
-                # use host.pool_name to make sure key is unique
-                pool_key = '.'.join([host, pool.pool_name])
-                all_pools[pool_key] = pool
-
-        return all_pools.itervalues()
+        if changed:
+            all_pools = {}
+            for host in active_hosts:
+                state = self.host_state_map[host]
+                for key in state.pools:
+                    pool = state.pools[key]
+                    # use host.pool_name to make sure key is unique
+                    pool_key = '.'.join([host, pool.pool_name])
+                    all_pools[pool_key] = pool
+            self.pool_state_map = all_pools
+
+        return self.pool_state_map.itervalues()
@@ -53,7 +53,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.6'
+    RPC_API_VERSION = '1.7'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -131,6 +131,32 @@ class SchedulerManager(manager.Manager):
         with flow_utils.DynamicLogListener(flow_engine, logger=LOG):
             flow_engine.run()
 
+    def create_volumes(self, context, topic, request_spec_list,
+                       filter_properties=None):
+        """Schedule several volumes created from the same request."""
+        try:
+            unplaced = self.driver.schedule_create_volumes(context,
+                                                           request_spec_list,
+                                                           filter_properties)
+        except Exception as ex:
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_("Failed to schedule %d volumes"),
+                              len(request_spec_list))
+                for request_spec in request_spec_list:
+                    volume_ref = db.volume_get(context,
+                                               request_spec['volume_id'])
+                    if not volume_ref['host']:
+                        self._set_volume_state_and_notify(
+                            'create_volume',
+                            {'volume_state': {'status': 'error'}},
+                            context, ex, request_spec)
+
+        for request_spec in unplaced:
+            ex = exception.NoValidHost(reason=_("No weighed hosts available"))
+            self._set_volume_state_and_notify(
+                'create_volume', {'volume_state': {'status': 'error'}},
+                context, ex, request_spec)
+
     def request_service_capabilities(self, context):
         volume_rpcapi.VolumeAPI().publish_service_capabilities(context)
 
@@ -20,6 +20,10 @@ Weighers that weigh hosts by volume number in backends:
 The default is to spread volumes across all hosts evenly.  If you prefer
 stacking, you can set the 'volume_number_multiplier' option to a positive
 number and the weighing has the opposite effect of the default.
+
+By default the volume counts of all hosts are fetched with a single grouped
+query per scheduling request.  Setting 'volume_number_grouped_query' to False
+falls back to one count query per candidate host.
 """
 
 
@@ -38,6 +42,11 @@ volume_number_weight_opts = [
                  default=-1.0,
                  help='Multiplier used for weighing volume number. '
                       'Negative numbers mean to spread vs stack.'),
+    cfg.BoolOpt('volume_number_grouped_query',
+                default=True,
+                help='Fetch the volume counts of all hosts with a single '
+                     'grouped query per scheduling request instead of one '
+                     'query per candidate host.'),
 ]
 
 CONF = cfg.CONF
@@ -45,14 +54,30 @@ CONF.register_opts(volume_number_weight_opts)
 
 
 class VolumeNumberWeigher(weights.BaseHostWeigher):
+    _volume_counts = None
+
     def _weight_multiplier(self):
         """Override the weight multiplier."""
         return CONF.volume_number_multiplier
 
+    def weigh_objects(self, weighed_obj_list, weight_properties):
+        """Fetch the volume counts once and weigh all hosts against them."""
+        if CONF.volume_number_grouped_query:
+            context = weight_properties['context']
+            self._volume_counts = db.volume_data_get_for_all_hosts(
+                context, count_only=True)
+        try:
+            super(VolumeNumberWeigher, self).weigh_objects(weighed_obj_list,
+                                                           weight_properties)
+        finally:
+            self._volume_counts = None
+
     def _weigh_object(self, host_state, weight_properties):
         """Less volume number weights win.
         We want spreading to be the default.
         """
+        if self._volume_counts is not None:
+            return self._volume_counts.get(host_state.host, 0)
         context = weight_properties['context']
         volume_number = db.volume_data_get_for_host(context=context,
                                                     host=host_state.host,
@@ -25,6 +25,7 @@ import webob.exc
 from cinder.api.contrib import quotas
 from cinder import context
 from cinder import db
+from cinder import quota
 from cinder import test
 
 
@@ -83,6 +84,17 @@ class QuotaSetsControllerTest(test.TestCase):
         result = self.controller.update(self.req, 'foo', body)
         self.assertDictMatch(result, body)
 
+    def test_update_with_limit_cache(self):
+        self.flags(quota_limit_cache_ttl=60)
+        self.addCleanup(quota.LIMIT_CACHE.invalidate)
+        self.assertDictMatch(self.controller.show(self.req, 'foo'),
+                             make_body())
+
+        body = make_body(volumes=5, tenant_id=None)
+        self.controller.update(self.req, 'foo', body)
+        self.assertDictMatch(self.controller.show(self.req, 'foo'),
+                             make_body(volumes=5))
+
     def test_update_wrong_key(self):
         body = {'quota_set': {'bad': 'bad'}}
         self.assertRaises(webob.exc.HTTPBadRequest, self.controller.update,
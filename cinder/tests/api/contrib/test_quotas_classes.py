@@ -105,6 +105,16 @@ class QuotaClassSetsControllerTest(test.TestCase):
         result = self.controller.update(self.req, 'foo', body)
         self.assertDictMatch(result, body)
 
+    def test_update_with_limit_cache(self):
+        self.flags(quota_limit_cache_ttl=60)
+        self.addCleanup(quota.LIMIT_CACHE.invalidate)
+        self.controller.show(self.req, 'foo')
+
+        body = make_body(gigabytes=2000, tenant_id=None)
+        self.controller.update(self.req, 'foo', body)
+        result = self.controller.show(self.req, 'foo')
+        self.assertEqual(2000, result['quota_class_set']['gigabytes'])
+
     def test_update_wrong_key(self):
         volume_types.create(self.ctxt, 'fake_type')
         body = {'quota_class_set': {'bad': 'bad'}}
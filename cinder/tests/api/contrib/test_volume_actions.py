@@ -315,6 +315,34 @@ class VolumeActionsTest(test.TestCase):
         make_set_bootable_test(self, 11, 400)
         make_set_bootable_test(self, None, 400)
 
+    @mock.patch('cinder.volume.API.wait_status', return_value='in-use')
+    def test_wait_status(self, wait_status):
+        body = {'os-wait-status': {'status': 'in-use', 'timeout': '30'}}
+        req = webob.Request.blank('/v2/fake/volumes/1/action')
+        req.method = "POST"
+        req.body = jsonutils.dumps(body)
+        req.headers["content-type"] = "application/json"
+        res = req.get_response(fakes.wsgi_app())
+
+        self.assertEqual(200, res.status_int)
+        self.assertEqual({'os-wait-status': {'id': '1', 'status': 'in-use'}},
+                         jsonutils.loads(res.body))
+        wait_status.assert_called_once_with(
+            mock.ANY, self.mock_volume_get.return_value, ['in-use'], 30)
+
+    @mock.patch('cinder.volume.API.wait_status')
+    def test_wait_status_invalid(self, wait_status):
+        for params in ({'status': 1}, {'timeout': -1}, {'timeout': 'x'},
+                       'available'):
+            body = {'os-wait-status': params}
+            req = webob.Request.blank('/v2/fake/volumes/1/action')
+            req.method = "POST"
+            req.body = jsonutils.dumps(body)
+            req.headers["content-type"] = "application/json"
+            res = req.get_response(fakes.wsgi_app())
+            self.assertEqual(400, res.status_int)
+        self.assertFalse(wait_status.called)
+
 
 class VolumeRetypeActionsTest(VolumeActionsTest):
     def setUp(self):
@@ -10,6 +10,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import inspect
 
 import webob
@@ -106,6 +107,19 @@ class RequestTest(test.TestCase):
         request.headers.pop('Accept-Language')
         self.assertIsNone(request.best_match_language())
 
+    def test_get_etag(self):
+        request = wsgi.Request.blank('/foo')
+        updated_at = datetime.datetime(1, 1, 1)
+        etag = request.get_etag('r-0', updated_at)
+        self.assertEqual(etag, request.get_etag('r-0', updated_at))
+        self.assertNotEqual(etag, request.get_etag('r-0',
+                                                   datetime.datetime.now()))
+        self.assertEqual(request.get_etag({'a': 1, 'b': 2}),
+                         request.get_etag({'b': 2, 'a': 1}))
+
+        request = wsgi.Request.blank('/foo.xml')
+        self.assertNotEqual(etag, request.get_etag('r-0', updated_at))
+
     def test_cache_and_retrieve_resources(self):
         request = wsgi.Request.blank('/foo')
         # Test that trying to retrieve a cached object on
@@ -281,6 +295,43 @@ class ResourceTest(test.TestCase):
         self.assertEqual(response.body, 'off')
         self.assertEqual(response.status_int, 200)
 
+    def test_resource_conditional_response(self):
+        class Controller(wsgi.Controller):
+            def index(self, req):
+                return self.conditional_response(req, 'tag',
+                                                 lambda: {'foo': 'bar'})
+
+        app = fakes.TestRouter(Controller())
+        req = webob.Request.blank('/tests')
+        response = req.get_response(app)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual('"tag"', response.headers['ETag'])
+        self.assertEqual('{"foo": "bar"}', response.body)
+
+        req = webob.Request.blank('/tests',
+                                  headers={'If-None-Match': '"other", "tag"'})
+        response = req.get_response(app)
+        self.assertEqual(304, response.status_int)
+        self.assertEqual('"tag"', response.headers['ETag'])
+        self.assertEqual('', response.body)
+
+    def test_resource_not_modified_skips_extensions(self):
+        class Controller(wsgi.Controller):
+            def index(self, req):
+                return self.conditional_response(req, 'tag', None)
+
+        class ControllerExtended(wsgi.Controller):
+            @wsgi.extends
+            def index(self, req, resp_obj):
+                resp_obj.obj['foo'] = 'bar'
+
+        resource = wsgi.Resource(Controller())
+        resource.register_extensions(ControllerExtended())
+        req = wsgi.Request.blank('/tests', headers={'If-None-Match': '*'})
+        response = resource._process_stack(req, 'index', {}, None, '',
+                                           'application/json')
+        self.assertEqual(304, response.status_int)
+
     def test_resource_not_authorized(self):
         class Controller(object):
             def index(self, req):
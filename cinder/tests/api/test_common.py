@@ -158,6 +158,20 @@ class LimiterTest(test.TestCase):
         self.assertRaises(
             webob.exc.HTTPBadRequest, common.limited, self.tiny, req)
 
+    def test_get_query_limit(self):
+        """Test the number of items limited() may need."""
+        req = webob.Request.blank('/')
+        self.assertEqual(1000, common.get_query_limit(req))
+        req = webob.Request.blank('/?offset=1&limit=3')
+        self.assertEqual(4, common.get_query_limit(req))
+        req = webob.Request.blank('/?offset=3&limit=0')
+        self.assertEqual(1003, common.get_query_limit(req))
+        req = webob.Request.blank('/?offset=3&limit=2500')
+        self.assertEqual(2003, common.get_query_limit(req, max_limit=2000))
+        req = webob.Request.blank('/?offset=-30')
+        self.assertRaises(
+            webob.exc.HTTPBadRequest, common.get_query_limit, req)
+
 
 class PaginationParamsTest(test.TestCase):
     """Unit tests for `cinder.api.common.get_pagination_params` method.
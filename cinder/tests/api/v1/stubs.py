@@ -95,13 +95,14 @@ def stub_volume_get_notfound(self, context, volume_id):
     raise exc.NotFound
 
 
-def stub_volume_get_all(context, search_opts=None):
+def stub_volume_get_all(context, search_opts=None, columns=None):
     return [stub_volume(100, project_id='fake'),
             stub_volume(101, project_id='superfake'),
             stub_volume(102, project_id='superduperfake')]
 
 
-def stub_volume_get_all_by_project(self, context, search_opts=None):
+def stub_volume_get_all_by_project(self, context, search_opts=None,
+                                   columns=None):
     return [stub_volume_get(self, context, '1')]
 
 
@@ -119,16 +120,26 @@ def stub_snapshot(id, **kwargs):
     return snapshot
 
 
-def stub_snapshot_get_all(self):
+def stub_snapshot_get_all(self, filters=None, marker=None, limit=None,
+                          sort_key=None, sort_dir=None):
     return [stub_snapshot(100, project_id='fake'),
             stub_snapshot(101, project_id='superfake'),
             stub_snapshot(102, project_id='superduperfake')]
 
 
-def stub_snapshot_get_all_by_project(self, context):
+def stub_snapshot_get_all_by_project(self, context, filters=None,
+                                     marker=None, limit=None,
+                                     sort_key=None, sort_dir=None):
     return [stub_snapshot(1)]
 
 
+def stub_filter_snapshots(snapshots, filters=None):
+    """Return the snapshots matching filters, like the database does."""
+    filters = filters or {}
+    return [snapshot for snapshot in snapshots
+            if all(snapshot.get(k) == v for k, v in filters.iteritems())]
+
+
 def stub_snapshot_update(self, context, *args, **param):
     pass
 
@@ -115,7 +115,7 @@ def stub_volume_get_db(context, volume_id):
 
 def stub_volume_get_all(context, search_opts=None, marker=None, limit=None,
                         sort_key='created_at', sort_dir='desc', filters=None,
-                        viewable_admin_meta=False):
+                        viewable_admin_meta=False, columns=None):
     return [stub_volume(100, project_id='fake'),
             stub_volume(101, project_id='superfake'),
             stub_volume(102, project_id='superduperfake')]
@@ -123,7 +123,7 @@ def stub_volume_get_all(context, search_opts=None, marker=None, limit=None,
 
 def stub_volume_get_all_by_project(self, context, marker, limit, sort_key,
                                    sort_dir, filters=None,
-                                   viewable_admin_meta=False):
+                                   viewable_admin_meta=False, columns=None):
     filters = filters or {}
     return [stub_volume_get(self, context, '1')]
 
@@ -142,16 +142,26 @@ def stub_snapshot(id, **kwargs):
     return snapshot
 
 
-def stub_snapshot_get_all(self):
+def stub_snapshot_get_all(self, filters=None, marker=None, limit=None,
+                          sort_key=None, sort_dir=None):
     return [stub_snapshot(100, project_id='fake'),
             stub_snapshot(101, project_id='superfake'),
             stub_snapshot(102, project_id='superduperfake')]
 
 
-def stub_snapshot_get_all_by_project(self, context):
+def stub_snapshot_get_all_by_project(self, context, filters=None,
+                                     marker=None, limit=None,
+                                     sort_key=None, sort_dir=None):
     return [stub_snapshot(1)]
 
 
+def stub_filter_snapshots(snapshots, filters=None):
+    """Return the snapshots matching filters, like the database does."""
+    filters = filters or {}
+    return [snapshot for snapshot in snapshots
+            if all(snapshot.get(k) == v for k, v in filters.iteritems())]
+
+
 def stub_snapshot_update(self, context, *args, **param):
     pass
 
@@ -17,11 +17,18 @@
 Tests dealing with HTTP rate-limiting.
 """
 
+import fcntl
 import httplib
+import os
+import shutil
+import tempfile
+import time
 from xml.dom import minidom
 
+import eventlet
 from lxml import etree
 import six
+from testtools import content
 import webob
 
 from cinder.api.v2 import limits
@@ -297,6 +304,31 @@ class LimitMiddlewareTest(BaseLimitTestSuite):
         value = details.item(0).firstChild.data.strip()
         self.assertEqual(value, expected)
 
+    def test_overhead_per_request(self):
+        """Report the time spent in the middleware for each request."""
+        _limits = ('(GET, *, .*, 100000, MINUTE);'
+                   '(POST, *, .*, 100000, MINUTE);'
+                   '(GET, *changes-since*, .*changes-since.*, 3, MINUTE)')
+        app = limits.RateLimitingMiddleware(self._empty_app, _limits,
+                                            max_users=50)
+        requests = []
+        for i in range(1000):
+            request = webob.Request.blank('/v2/fake/volumes/detail')
+            request.method = 'POST' if i % 2 else 'GET'
+            request.environ['cinder.context'] = cinder.context.RequestContext(
+                'user%d' % (i % 100), 'fake')
+            requests.append(request)
+
+        def run(app):
+            start_time = time.time()
+            for request in requests:
+                self.assertEqual(200, request.get_response(app).status_int)
+            return (time.time() - start_time) / len(requests)
+
+        overhead = run(app) - run(self._empty_app)
+        self.addDetail('middleware_overhead', content.text_content(
+            '%.1f us per request' % (overhead * 1e6)))
+
 
 class LimitTest(BaseLimitTestSuite):
 
@@ -515,6 +547,105 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(self.limiter.levels['user3'], [])
         self.assertEqual(len(self.limiter.levels['user0']), 2)
 
+    def test_limits_not_modified(self):
+        """Ensure the limits are shared by users without their state."""
+        list(self._check(11, "PUT", "/anything", "user1"))
+        list(self._check(1, "PUT", "/anything", "user2"))
+        self.assertEqual(10, TEST_LIMITS[3].remaining)
+        self.assertIsNone(TEST_LIMITS[3].last_request)
+
+    def test_no_bucket_for_unlimited_requests(self):
+        """Ensure requests no limit applies to keep no state."""
+        self.limiter.check_for_delay("GET", "/anything", "user1")
+        self.assertIsNone(self.limiter._store.get("user1"))
+
+    def test_get_limits(self):
+        """Ensure the limits are displayed with the state of the user."""
+        self.time = 10.0
+        list(self._check(5, "PUT", "/volumes", "user1"))
+        self.time += 1.0
+        limits = dict((limit["URI"], limit)
+                      for limit in self.limiter.get_limits("user1")
+                      if limit["verb"] == "PUT")
+        self.assertEqual(0, limits["/volumes"]["remaining"])
+        self.assertEqual(10, limits["/volumes"]["resetTime"])
+        self.assertEqual(5, limits["*"]["remaining"])
+
+        limits = self.limiter.get_limits("user2")
+        self.assertEqual([1, 7, 3, 10, 5],
+                         [limit["remaining"] for limit in limits])
+        self.assertEqual([11] * 5, [limit["resetTime"] for limit in limits])
+
+    def test_evict_least_recently_seen_users(self):
+        """Ensure only the buckets of max_users users are kept."""
+        self.limiter = limits.Limiter(TEST_LIMITS, max_users=2)
+        for username in ("user1", "user2", "user1", "user3"):
+            self.limiter.check_for_delay("PUT", "/anything", username)
+
+        self.assertIsNotNone(self.limiter._store.get("user1"))
+        self.assertIsNone(self.limiter._store.get("user2"))
+        self.assertIsNotNone(self.limiter._store.get("user3"))
+
+    def test_file_bucket_store(self):
+        """Ensure limiters using the same bucket files share buckets."""
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        bucket_store = 'file:%s' % path
+        limiter1 = limits.Limiter(TEST_LIMITS, bucket_store=bucket_store)
+        limiter2 = limits.Limiter(TEST_LIMITS, bucket_store=bucket_store)
+
+        for x in xrange(5):
+            limiter = (limiter1, limiter2)[x % 2]
+            self.assertEqual((None, None),
+                             limiter.check_for_delay("PUT", "/volumes",
+                                                     "user1"))
+        self.assertEqual(12.0, limiter1.check_for_delay("PUT", "/volumes",
+                                                        "user1")[0])
+        self.assertEqual((None, None),
+                         limiter2.check_for_delay("PUT", "/volumes"))
+
+    def test_file_bucket_store_expires_idle_files(self):
+        """Ensure the bucket files of idle users are removed."""
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        limiter = limits.Limiter(TEST_LIMITS, bucket_store='file:%s' % path)
+        store = limiter._store
+        self.assertEqual(limits.PER_MINUTE, store.max_idle)
+
+        limiter.check_for_delay("PUT", "/volumes", "user1")
+        limiter.check_for_delay("PUT", "/volumes", "user2")
+        idle = time.time() - limits.PER_MINUTE - 1
+        os.utime(store._path("user1"), (idle, idle))
+
+        store._next_expire = 0
+        limiter.check_for_delay("PUT", "/volumes", "user3")
+        self.assertEqual(sorted([store._path("user2"),
+                                 store._path("user3")]),
+                         sorted(os.path.join(path, name)
+                                for name in os.listdir(path)))
+
+    def test_file_bucket_store_lock_does_not_block(self):
+        """Ensure waiting for a bucket file lets other requests run."""
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        store = limits.FileBucketStore(path)
+        store.update("user1", lambda states: ([1], None))
+
+        with open(store._path("user1")) as bucket_file:
+            fcntl.flock(bucket_file, fcntl.LOCK_EX)
+            update = eventlet.spawn(store.update, "user1",
+                                    lambda states: (states + [2], None))
+            eventlet.sleep(0.05)
+            self.assertFalse(update.dead)
+            self.assertEqual([1], limits.FileBucketStore._load(bucket_file))
+            fcntl.flock(bucket_file, fcntl.LOCK_UN)
+        update.wait()
+        self.assertEqual([1, 2], store.get("user1"))
+
+    def test_invalid_bucket_store(self):
+        self.assertRaises(ValueError, limits.Limiter, TEST_LIMITS,
+                          bucket_store='fake')
+
     def test_multiple_users(self):
         """Tests involving multiple users."""
 
@@ -619,6 +750,27 @@ class WsgiLimiterTest(BaseLimitTestSuite):
         delay = self._request("GET", "/delayed")
         self.assertEqual(delay, '60.00')
 
+    def test_batch(self):
+        request = webob.Request.blank("/user1")
+        request.method = "POST"
+        request.body = jsonutils.dumps([{"verb": "GET", "path": "/delayed"},
+                                        {"verb": "GET", "path": "/delayed"},
+                                        {"verb": "GET", "path": "/other"}])
+        response = request.get_response(self.app)
+
+        self.assertEqual(200, response.status_int)
+        expected = [[None, None],
+                    [60.0, "Only 1 GET request(s) can be made to /delayed "
+                           "every minute."],
+                    [None, None]]
+        self.assertEqual(expected, jsonutils.loads(response.body)["delays"])
+
+    def test_bad_request(self):
+        for body in ("[1]", "1", "fake"):
+            request = webob.Request.blank("/", method="POST", body=body)
+            response = request.get_response(self.app)
+            self.assertEqual(400, response.status_int)
+
     def test_response_to_delays_usernames(self):
         delay = self._request("GET", "/delayed", "user1")
         self.assertIsNone(delay)
@@ -759,6 +911,16 @@ class WsgiLimiterProxyTest(BaseLimitTestSuite):
 
         self.assertEqual((delay, error), expected)
 
+    def test_batch(self):
+        """Check several requests with a single call."""
+        delays = self.proxy.check_for_delays([("GET", "/delayed"),
+                                              ("GET", "/delayed")], "user1")
+
+        expected = [(None, None),
+                    (60.0, "Only 1 GET request(s) can be made to /delayed "
+                           "every minute.")]
+        self.assertEqual(expected, delays)
+
 
 class LimitsViewBuilderTest(test.TestCase):
     def setUp(self):
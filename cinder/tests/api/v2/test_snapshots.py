@@ -16,6 +16,7 @@
 import datetime
 
 from lxml import etree
+import mock
 import webob
 
 from cinder.api.v2 import snapshots
@@ -70,7 +71,8 @@ def stub_snapshot_get(self, context, snapshot_id):
     return param
 
 
-def stub_snapshot_get_all(self, context, search_opts=None):
+def stub_snapshot_get_all(self, context, search_opts=None, marker=None,
+                          limit=None, sort_key=None, sort_dir=None):
     param = _get_default_snapshot_param()
     return [param]
 
@@ -226,6 +228,27 @@ class SnapshotApiTest(test.TestCase):
         self.assertIn('snapshot', resp_dict)
         self.assertEqual(resp_dict['snapshot']['id'], UUID)
 
+    def test_snapshot_show_not_modified(self):
+        self.stubs.Set(volume.api.API, "get_snapshot", stub_snapshot_get)
+        req = fakes.HTTPRequest.blank('/v2/snapshots/%s' % UUID)
+        self.controller.show(req, UUID)
+
+        etag = req.environ['cinder.etag']
+        req = fakes.HTTPRequest.blank('/v2/snapshots/%s' % UUID)
+        req.headers['If-None-Match'] = '"%s"' % etag
+        self.assertEqual(304, self.controller.show(req, UUID).code)
+
+    def test_snapshot_detail_not_modified(self):
+        self.stubs.Set(volume.api.API, "get_all_snapshots",
+                       stub_snapshot_get_all)
+        req = fakes.HTTPRequest.blank('/v2/snapshots/detail')
+        self.controller.detail(req)
+
+        etag = req.environ['cinder.etag']
+        req = fakes.HTTPRequest.blank('/v2/snapshots/detail')
+        req.headers['If-None-Match'] = '"%s"' % etag
+        self.assertEqual(304, self.controller.detail(req).code)
+
     def test_snapshot_show_invalid_id(self):
         snapshot_id = INVALID_UUID
         req = fakes.HTTPRequest.blank('/v2/snapshots/%s' % snapshot_id)
@@ -246,15 +269,16 @@ class SnapshotApiTest(test.TestCase):
         self.assertEqual(resp_snapshot['id'], UUID)
 
     def test_snapshot_list_by_status(self):
-        def stub_snapshot_get_all_by_project(context, project_id):
-            return [
+        def stub_snapshot_get_all_by_project(context, project_id,
+                                             filters=None, **kwargs):
+            return stubs.stub_filter_snapshots([
                 stubs.stub_snapshot(1, display_name='backup1',
                                     status='available'),
                 stubs.stub_snapshot(2, display_name='backup2',
                                     status='available'),
                 stubs.stub_snapshot(3, display_name='backup3',
                                     status='creating'),
-            ]
+            ], filters)
         self.stubs.Set(db, 'snapshot_get_all_by_project',
                        stub_snapshot_get_all_by_project)
 
@@ -279,12 +303,13 @@ class SnapshotApiTest(test.TestCase):
         self.assertEqual(len(resp['snapshots']), 0)
 
     def test_snapshot_list_by_volume(self):
-        def stub_snapshot_get_all_by_project(context, project_id):
-            return [
+        def stub_snapshot_get_all_by_project(context, project_id,
+                                             filters=None, **kwargs):
+            return stubs.stub_filter_snapshots([
                 stubs.stub_snapshot(1, volume_id='vol1', status='creating'),
                 stubs.stub_snapshot(2, volume_id='vol1', status='available'),
                 stubs.stub_snapshot(3, volume_id='vol2', status='available'),
-            ]
+            ], filters)
         self.stubs.Set(db, 'snapshot_get_all_by_project',
                        stub_snapshot_get_all_by_project)
 
@@ -308,12 +333,13 @@ class SnapshotApiTest(test.TestCase):
         self.assertEqual(resp['snapshots'][0]['status'], 'available')
 
     def test_snapshot_list_by_name(self):
-        def stub_snapshot_get_all_by_project(context, project_id):
-            return [
+        def stub_snapshot_get_all_by_project(context, project_id,
+                                             filters=None, **kwargs):
+            return stubs.stub_filter_snapshots([
                 stubs.stub_snapshot(1, display_name='backup1'),
                 stubs.stub_snapshot(2, display_name='backup2'),
                 stubs.stub_snapshot(3, display_name='backup3'),
-            ]
+            ], filters)
         self.stubs.Set(db, 'snapshot_get_all_by_project',
                        stub_snapshot_get_all_by_project)
 
@@ -341,12 +367,13 @@ class SnapshotApiTest(test.TestCase):
 
     def test_list_snapshots_with_limit_and_offset(self):
         def list_snapshots_with_limit_and_offset(is_admin):
-            def stub_snapshot_get_all_by_project(context, project_id):
-                return [
+            def stub_snapshot_get_all_by_project(context, project_id,
+                                                 filters=None, **kwargs):
+                return stubs.stub_filter_snapshots([
                     stubs.stub_snapshot(1, display_name='backup1'),
                     stubs.stub_snapshot(2, display_name='backup2'),
                     stubs.stub_snapshot(3, display_name='backup3'),
-                ]
+                ], filters)
 
             self.stubs.Set(db, 'snapshot_get_all_by_project',
                            stub_snapshot_get_all_by_project)
@@ -372,6 +399,20 @@ class SnapshotApiTest(test.TestCase):
         self.assertIn('snapshots', res)
         self.assertEqual(3, len(res['snapshots']))
 
+    @mock.patch.object(volume.api.API, 'get_all_snapshots')
+    def test_list_snapshots_with_marker_and_sort(self, get_all_snapshots):
+        get_all_snapshots.return_value = [stubs.stub_snapshot(1)]
+        req = fakes.HTTPRequest.blank('/v2/fake/snapshots?marker=2&limit=1'
+                                      '&offset=1&sort_key=id&sort_dir=asc'
+                                      '&status=available')
+        res = self.controller.index(req)
+
+        self.assertEqual([], res['snapshots'])
+        get_all_snapshots.assert_called_once_with(
+            req.environ['cinder.context'],
+            search_opts={'status': 'available'}, marker='2', limit=2,
+            sort_key='id', sort_dir='asc')
+
     def test_all_tenants_non_admin_gets_all_tenants(self):
         req = fakes.HTTPRequest.blank('/v2/fake/snapshots?all_tenants=1')
         res = self.controller.index(req)
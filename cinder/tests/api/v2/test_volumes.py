@@ -17,6 +17,7 @@
 import datetime
 
 from lxml import etree
+import mock
 from oslo.config import cfg
 import six.moves.urllib.parse as urlparse
 import webob
@@ -158,6 +159,43 @@ class VolumeApiTest(test.TestCase):
         req = fakes.HTTPRequest.blank('/v2/volumes/detail')
         res_dict = self.controller.detail(req)
 
+    def test_volume_create_count(self):
+        def stub_volume_create_volumes(self, context, count, size, name,
+                                       description, **param):
+            volumes = []
+            for i in range(count):
+                vol = stubs.stub_volume(str(i + 1))
+                vol['size'] = size
+                vol['display_name'] = name
+                vol['display_description'] = description
+                volumes.append(vol)
+            return volumes
+
+        self.stubs.Set(volume_api.API, "create_volumes",
+                       stub_volume_create_volumes)
+
+        vol = {"size": 100,
+               "name": "Volume Test Name",
+               "description": "Volume Test Desc",
+               "count": 3}
+        body = {"volume": vol}
+        req = fakes.HTTPRequest.blank('/v2/volumes')
+        res = self.controller.create(req, body)
+        volumes = res.obj['volumes']
+        self.assertEqual(['1', '2', '3'], [v['id'] for v in volumes])
+        for volume in volumes:
+            self.assertEqual('Volume Test Name', volume['name'])
+            self.assertEqual(100, volume['size'])
+
+    def test_volume_create_invalid_count(self):
+        self.stubs.Set(volume_api.API, "create", stubs.stub_volume_create)
+        req = fakes.HTTPRequest.blank('/v2/volumes')
+        self.flags(max_volumes_per_request=10)
+        for count in (0, -1, 'abc', None, 11):
+            body = {"volume": {"size": 100, "count": count}}
+            self.assertRaises(webob.exc.HTTPBadRequest,
+                              self.controller.create, req, body)
+
     def test_volume_creation_fails_with_bad_size(self):
         vol = {"size": '',
                "name": "Volume Test Name",
@@ -605,6 +643,24 @@ class VolumeApiTest(test.TestCase):
         # Finally test that we cached the returned volumes
         self.assertEqual(1, len(req.cached_resource()))
 
+    @mock.patch.object(volume_api.API, 'get_all')
+    def test_volume_list_summary_columns(self, get_all):
+        get_all.return_value = [{'id': '1', 'display_name': 'vol1'}]
+
+        req = fakes.HTTPRequest.blank('/v2/volumes')
+        res_dict = self.controller.index(req)
+
+        self.assertEqual([('1', 'vol1')],
+                         [(volume['id'], volume['name'])
+                          for volume in res_dict['volumes']])
+        self.assertEqual(('id', 'display_name'),
+                         get_all.call_args[1]['columns'])
+
+        req = fakes.HTTPRequest.blank('/v2/volumes/detail')
+        get_all.return_value = [stubs.stub_volume('1')]
+        self.controller.detail(req)
+        self.assertIsNone(get_all.call_args[1]['columns'])
+
     def test_volume_list_detail(self):
         self.stubs.Set(volume_api.API, 'get_all',
                        stubs.stub_volume_get_all_by_project)
@@ -721,7 +777,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_index_with_marker(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           columns=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -782,7 +839,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_index_limit_offset(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           columns=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -810,7 +868,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_detail_with_marker(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           columns=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -871,7 +930,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_detail_limit_offset(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           columns=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -930,7 +990,7 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all(context, marker, limit,
                                 sort_key, sort_dir,
                                 filters=None,
-                                viewable_admin_meta=False):
+                                viewable_admin_meta=False, columns=None):
             vols = [stubs.stub_volume(i)
                     for i in xrange(CONF.osapi_max_limit)]
             if limit is None or limit >= len(vols):
@@ -949,7 +1009,8 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all2(context, marker, limit,
                                  sort_key, sort_dir,
                                  filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False,
+                                 columns=None):
             vols = [stubs.stub_volume(i)
                     for i in xrange(100)]
             if limit is None or limit >= len(vols):
@@ -967,7 +1028,8 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all3(context, marker, limit,
                                  sort_key, sort_dir,
                                  filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False,
+                                 columns=None):
             vols = [stubs.stub_volume(i)
                     for i in xrange(CONF.osapi_max_limit + 100)]
             if limit is None or limit >= len(vols):
@@ -1007,14 +1069,15 @@ class VolumeApiTest(test.TestCase):
         # Non-admin, project function should be called with no_migration_status
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           columns=None):
             self.assertEqual(filters['no_migration_targets'], True)
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol1')]
 
         def stub_volume_get_all(context, marker, limit,
                                 sort_key, sort_dir, filters=None,
-                                viewable_admin_meta=False):
+                                viewable_admin_meta=False, columns=None):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
@@ -1031,13 +1094,15 @@ class VolumeApiTest(test.TestCase):
         # without no_migration_status
         def stub_volume_get_all_by_project2(context, project_id, marker, limit,
                                             sort_key, sort_dir, filters=None,
-                                            viewable_admin_meta=False):
+                                            viewable_admin_meta=False,
+                                            columns=None):
             self.assertFalse('no_migration_targets' in filters)
             return [stubs.stub_volume(1, display_name='vol2')]
 
         def stub_volume_get_all2(context, marker, limit,
                                  sort_key, sort_dir, filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False,
+                                 columns=None):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project2)
@@ -1052,12 +1117,14 @@ class VolumeApiTest(test.TestCase):
         # without no_migration_status
         def stub_volume_get_all_by_project3(context, project_id, marker, limit,
                                             sort_key, sort_dir, filters=None,
-                                            viewable_admin_meta=False):
+                                            viewable_admin_meta=False,
+                                            columns=None):
             return []
 
         def stub_volume_get_all3(context, marker, limit,
                                  sort_key, sort_dir, filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False,
+                                 columns=None):
             self.assertFalse('no_migration_targets' in filters)
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol3')]
@@ -1119,6 +1186,64 @@ class VolumeApiTest(test.TestCase):
         # Finally test that we cached the returned volume
         self.assertIsNotNone(req.cached_resource_by_id('1'))
 
+    def test_volume_show_not_modified(self):
+        self.stubs.Set(volume_api.API, 'get', stubs.stub_volume_get)
+
+        req = fakes.HTTPRequest.blank('/v2/volumes/1')
+        self.controller.show(req, '1')
+        etag = req.environ['cinder.etag']
+
+        req = fakes.HTTPRequest.blank('/v2/volumes/1')
+        req.headers['If-None-Match'] = '"%s"' % etag
+        with mock.patch.object(self.controller._view_builder,
+                               'detail') as detail:
+            res = self.controller.show(req, '1')
+        self.assertEqual(304, res.code)
+        self.assertFalse(detail.called)
+
+        def stub_volume_get(self, context, volume_id, **kwargs):
+            return stubs.stub_volume(volume_id, status='in-use')
+
+        self.stubs.Set(volume_api.API, 'get', stub_volume_get)
+        res_dict = self.controller.show(req, '1')
+        self.assertEqual('in-use', res_dict['volume']['status'])
+        self.assertNotEqual(etag, req.environ['cinder.etag'])
+
+    @mock.patch.object(volume_api.API, 'get_all')
+    def test_volume_list_not_modified(self, get_all):
+        get_all.return_value = [stubs.stub_volume('1')]
+        for path in ('/v2/volumes', '/v2/volumes/detail'):
+            req = fakes.HTTPRequest.blank(path)
+            list_volumes = (self.controller.index if path == '/v2/volumes'
+                            else self.controller.detail)
+            list_volumes(req)
+
+            etag = req.environ['cinder.etag']
+            req = fakes.HTTPRequest.blank(path)
+            req.headers['If-None-Match'] = '"%s"' % etag
+            self.assertEqual(304, list_volumes(req).code)
+
+    @mock.patch.object(volume_api.API, 'get_all')
+    def test_volume_list_changes_since(self, get_all):
+        get_all.return_value = []
+        req = fakes.HTTPRequest.blank('/v2/volumes/detail?changes-since='
+                                      '2014-10-01T12:00:00Z')
+        self.controller.detail(req)
+        filters = get_all.call_args[0][5]
+        self.assertEqual('2014-10-01T12:00:00Z', filters['changes-since'])
+
+    @mock.patch.object(db, 'volume_get_all_by_project', return_value=[])
+    def test_volume_list_changes_since_parsed(self, get_all_by_project):
+        req = fakes.HTTPRequest.blank('/v2/volumes/detail?changes-since='
+                                      '2014-10-01T14:00:00%2B02:00')
+        self.controller.detail(req)
+        filters = get_all_by_project.call_args[1]['filters']
+        self.assertEqual(datetime.datetime(2014, 10, 1, 12),
+                         filters['changes-since'])
+
+        req = fakes.HTTPRequest.blank('/v2/volumes/detail?changes-since=x')
+        self.assertRaises(exception.InvalidInput, self.controller.detail, req)
+
     def test_volume_show_no_attachments(self):
         def stub_volume_get(self, context, volume_id, **kwargs):
             return stubs.stub_volume(volume_id, attach_status='detached')
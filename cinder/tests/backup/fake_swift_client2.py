@@ -0,0 +1,103 @@
+# Copyright (C) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import httplib
+import socket
+
+import eventlet
+from swiftclient import client as swift
+
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class FakeSwiftClient2(object):
+    """Keeps objects in memory instead of sending them to Swift."""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @classmethod
+    def Connection(self, *args, **kargs):
+        LOG.debug("fake FakeSwiftClient2 Connection")
+        return FakeSwiftConnection2()
+
+
+class FakeSwiftConnection2(object):
+    """Stores objects in a dict shared by all connections.
+
+    Also records the largest number of object transfers that were in
+    progress at the same time across connections.
+    """
+
+    store = {}
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @classmethod
+    def reset(cls):
+        cls.store = {}
+        cls.in_flight = 0
+        cls.max_in_flight = 0
+
+    @classmethod
+    def _transfer(cls):
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        # Give other transfers a chance to start.
+        eventlet.sleep(0)
+        cls.in_flight -= 1
+
+    def put_container(self, container):
+        LOG.debug("fake put_container(%s)" % container)
+        self.store.setdefault(container, {})
+
+    def get_container(self, container, prefix=None, **kwargs):
+        LOG.debug("fake get_container(%s)" % container)
+        names = sorted(name for name in self.store.get(container, {})
+                       if prefix is None or name.startswith(prefix))
+        return None, [{'name': name} for name in names]
+
+    def get_object(self, container, name):
+        LOG.debug("fake get_object(%s, %s)" % (container, name))
+        if container == 'socket_error_on_get':
+            raise socket.error(111, 'ECONNREFUSED')
+        self._transfer()
+        try:
+            return None, self.store[container][name]
+        except KeyError:
+            raise swift.ClientException('fake exception',
+                                        http_status=httplib.NOT_FOUND)
+
+    def put_object(self, container, name, reader, content_length=None,
+                   etag=None, chunk_size=None, content_type=None,
+                   headers=None, query_string=None):
+        LOG.debug("fake put_object(%s, %s)" % (container, name))
+        if container == 'socket_error_on_put':
+            raise socket.error(111, 'ECONNREFUSED')
+        self._transfer()
+        data = reader.read()
+        self.store.setdefault(container, {})[name] = data
+        return hashlib.md5(data).hexdigest()
+
+    def delete_object(self, container, name):
+        LOG.debug("fake delete_object(%s, %s)" % (container, name))
+        if container == 'socket_error_on_delete':
+            raise socket.error(111, 'ECONNREFUSED')
+        self.store.get(container, {}).pop(name, None)
@@ -14,10 +14,12 @@
 
 import os.path
 import string
-import time
+
+import mock
 
 from cinder.brick import exception
 from cinder.brick.initiator import connector
+from cinder.brick.initiator import device_waiter
 from cinder.brick.initiator import host_driver
 from cinder.i18n import _
 from cinder.openstack.common import log as logging
@@ -225,9 +227,9 @@ class ISCSIConnectorTestCase(ConnectorTestCase):
                            'type': 'block'}
         self.assertEqual(result, expected_result)
 
-    def test_connect_volume_with_not_found_device(self):
+    @mock.patch.object(device_waiter.DeviceWaiter, 'wait', return_value=None)
+    def test_connect_volume_with_not_found_device(self, mock_wait):
         self.stubs.Set(os.path, 'exists', lambda x: False)
-        self.stubs.Set(time, 'sleep', lambda x: None)
         location = '10.0.2.15:3260'
         name = 'volume-00000001'
         iqn = 'iqn.2010-10.org.openstack:%s' % name
@@ -236,6 +238,25 @@ class ISCSIConnectorTestCase(ConnectorTestCase):
         self.assertRaises(exception.VolumeDeviceNotFound,
                           self.connector.connect_volume,
                           connection_info['data'])
+        rescans = [cmd for cmd in self.cmds if cmd.endswith('--rescan')]
+        self.assertEqual(connector.DEVICE_SCAN_ATTEMPTS_DEFAULT,
+                         len(rescans))
+
+    def test_connect_volume_after_rescan(self):
+        self.stubs.Set(os.path, 'exists', lambda x: False)
+        location = '10.0.2.15:3260'
+        name = 'volume-00000001'
+        iqn = 'iqn.2010-10.org.openstack:%s' % name
+        vol = {'id': 1, 'name': name}
+        connection_info = self.iscsi_connection(vol, location, iqn)
+        dev_str = '/dev/disk/by-path/ip-%s-iscsi-%s-lun-1' % (location, iqn)
+        with mock.patch.object(self.connector._device_waiter, 'wait',
+                               return_value=dev_str) as mock_wait:
+            device = self.connector.connect_volume(connection_info['data'])
+        self.assertEqual(dev_str, device['path'])
+        mock_wait.assert_called_once_with([dev_str], 1)
+        rescans = [cmd for cmd in self.cmds if cmd.endswith('--rescan')]
+        self.assertEqual(1, len(rescans))
 
     def test_get_target_portals_from_iscsiadm_output(self):
         connector = self.connector
@@ -438,6 +459,24 @@ class FibreChannelConnectorTestCase(ConnectorTestCase):
                           self.connector.connect_volume,
                           connection_info['data'])
 
+    @mock.patch.object(device_waiter.DeviceWaiter, 'wait', return_value=None)
+    def test_connect_volume_not_found(self, mock_wait):
+        self.stubs.Set(self.connector._linuxfc, "get_fc_hbas",
+                       self.fake_get_fc_hbas)
+        self.stubs.Set(self.connector._linuxfc, "get_fc_hbas_info",
+                       self.fake_get_fc_hbas_info)
+        self.stubs.Set(os.path, 'exists', lambda x: False)
+        vol = {'id': 1, 'name': 'volume-00000001'}
+        connection_info = self.fibrechan_connection(vol, '10.0.2.15:3260',
+                                                    '1234567890123456')
+        with mock.patch.object(self.connector._linuxfc,
+                               'rescan_hosts') as mock_rescan:
+            self.assertRaises(exception.NoFibreChannelVolumeDeviceFound,
+                              self.connector.connect_volume,
+                              connection_info['data'])
+        self.assertEqual(connector.DEVICE_SCAN_ATTEMPTS_DEFAULT,
+                         mock_rescan.call_count)
+
 
 class FakeFixedIntervalLoopingCall(object):
     def __init__(self, f=None, *args, **kw):
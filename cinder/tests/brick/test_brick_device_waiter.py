@@ -0,0 +1,127 @@
+# Copyright 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import mock
+
+from cinder.brick.initiator import device_waiter
+from cinder import test
+
+
+class DeviceWaiterTestCase(test.TestCase):
+
+    def setUp(self):
+        super(DeviceWaiterTestCase, self).setUp()
+        self.dev_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dev_dir)
+        self.device = os.path.join(self.dev_dir, 'ip-10.0.2.15:3260-lun-1')
+        self.waiter = device_waiter.DeviceWaiter()
+
+    def _create_device(self, path=None):
+        open(path or self.device, 'w').close()
+
+    def _create_device_later(self, delay=0.1):
+        timer = threading.Timer(delay, self._create_device)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_wait_existing(self):
+        self._create_device()
+        self.assertEqual(self.device, self.waiter.wait([self.device], 0))
+
+    def test_wait_first_existing(self):
+        other_device = os.path.join(self.dev_dir, 'ip-10.0.2.16:3260-lun-1')
+        self._create_device(other_device)
+        self.assertEqual(other_device,
+                         self.waiter.wait([self.device, other_device], 0))
+
+    def test_wait_timeout(self):
+        start = time.time()
+        self.assertIsNone(self.waiter.wait([self.device], 0.2))
+        self.assertTrue(time.time() - start >= 0.2)
+
+    def test_wait_watched(self):
+        self._create_device_later()
+        start = time.time()
+        self.assertEqual(self.device, self.waiter.wait([self.device], 5))
+        self.assertTrue(time.time() - start < 1)
+
+    def test_wait_polling(self):
+        self.waiter = device_waiter.DeviceWaiter(use_inotify=False,
+                                                 poll_interval=0.05)
+        self._create_device_later()
+        self.assertEqual(self.device, self.waiter.wait([self.device], 5))
+
+    @mock.patch.object(device_waiter, '_InotifyWatch',
+                       side_effect=OSError(38, 'inotify is not available'))
+    def test_wait_inotify_unavailable(self, mock_watch):
+        self._create_device_later()
+        self.assertEqual(self.device, self.waiter.wait([self.device], 5))
+        mock_watch.assert_called_once_with(set([self.dev_dir]))
+
+    def test_wait_missing_directory(self):
+        device = os.path.join(self.dev_dir, 'by-path', 'fake')
+        self.assertIsNone(self.waiter.wait([device], 0.2))
+
+    def test_wait_with_rescan_found(self):
+        rescan = mock.Mock(side_effect=lambda tries: self._create_device())
+        self.assertEqual((self.device, 1),
+                         self.waiter.wait_with_rescan([self.device], 3,
+                                                      rescan))
+        rescan.assert_called_once_with(0)
+
+    def test_wait_with_rescan_existing(self):
+        self._create_device()
+        rescan = mock.Mock()
+        self.assertEqual((self.device, 0),
+                         self.waiter.wait_with_rescan([self.device], 3,
+                                                      rescan))
+        self.assertFalse(rescan.called)
+
+    @mock.patch.object(device_waiter.DeviceWaiter, 'wait', return_value=None)
+    def test_wait_with_rescan_not_found(self, mock_wait):
+        rescan = mock.Mock()
+        self.assertEqual((None, 3),
+                         self.waiter.wait_with_rescan([self.device], 3,
+                                                      rescan))
+        self.assertEqual([mock.call(0), mock.call(1), mock.call(2)],
+                         rescan.call_args_list)
+        timeouts = [call[0][1] for call in mock_wait.call_args_list]
+        self.assertEqual(3, len(timeouts))
+        for timeout, expected in zip(timeouts, (1, 4, 9)):
+            self.assertTrue(expected - 1 < timeout <= expected)
+
+    @mock.patch.object(device_waiter.DeviceWaiter, 'wait', return_value=None)
+    def test_wait_with_rescan_deadline(self, mock_wait):
+        # Rescans taking longer than the waits eat into the deadline.
+        now = [0]
+
+        def rescan(tries):
+            now[0] += 3
+
+        with mock.patch.object(device_waiter, 'time') as mock_time:
+            mock_time.time.side_effect = lambda: now[0]
+            self.assertEqual((None, 2),
+                             self.waiter.wait_with_rescan([self.device], 2,
+                                                          rescan,
+                                                          interval=2))
+        self.assertEqual([mock.call([self.device], 1),
+                          mock.call([self.device], -2)],
+                         mock_wait.call_args_list)
@@ -0,0 +1,76 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Fake of the rados python library, without a ceph cluster.
+
+Every client connected is recorded in CLIENTS, and clients can be broken
+to make their operations fail like those of clients which lost their
+connection to the cluster.
+"""
+
+CLIENTS = []
+
+
+def reset():
+    del CLIENTS[:]
+
+
+class Error(Exception):
+    pass
+
+
+class ObjectNotFound(Error):
+    pass
+
+
+class Rados(object):
+
+    def __init__(self, rados_id=None, conffile=None):
+        self.rados_id = rados_id
+        self.conffile = conffile
+        self.state = 'configuring'
+        self.broken = False
+        self.ioctxs = []
+
+    def connect(self, timeout=None):
+        self.state = 'connected'
+        CLIENTS.append(self)
+
+    def open_ioctx(self, pool):
+        self._check_connected()
+        ioctx = Ioctx(self, pool)
+        self.ioctxs.append(ioctx)
+        return ioctx
+
+    def shutdown(self):
+        self.state = 'shutdown'
+
+    def _check_connected(self):
+        if self.state != 'connected' or self.broken:
+            raise Error('not connected')
+
+
+class Ioctx(object):
+
+    def __init__(self, cluster, name):
+        self.cluster = cluster
+        self.name = name
+        self.closed = False
+
+    def get_stats(self):
+        self.cluster._check_connected()
+        return {'num_objects': 0}
+
+    def close(self):
+        self.closed = True
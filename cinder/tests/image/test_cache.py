@@ -0,0 +1,175 @@
+# Copyright (C) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Tests for the image volume cache."""
+
+import mock
+
+from cinder import context
+from cinder import exception
+from cinder.image import cache as image_cache
+from cinder import test
+from cinder.tests import fake_notifier
+
+
+class ImageVolumeCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImageVolumeCacheTestCase, self).setUp()
+        self.mock_db = mock.Mock()
+        self.mock_volume_api = mock.Mock()
+        self.context = context.get_admin_context()
+        fake_notifier.reset()
+        self.addCleanup(fake_notifier.reset)
+
+    def _build_cache(self, max_gb=0, max_count=0):
+        return image_cache.ImageVolumeCache(self.mock_db,
+                                            self.mock_volume_api,
+                                            max_gb,
+                                            max_count)
+
+    def _build_entry(self, size=10, volume_id='volume-1',
+                     checksum='abc'):
+        return {
+            'id': 1,
+            'host': 'foo@bar#whatever',
+            'image_id': 'image-1',
+            'image_checksum': checksum,
+            'volume_id': volume_id,
+            'size': size,
+        }
+
+    def _event_types(self):
+        return [n['event_type'] for n in fake_notifier.NOTIFICATIONS]
+
+    def test_get_entry_hit(self):
+        cache = self._build_cache()
+        entry = self._build_entry()
+        self.mock_db.image_volume_cache_get_and_update_last_used.\
+            return_value = entry
+        volume_ref = {'id': 'volume-2', 'host': entry['host'], 'size': 10}
+
+        found = cache.get_entry(self.context, volume_ref, 'image-1',
+                                {'checksum': 'abc'})
+
+        self.assertEqual(entry, found)
+        self.mock_db.image_volume_cache_get_and_update_last_used.\
+            assert_called_once_with(self.context, 'image-1', entry['host'])
+        self.assertEqual(['image_volume_cache.hit'], self._event_types())
+
+    def test_get_entry_miss(self):
+        cache = self._build_cache()
+        self.mock_db.image_volume_cache_get_and_update_last_used.\
+            return_value = None
+        volume_ref = {'id': 'volume-2', 'host': 'foo@bar#whatever',
+                      'size': 10}
+
+        self.assertIsNone(cache.get_entry(self.context, volume_ref,
+                                          'image-1', {}))
+        self.assertEqual(['image_volume_cache.miss'], self._event_types())
+
+    def test_get_entry_image_changed(self):
+        cache = self._build_cache()
+        entry = self._build_entry(checksum='old')
+        self.mock_db.image_volume_cache_get_and_update_last_used.\
+            return_value = entry
+        volume_ref = {'id': 'volume-2', 'host': entry['host'], 'size': 10}
+
+        self.assertIsNone(cache.get_entry(self.context, volume_ref,
+                                          'image-1', {'checksum': 'new'}))
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            self.context, 'volume-1')
+        self.mock_volume_api.delete.assert_called_once_with(
+            self.context, self.mock_db.volume_get.return_value, force=True)
+        self.assertEqual(['image_volume_cache.evict',
+                          'image_volume_cache.miss'], self._event_types())
+
+    def test_get_entry_larger_than_volume(self):
+        cache = self._build_cache()
+        entry = self._build_entry(size=20)
+        self.mock_db.image_volume_cache_get_and_update_last_used.\
+            return_value = entry
+        volume_ref = {'id': 'volume-2', 'host': entry['host'], 'size': 10}
+
+        self.assertIsNone(cache.get_entry(self.context, volume_ref,
+                                          'image-1', {'checksum': 'abc'}))
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            self.context, 'volume-1')
+
+    def test_create_cache_entry(self):
+        cache = self._build_cache()
+        volume_ref = {'id': 'volume-1', 'host': 'foo@bar#whatever',
+                      'size': 10}
+        self.mock_db.image_volume_cache_create.return_value = \
+            self._build_entry()
+
+        cache.create_cache_entry(self.context, volume_ref, 'image-1',
+                                 {'checksum': 'abc'})
+
+        self.mock_db.image_volume_cache_create.assert_called_once_with(
+            self.context, 'foo@bar#whatever', 'image-1', 'abc', 'volume-1',
+            10)
+
+    def test_ensure_space_unlimited(self):
+        cache = self._build_cache()
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            self._build_entry(size=500)]
+
+        self.assertTrue(cache.ensure_space(self.context, 500, 'host'))
+        self.assertFalse(self.mock_volume_api.delete.called)
+
+    def test_ensure_space_too_large(self):
+        cache = self._build_cache(max_gb=10)
+
+        self.assertFalse(cache.ensure_space(self.context, 11, 'host'))
+        self.assertFalse(
+            self.mock_db.image_volume_cache_get_all_for_host.called)
+
+    def test_ensure_space_evicts_lru_by_size(self):
+        cache = self._build_cache(max_gb=30)
+        entries = [self._build_entry(size=10, volume_id='lru'),
+                   self._build_entry(size=10, volume_id='middle'),
+                   self._build_entry(size=10, volume_id='mru')]
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = \
+            entries
+
+        self.assertTrue(cache.ensure_space(self.context, 15, 'host'))
+        self.assertEqual(
+            [mock.call(self.context, 'lru'),
+             mock.call(self.context, 'middle')],
+            self.mock_db.image_volume_cache_delete.call_args_list)
+        self.assertEqual(2, self.mock_volume_api.delete.call_count)
+
+    def test_ensure_space_evicts_lru_by_count(self):
+        cache = self._build_cache(max_count=2)
+        entries = [self._build_entry(volume_id='lru'),
+                   self._build_entry(volume_id='mru')]
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = \
+            entries
+
+        self.assertTrue(cache.ensure_space(self.context, 10, 'host'))
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            self.context, 'lru')
+
+    def test_ensure_space_volume_gone(self):
+        cache = self._build_cache(max_count=1)
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            self._build_entry()]
+        self.mock_db.volume_get.side_effect = exception.VolumeNotFound(
+            volume_id='volume-1')
+
+        self.assertTrue(cache.ensure_space(self.context, 10, 'host'))
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            self.context, 'volume-1')
+        self.assertFalse(self.mock_volume_api.delete.called)
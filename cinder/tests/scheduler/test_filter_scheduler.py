@@ -162,6 +162,62 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertIsNotNone(weighed_host.obj)
         self.assertTrue(_mock_service_get_all_by_topic.called)
 
+    @mock.patch('cinder.scheduler.driver.volume_update_db')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes(self, _mock_service_get_all_by_topic,
+                                     _mock_volume_update_db):
+        # Hosts are filtered once and the volumes are spread over the
+        # candidates until they run out of capacity.
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+
+        request_spec_list = [{'volume_type': {'name': 'LVM_iSCSI'},
+                              'volume_properties': {'project_id': 1,
+                                                    'size': 400},
+                              'volume_id': 'fake-id%d' % i,
+                              'snapshot_id': None,
+                              'image_id': None} for i in range(4)]
+        with mock.patch.object(sched.volume_rpcapi,
+                               'create_volume') as _mock_create_volume:
+            unplaced = sched.schedule_create_volumes(fake_context,
+                                                     request_spec_list, {})
+
+        # Only host1 and host5 can take volumes of 400GB, host1 has room
+        # for two of them and host5 for one.
+        self.assertEqual(request_spec_list[3:], unplaced)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+        self.assertEqual(3, _mock_create_volume.call_count)
+        expected_hosts = ['host1', 'host1', 'host5']
+        for i, call in enumerate(_mock_volume_update_db.call_args_list):
+            self.assertEqual('fake-id%d' % i, call[0][1])
+            self.assertEqual(expected_hosts[i],
+                             utils.extract_host(call[0][2]))
+        for i, call in enumerate(_mock_create_volume.call_args_list):
+            request_spec, filter_properties = call[0][3:5]
+            self.assertEqual(request_spec_list[i], request_spec)
+            self.assertEqual(request_spec_list[i],
+                             filter_properties['request_spec'])
+            self.assertNotIn('context', filter_properties)
+            self.assertEqual(1, len(filter_properties['retry']['hosts']))
+
+    def test_schedule_create_volumes_no_hosts(self):
+        sched = fakes.FakeFilterScheduler()
+
+        fake_context = context.RequestContext('user', 'project')
+        request_spec_list = [{'volume_properties': {'project_id': 1,
+                                                    'size': 1},
+                              'volume_type': {'name': 'LVM_iSCSI'},
+                              'volume_id': 'fake-id%d' % i}
+                             for i in range(2)]
+        self.assertEqual(request_spec_list,
+                         sched.schedule_create_volumes(fake_context,
+                                                       request_spec_list,
+                                                       {}))
+
     def test_max_attempts(self):
         self.flags(scheduler_max_attempts=4)
 
@@ -21,6 +21,7 @@ from cinder import context
 from cinder import db
 from cinder.openstack.common import jsonutils
 from cinder.openstack.common.scheduler import filters
+from cinder.openstack.common.scheduler.filters import extra_specs_ops
 from cinder import test
 from cinder.tests.scheduler import fakes
 from cinder.tests import utils
@@ -317,3 +318,133 @@ class HostFiltersTestCase(test.TestCase):
             'same_host': "NOT-a-valid-UUID", }}
 
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
+
+    def test_affinity_same_filter_resolves_volumes_once(self):
+        filt_cls = self.class_map['SameBackendFilter']()
+        hosts = [fakes.FakeHostState('host%d#pool0' % i, {})
+                 for i in range(1, 4)]
+        volume = utils.create_volume(self.context, host='host2#pool0')
+        vol_id = volume.id
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'same_host': [vol_id], }}
+
+        with mock.patch.object(filt_cls.volume_api, 'get_all',
+                               wraps=filt_cls.volume_api.get_all) as get_all:
+            passed = filt_cls.filter_all(hosts, filter_properties)
+            self.assertEqual(['host2#pool0'], [h.host for h in passed])
+            self.assertEqual(1, get_all.call_count)
+
+    def test_affinity_different_filter_resolves_volumes_once(self):
+        filt_cls = self.class_map['DifferentBackendFilter']()
+        hosts = [fakes.FakeHostState('host%d#pool0' % i, {})
+                 for i in range(1, 4)]
+        volume = utils.create_volume(self.context, host='host2#pool0')
+        vol_id = volume.id
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'different_host': [vol_id], }}
+
+        with mock.patch.object(filt_cls.volume_api, 'get_all',
+                               wraps=filt_cls.volume_api.get_all) as get_all:
+            passed = filt_cls.filter_all(hosts, filter_properties)
+            self.assertEqual(['host1#pool0', 'host3#pool0'],
+                             [h.host for h in passed])
+            self.assertEqual(1, get_all.call_count)
+
+    def _capabilities_hosts(self):
+        capabilities = [{'opt1': 'yes', 'free': 100, 'scope': {'opt2': 'a'}},
+                        {'opt1': 'no', 'free': 10, 'scope': {'opt2': 'b'}}]
+        return [fakes.FakeHostState('host%d#pool0' % (i + 1),
+                                    {'capabilities': caps})
+                for i, caps in enumerate(capabilities)]
+
+    def test_capabilities_filter_extra_specs(self):
+        filt_cls = self.class_map['CapabilitiesFilter']()
+        hosts = self._capabilities_hosts()
+        resource_type = {'extra_specs': {'capabilities:opt1': '<is> True',
+                                         'free': '>= 50',
+                                         'capabilities:scope:opt2':
+                                         '<or> a <or> c',
+                                         'other:key': 'ignored'}}
+        filter_properties = {'resource_type': resource_type}
+
+        passed = filt_cls.filter_all(hosts, filter_properties)
+        self.assertEqual(['host1#pool0'], [h.host for h in passed])
+
+    def test_capabilities_filter_missing_capability(self):
+        filt_cls = self.class_map['CapabilitiesFilter']()
+        hosts = self._capabilities_hosts()
+        resource_type = {'extra_specs': {'capabilities:missing': 'yes'}}
+        filter_properties = {'resource_type': resource_type}
+
+        self.assertEqual([], list(filt_cls.filter_all(hosts,
+                                                      filter_properties)))
+
+    def test_capabilities_filter_compiles_type_once(self):
+        cls = self.class_map['CapabilitiesFilter']
+        self.stubs.Set(cls, '_compiled_specs', {})
+        hosts = self._capabilities_hosts()
+        resource_type = {'id': 'type1', 'updated_at': None,
+                         'extra_specs': {'opt1': 'yes', 'free': '>= 50'}}
+
+        with mock.patch.object(cls, '_compile_extra_specs',
+                               wraps=cls._compile_extra_specs) as compile:
+            for i in range(3):
+                # Each request gets its own copy of the volume type.
+                filter_properties = {'resource_type':
+                                     jsonutils.loads(
+                                         jsonutils.dumps(resource_type))}
+                passed = cls().filter_all(hosts, filter_properties)
+                self.assertEqual(['host1#pool0'], [h.host for h in passed])
+            self.assertEqual(1, compile.call_count)
+
+            # Changing the extra specs recompiles them even when
+            # updated_at did not move.
+            resource_type['extra_specs']['free'] = '>= 5'
+            filter_properties = {'resource_type': resource_type}
+            passed = cls().filter_all(hosts, filter_properties)
+            self.assertEqual(['host1#pool0'], [h.host for h in passed])
+            resource_type['extra_specs']['opt1'] = 'no'
+            passed = cls().filter_all(hosts, filter_properties)
+            self.assertEqual(['host2#pool0'], [h.host for h in passed])
+            self.assertEqual(3, compile.call_count)
+
+
+class ExtraSpecsOpsTestCase(test.TestCase):
+    """Test case for extra specs operators."""
+
+    def _do_extra_specs_ops_test(self, value, req, matches):
+        self.assertEqual(matches, extra_specs_ops.match(value, req))
+        self.assertEqual(matches, extra_specs_ops.make_matcher(req)(value))
+
+    def test_extra_specs_ops(self):
+        for value, req, matches in [
+                ('12', '= 10', True),
+                ('8', '= 10', False),
+                ('12', '== 12', True),
+                ('12', '!= 12', False),
+                ('12', '>= 12.0', True),
+                ('12', '<= 11', False),
+                ('abc', '>= 1', False),
+                ('12', '>= abc', False),
+                ('12', '>=', False),
+                (None, '>= 1', False),
+                ('abc', 's== abc', True),
+                ('abc', 's!= abc', False),
+                ('abc', 's< abd', True),
+                ('abc', 's> abd', False),
+                ('abcde', '<in> bcd', True),
+                ('abcde', '<in> xyz', False),
+                (True, '<is> True', True),
+                ('false', '<is> True', False),
+                ('v2', '<or> v1 <or> v2 <or> v3', True),
+                ('v4', '<or> v1 <or> v2 <or> v3', False),
+                (None, '<or> v1', False),
+                ('', '', True),
+                ('foo', 'foo', True),
+                ('foo', 'bar', False),
+                ('foo', '<unknown> foo', False)]:
+            self._do_extra_specs_ops_test(value, req, matches)
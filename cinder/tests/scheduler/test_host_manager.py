@@ -188,6 +188,80 @@ class HostManagerTestCase(test.TestCase):
             self.assertEqual(host_state_map[host].service,
                              volume_node)
 
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_get_all_host_states_incremental(self, _mock_service_is_up,
+                                             _mock_service_get_all_by_topic):
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+            dict(id=2, host='host2', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+        for host in ('host1', 'host2'):
+            self.host_manager.update_service_capabilities(
+                'volume', host, dict(total_capacity_gb=1024,
+                                     free_capacity_gb=512,
+                                     reserved_percentage=0))
+
+        pools = list(self.host_manager.get_all_host_states(context))
+        self.assertEqual(2, len(pools))
+        pool_state_map = self.host_manager.pool_state_map
+
+        # Nothing changed, host states are neither refreshed nor rebuilt
+        with mock.patch.object(host_manager.HostState,
+                               'update_from_volume_capability') as mock_upd:
+            self.assertEqual(set(pools), set(
+                self.host_manager.get_all_host_states(context)))
+            self.assertFalse(mock_upd.called)
+        self.assertIs(pool_state_map, self.host_manager.pool_state_map)
+
+        # Only the host which reported new capabilities is refreshed
+        self.host_manager.update_service_capabilities(
+            'volume', 'host2', dict(total_capacity_gb=1024,
+                                    free_capacity_gb=256,
+                                    reserved_percentage=0))
+        pools = dict((pool.host, pool) for pool in
+                     self.host_manager.get_all_host_states(context))
+        self.assertEqual(512, pools['host1#_pool0'].free_capacity_gb)
+        self.assertEqual(256, pools['host2#_pool0'].free_capacity_gb)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_get_all_host_states_service_cache(self, _mock_service_is_up,
+                                               _mock_service_get_all_by_topic):
+        self.flags(scheduler_service_cache_ttl=60)
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # Known hosts reporting capabilities keep the cache
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(total_capacity_gb=1024,
+                                    free_capacity_gb=512,
+                                    reserved_percentage=0))
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # A capability update from a new host refreshes the services
+        self.host_manager.update_service_capabilities(
+            'volume', 'host2', dict(total_capacity_gb=1024,
+                                    free_capacity_gb=512,
+                                    reserved_percentage=0))
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, _mock_service_get_all_by_topic.call_count)
+
 
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class."""
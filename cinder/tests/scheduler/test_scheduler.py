@@ -102,6 +102,22 @@ class SchedulerManagerTestCase(test.TestCase):
         _mock_sched_create.assert_called_once_with(self.context, request_spec,
                                                    {})
 
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volumes')
+    @mock.patch('cinder.db.volume_update')
+    def test_create_volumes_puts_unplaced_volumes_in_error_state(
+            self, _mock_volume_update, _mock_sched_create):
+        # Volumes the driver could not place are put in 'error' state.
+        request_spec_list = [{'volume_id': 1}, {'volume_id': 2}]
+        _mock_sched_create.return_value = request_spec_list[1:]
+        topic = 'fake_topic'
+
+        self.manager.create_volumes(self.context, topic, request_spec_list,
+                                    filter_properties={})
+        _mock_volume_update.assert_called_once_with(self.context, 2,
+                                                    {'status': 'error'})
+        _mock_sched_create.assert_called_once_with(self.context,
+                                                   request_spec_list, {})
+
     @mock.patch('cinder.scheduler.driver.Scheduler.host_passes_filters')
     @mock.patch('cinder.db.volume_update')
     def test_migrate_volume_exception_returns_volume_state(
@@ -71,7 +71,8 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         return host_states
 
     def test_volume_number_weight_multiplier1(self):
-        self.flags(volume_number_multiplier=-1.0)
+        self.flags(volume_number_multiplier=-1.0,
+                   volume_number_grouped_query=False)
         hostinfo_list = self._get_all_hosts()
 
         # host1: 1 volume
@@ -88,7 +89,8 @@ class VolumeNumberWeigherTestCase(test.TestCase):
                              'host1')
 
     def test_volume_number_weight_multiplier2(self):
-        self.flags(volume_number_multiplier=1.0)
+        self.flags(volume_number_multiplier=1.0,
+                   volume_number_grouped_query=False)
         hostinfo_list = self._get_all_hosts()
 
         # host1: 1 volume
@@ -103,3 +105,24 @@ class VolumeNumberWeigherTestCase(test.TestCase):
             self.assertEqual(weighed_host.weight, 5.0)
             self.assertEqual(utils.extract_host(weighed_host.obj.host),
                              'host5')
+
+    def test_volume_number_weight_grouped_query(self):
+        self.flags(volume_number_multiplier=-1.0)
+        hostinfo_list = list(self._get_all_hosts())
+
+        # the counts of all hosts come from one grouped query,
+        # so host1 should win without any per-host query:
+        volume_counts = dict(
+            (host.host, fake_volume_data_get_for_host(self.context,
+                                                      host.host))
+            for host in hostinfo_list)
+        with mock.patch.object(api, 'volume_data_get_for_all_hosts',
+                               return_value=volume_counts) as mock_all_hosts:
+            with mock.patch.object(api, 'volume_data_get_for_host') as \
+                    mock_host:
+                weighed_host = self._get_weighed_host(hostinfo_list)
+                self.assertEqual(weighed_host.weight, -1.0)
+                self.assertEqual(utils.extract_host(weighed_host.obj.host),
+                                 'host1')
+                mock_all_hosts.assert_called_once_with(self.context, True)
+                self.assertFalse(mock_host.called)
@@ -363,6 +363,55 @@ class BackupCephTestCase(test.TestCase):
             # Ensure the files are equal
             self.assertEqual(checksum.digest(), self.checksum.digest())
 
+    def _zero_volume_file_chunks(self):
+        """Zero every other chunk of the volume file, and the last one."""
+        for i in range(0, self.num_chunks, 2) + [self.num_chunks - 1]:
+            self.volume_file.seek(i * self.chunk_size)
+            self.volume_file.write('\0' * self.chunk_size)
+        self.volume_file.flush()
+        self.volume_file.seek(0)
+
+    @common_mocks
+    def test_transfer_data_from_file_to_rbd_skips_zeroes(self):
+        self.service.chunk_size = self.chunk_size
+        self._zero_volume_file_chunks()
+
+        self.mock_rbd.Image.write = mock.Mock()
+        self.mock_rbd.Image.discard = mock.Mock()
+
+        rbd_io = self._get_wrapped_rbd_io(self.service.rbd.Image())
+        self.service._transfer_data(self.volume_file, 'src_foo',
+                                    rbd_io, 'dest_foo', self.data_length)
+
+        written = [args[1] for args, kwargs in
+                   self.mock_rbd.Image.write.call_args_list]
+        self.assertEqual([i * self.chunk_size
+                          for i in range(1, self.num_chunks - 1, 2)],
+                         written)
+        self.assertEqual(self.num_chunks / 2 + 1,
+                         self.mock_rbd.Image.discard.call_count)
+        self.assertEqual(self.data_length, rbd_io.tell())
+
+    @common_mocks
+    def test_transfer_data_from_file_to_file_skips_zeroes(self):
+        self.service.chunk_size = self.chunk_size
+        self._zero_volume_file_chunks()
+
+        with tempfile.NamedTemporaryFile() as test_file:
+            with mock.patch.object(self.service, '_discard_bytes') as \
+                    mock_discard_bytes:
+                self.service._transfer_data(self.volume_file, 'src_foo',
+                                            test_file, 'dest_foo',
+                                            self.data_length)
+                self.assertFalse(mock_discard_bytes.called)
+
+            test_file.flush()
+            self.assertEqual(self.data_length,
+                             os.fstat(test_file.fileno()).st_size)
+            test_file.seek(0)
+            self.volume_file.seek(0)
+            self.assertEqual(self.volume_file.read(), test_file.read())
+
     @common_mocks
     def test_backup_volume_from_file(self):
         checksum = hashlib.sha256()
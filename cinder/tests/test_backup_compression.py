@@ -0,0 +1,95 @@
+# Copyright (C) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+""" Tests for the backup compressor registry. """
+
+import bz2
+import zlib
+
+import mock
+
+from cinder.backup import compression
+from cinder import test
+
+
+class FakeCompressor(object):
+    def compress(self, data):
+        return 'fake' + data
+
+    def decompress(self, data):
+        return data[len('fake'):]
+
+
+def _not_installed():
+    raise ImportError('not installed')
+
+
+class BackupCompressionTestCase(test.TestCase):
+
+    def setUp(self):
+        super(BackupCompressionTestCase, self).setUp()
+        for registry in ('_loaders', '_aliases', '_compressors'):
+            patcher = mock.patch.dict(getattr(compression, registry))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        compression.register_compressor('lz4', _not_installed)
+        compression.register_compressor('zstd', _not_installed)
+
+    def test_get_compressor(self):
+        self.assertEqual(zlib, compression.get_compressor('zlib'))
+        self.assertEqual(zlib, compression.get_compressor('GZIP'))
+        self.assertEqual(bz2, compression.get_compressor('bzip2'))
+        self.assertIsNone(compression.get_compressor('None'))
+        self.assertIsNone(compression.get_compressor('off'))
+
+    def test_get_compressor_unsupported(self):
+        self.assertRaises(ValueError, compression.get_compressor, 'fake')
+        self.assertRaises(ValueError, compression.get_compressor, 'lz4')
+
+    def test_register_compressor(self):
+        compressor = FakeCompressor()
+        loader = mock.Mock(return_value=compressor)
+        compression.register_compressor('fake', loader, aliases=('alias',))
+
+        self.assertEqual(compressor, compression.get_compressor('fake'))
+        self.assertEqual(compressor, compression.get_compressor('alias'))
+        self.assertEqual(1, loader.call_count)
+
+    def test_resolve(self):
+        self.assertEqual('zlib', compression.resolve('ZLIB'))
+        self.assertEqual('gzip', compression.resolve('gzip'))
+        self.assertEqual('none', compression.resolve('None'))
+        self.assertRaises(ValueError, compression.resolve, 'lz4')
+
+    def test_resolve_auto_falls_back_to_zlib(self):
+        self.assertEqual('zlib', compression.resolve('auto'))
+
+    def test_resolve_auto_prefers_fastest(self):
+        compression.register_compressor('zstd', FakeCompressor)
+        self.assertEqual('zstd', compression.resolve('auto'))
+        compression.register_compressor('lz4', FakeCompressor)
+        self.assertEqual('lz4', compression.resolve('auto'))
+
+    def test_zstd_adapter(self):
+        zstandard = mock.Mock()
+        zstandard.ZstdCompressor.return_value.compress.return_value = 'c'
+        zstandard.ZstdDecompressor.return_value.decompress.return_value = 'd'
+        compressor = compression._ZstdCompressor(zstandard)
+
+        self.assertEqual('c', compressor.compress('data'))
+        self.assertEqual('d', compressor.decompress('c'))
+        zstandard.ZstdCompressor.return_value.compress.assert_called_with(
+            'data')
+        zstandard.ZstdDecompressor.return_value.decompress.assert_called_with(
+            'c')
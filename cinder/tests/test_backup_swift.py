@@ -18,22 +18,30 @@ Tests for Backup swift code.
 """
 
 import bz2
+import collections
 import hashlib
 import os
 import tempfile
+import time
 import zlib
 
 from oslo.config import cfg
+import six
+import sqlalchemy
 from swiftclient import client as swift
 
+from cinder.backup import compression
 from cinder.backup.drivers.swift import SwiftBackupDriver
 from cinder import context
 from cinder import db
+from cinder.db.sqlalchemy import models
 from cinder import exception
 from cinder.i18n import _
 from cinder.openstack.common import log as logging
 from cinder import test
 from cinder.tests.backup.fake_swift_client import FakeSwiftClient
+from cinder.tests.backup.fake_swift_client2 import FakeSwiftClient2
+from cinder.tests.backup.fake_swift_client2 import FakeSwiftConnection2
 
 
 LOG = logging.getLogger(__name__)
@@ -59,11 +67,13 @@ class BackupSwiftTestCase(test.TestCase):
                'status': 'available'}
         return db.volume_create(self.ctxt, vol)['id']
 
-    def _create_backup_db_entry(self, container='test-container'):
-        backup = {'id': 123,
+    def _create_backup_db_entry(self, container='test-container',
+                                backup_id=123, parent_id=None):
+        backup = {'id': backup_id,
                   'size': 1,
                   'container': container,
-                  'volume_id': '1234-5678-1234-8888'}
+                  'volume_id': '1234-5678-1234-8888',
+                  'parent_id': parent_id}
         return db.backup_create(self.ctxt, backup)['id']
 
     def setUp(self):
@@ -275,3 +285,294 @@ class BackupSwiftTestCase(test.TestCase):
         compressor = service._get_compressor('bz2')
         self.assertEqual(compressor, bz2)
         self.assertRaises(ValueError, service._get_compressor, 'fake')
+
+    def _backup_and_restore(self):
+        self._create_backup_db_entry()
+        service = SwiftBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        backup = db.backup_get(self.ctxt, 123)
+        with tempfile.NamedTemporaryFile() as restored_file:
+            service.restore(backup, '1234-5678-1234-8888', restored_file)
+            restored_file.seek(0)
+            restored = restored_file.read()
+        self.volume_file.seek(0)
+        self.assertEqual(self.volume_file.read(), restored)
+        return backup
+
+    def test_backup_restore_parallel(self):
+        self.stubs.Set(swift, 'Connection', FakeSwiftClient2.Connection)
+        FakeSwiftConnection2.reset()
+        self.flags(backup_swift_object_size=8 * 1024,
+                   backup_swift_concurrency=4)
+
+        backup = self._backup_and_restore()
+
+        self.assertEqual(17, backup['object_count'])
+        self.assertEqual(4, FakeSwiftConnection2.max_in_flight)
+        object_names = sorted(FakeSwiftConnection2.store['test-container'])
+        self.assertEqual(
+            ['%s-%05d' % (backup['service_metadata'], i)
+             for i in range(1, 17)] +
+            ['%s_metadata' % backup['service_metadata']],
+            object_names)
+
+    def test_backup_restore_memory_limit(self):
+        self.stubs.Set(swift, 'Connection', FakeSwiftClient2.Connection)
+        FakeSwiftConnection2.reset()
+        self.flags(backup_swift_object_size=8 * 1024,
+                   backup_swift_concurrency=4,
+                   backup_swift_max_memory=16 * 1024 + 1)
+
+        self._backup_and_restore()
+
+        self.assertEqual(2, FakeSwiftConnection2.max_in_flight)
+
+    def test_backup_restore_serial(self):
+        self.stubs.Set(swift, 'Connection', FakeSwiftClient2.Connection)
+        FakeSwiftConnection2.reset()
+        self.flags(backup_swift_object_size=8 * 1024)
+
+        self._backup_and_restore()
+
+        self.assertEqual(1, FakeSwiftConnection2.max_in_flight)
+
+    def test_backup_parallel_put_object_wraps_socket_error(self):
+        self.flags(backup_swift_object_size=8 * 1024,
+                   backup_swift_concurrency=4)
+        self._create_backup_db_entry(container='socket_error_on_put')
+        service = SwiftBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertRaises(exception.SwiftConnectionFailed,
+                          service.backup,
+                          backup, self.volume_file)
+
+    def test_restore_parallel_wraps_socket_error(self):
+        self.flags(backup_swift_concurrency=4,
+                   backup_swift_object_size=1024 * 1024)
+        container_name = 'socket_error_on_get'
+        self._create_backup_db_entry(container=container_name)
+        service = SwiftBackupDriver(self.ctxt)
+        metadata = {'objects': [{'backup_001': {'compression': 'zlib'}},
+                                {'backup_002': {'compression': 'zlib'}}]}
+        self.stubs.Set(service, '_generate_object_names',
+                       lambda backup: ['backup_001', 'backup_002'])
+
+        with tempfile.NamedTemporaryFile() as volume_file:
+            backup = db.backup_get(self.ctxt, 123)
+            self.assertRaises(exception.SwiftConnectionFailed,
+                              service._restore_v1,
+                              backup, '1234-5678-1234-8888', metadata,
+                              volume_file)
+
+    def _restore_volume_data(self, service, backup_id):
+        backup = db.backup_get(self.ctxt, backup_id)
+        with tempfile.NamedTemporaryFile() as restored_file:
+            service.restore(backup, '1234-5678-1234-8888', restored_file)
+            restored_file.seek(0)
+            return restored_file.read()
+
+    def _backup_incremental(self):
+        """Back up the volume, change its third chunk, then back it up
+        again incrementally.
+        """
+        self.stubs.Set(swift, 'Connection', FakeSwiftClient2.Connection)
+        FakeSwiftConnection2.reset()
+        self.flags(backup_swift_object_size=8 * 1024)
+        self._create_backup_db_entry()
+        service = SwiftBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        service.backup(db.backup_get(self.ctxt, 123), self.volume_file)
+
+        self.volume_file.seek(2 * 8 * 1024)
+        self.volume_file.write(os.urandom(1024))
+        self.volume_file.flush()
+        self._create_backup_db_entry(backup_id=124, parent_id=123)
+        self.volume_file.seek(0)
+        service.backup(db.backup_get(self.ctxt, 124), self.volume_file)
+        return service
+
+    def test_backup_incremental(self):
+        service = self._backup_incremental()
+
+        parent = db.backup_get(self.ctxt, 123)
+        backup = db.backup_get(self.ctxt, 124)
+        store = FakeSwiftConnection2.store['test-container']
+        self.assertEqual(['%s-00001' % backup['service_metadata'],
+                          '%s_metadata' % backup['service_metadata']],
+                         sorted(name for name in store if
+                                name.startswith(backup['service_metadata'])))
+
+        metadata = service._read_metadata(backup)
+        self.assertEqual('1.1.0', metadata['version'])
+        self.assertEqual('123', metadata['parent_id'])
+        object_names = [obj.keys()[0] for obj in metadata['objects']]
+        self.assertEqual(16, len(object_names))
+        self.assertEqual('%s-00001' % backup['service_metadata'],
+                         object_names[2])
+        self.assertTrue(all(name.startswith(parent['service_metadata'])
+                            for name in object_names[:2] + object_names[3:]))
+
+        self.volume_file.seek(0)
+        self.assertEqual(self.volume_file.read(),
+                         self._restore_volume_data(service, 124))
+
+    def test_backup_incremental_parallel(self):
+        self.flags(backup_swift_concurrency=4)
+        service = self._backup_incremental()
+
+        backup = db.backup_get(self.ctxt, 124)
+        metadata = service._read_metadata(backup)
+        object_names = [obj.keys()[0] for obj in metadata['objects']]
+        self.assertEqual('%s-00001' % backup['service_metadata'],
+                         object_names[2])
+        self.volume_file.seek(0)
+        self.assertEqual(self.volume_file.read(),
+                         self._restore_volume_data(service, 124))
+
+    def test_restore_incremental_missing_parent_object(self):
+        service = self._backup_incremental()
+
+        parent = db.backup_get(self.ctxt, 123)
+        service.conn.delete_object('test-container',
+                                   '%s-00001' % parent['service_metadata'])
+        self.assertRaises(exception.InvalidBackup,
+                          self._restore_volume_data, service, 124)
+
+    def _backup_sparse(self):
+        """Zero the second and the last chunk of the volume and back it up.
+        """
+        self.stubs.Set(swift, 'Connection', FakeSwiftClient2.Connection)
+        FakeSwiftConnection2.reset()
+        self.flags(backup_swift_object_size=8 * 1024)
+        for offset in (8 * 1024, 15 * 8 * 1024):
+            self.volume_file.seek(offset)
+            self.volume_file.write('\0' * 8 * 1024)
+        self.volume_file.flush()
+        return self._backup_and_restore()
+
+    def _check_sparse_backup(self, backup):
+        self.assertEqual(15, backup['object_count'])
+        store = FakeSwiftConnection2.store['test-container']
+        self.assertEqual(15, len(store))
+
+        service = SwiftBackupDriver(self.ctxt)
+        metadata = service._read_metadata(backup)
+        self.assertEqual('1.1.0', metadata['version'])
+        self.assertNotIn('parent_id', metadata)
+        objects = metadata['objects']
+        self.assertEqual(16, len(objects))
+        # Like object entries, holes record the offset their chunk ends at.
+        self.assertEqual({'hole': {'offset': 2 * 8 * 1024,
+                                   'length': 8 * 1024}},
+                         objects[1])
+        self.assertEqual({'hole': {'offset': 16 * 8 * 1024,
+                                   'length': 8 * 1024}},
+                         objects[15])
+
+    def test_backup_sparse(self):
+        self._check_sparse_backup(self._backup_sparse())
+
+    def test_backup_sparse_parallel(self):
+        self.flags(backup_swift_concurrency=4)
+        self._check_sparse_backup(self._backup_sparse())
+
+    def test_backup_without_holes_keeps_version(self):
+        self.stubs.Set(swift, 'Connection', FakeSwiftClient2.Connection)
+        FakeSwiftConnection2.reset()
+        self.flags(backup_swift_object_size=8 * 1024)
+        backup = self._backup_and_restore()
+
+        service = SwiftBackupDriver(self.ctxt)
+        self.assertEqual('1.0.0', service._read_metadata(backup)['version'])
+
+    def test_restore_sparse_leaves_holes(self):
+        self._backup_sparse()
+        service = SwiftBackupDriver(self.ctxt)
+        backup = db.backup_get(self.ctxt, 123)
+        with tempfile.NamedTemporaryFile() as restored_file:
+            self.stubs.Set(restored_file, 'write',
+                           lambda data, write=restored_file.write:
+                           self.assertTrue(data.strip('\0')) or write(data))
+            service.restore(backup, '1234-5678-1234-8888', restored_file)
+            self.assertEqual(128 * 1024,
+                             os.fstat(restored_file.fileno()).st_size)
+
+    def test_write_hole_writes_zeroes_to_devices(self):
+        service = SwiftBackupDriver(self.ctxt)
+        volume_file = six.BytesIO('data')
+        volume_file.seek(0, os.SEEK_END)
+        service._write_hole(volume_file, 1024)
+        self.assertEqual('data' + '\0' * 1024, volume_file.getvalue())
+
+    def _backup_objects(self, **flags):
+        self.stubs.Set(swift, 'Connection', FakeSwiftClient2.Connection)
+        FakeSwiftConnection2.reset()
+        self.flags(backup_swift_object_size=8 * 1024, **flags)
+        backup = self._backup_and_restore()
+        service = SwiftBackupDriver(self.ctxt)
+        objects = service._read_metadata(backup)['objects']
+        return backup, [obj.values()[0] for obj in objects]
+
+    def test_backup_auto_compression(self):
+        backup, objects = self._backup_objects(
+            backup_compression_algorithm='auto')
+        self.assertEqual(set([compression.resolve('auto')]),
+                         set(obj['compression'] for obj in objects))
+
+    def test_backup_min_ratio_stores_uncompressible_chunks(self):
+        self.volume_file.seek(0)
+        self.volume_file.write('a' * 8 * 1024)
+        self.volume_file.flush()
+        backup, objects = self._backup_objects(
+            backup_compression_min_ratio=1.1)
+        self.assertEqual('zlib', objects[0]['compression'])
+        self.assertEqual(set(['none']),
+                         set(obj['compression'] for obj in objects[1:]))
+
+    def test_backup_records_stats(self):
+        self.volume_file.seek(0)
+        self.volume_file.write('a' * 64 * 1024)
+        self.volume_file.flush()
+        backup, objects = self._backup_objects()
+
+        store = FakeSwiftConnection2.store['test-container']
+        stored = sum(len(store[name]) for name in store
+                     if not name.endswith('_metadata'))
+        self.assertAlmostEqual(128 * 1024.0 / stored,
+                               backup['compression_ratio'])
+        self.assertTrue(backup['compression_ratio'] > 1.5)
+        self.assertTrue(backup['throughput'] > 0)
+
+    def test_finalize_backup_large_throughput(self):
+        self._create_backup_db_entry()
+        backup = db.backup_get(self.ctxt, 123)
+        object_meta = {'list': [], 'id': 1, 'volume_meta': None,
+                       'stats': collections.Counter(read=2 ** 33),
+                       'start_time': 0}
+        self.stubs.Set(time, 'time', lambda: 1)
+        service = SwiftBackupDriver(self.ctxt)
+        self.stubs.Set(service, '_write_metadata',
+                       lambda *args, **kwargs: None)
+
+        service._finalize_backup(backup, 'test-container', object_meta)
+
+        self.assertEqual(2 ** 33, db.backup_get(self.ctxt, 123)['throughput'])
+        self.assertIsInstance(models.Backup.throughput.type,
+                              sqlalchemy.types.BigInteger)
+
+    def test_backup_stats_without_uploads(self):
+        object_meta = {'stats': collections.Counter(read=1024),
+                       'start_time': 0}
+        self.stubs.Set(time, 'time', lambda: 2)
+        self.assertEqual({'throughput': 512, 'compression_ratio': None},
+                         SwiftBackupDriver._backup_stats(object_meta))
+
+    def test_restore_gzip_compressed_objects(self):
+        backup, objects = self._backup_objects(
+            backup_compression_algorithm='gzip')
+        self.assertEqual(set(['gzip']),
+                         set(obj['compression'] for obj in objects))
@@ -85,3 +85,15 @@ class ContextTestCase(test.TestCase):
                                      project_domain="project-domain")
         self.assertEqual('user tenant domain user-domain project-domain',
                          ctx.to_dict()["user_identity"])
+
+    def test_get_internal_tenant_context(self):
+        self.flags(cinder_internal_tenant_project_id='project',
+                   cinder_internal_tenant_user_id='user')
+        ctx = context.get_internal_tenant_context()
+        self.assertEqual('project', ctx.project_id)
+        self.assertEqual('user', ctx.user_id)
+        self.assertTrue(ctx.is_admin)
+
+    def test_get_internal_tenant_context_not_configured(self):
+        self.flags(cinder_internal_tenant_project_id='project')
+        self.assertIsNone(context.get_internal_tenant_context())
@@ -114,3 +114,23 @@ class CreateVolumeFlowTestCase(test.TestCase):
             fake_db())
 
         task._cast_create_volume(self.ctxt, spec, props)
+
+    def test_cast_create_volume_deferred(self):
+
+        props = {'scheduler_hints': {'different_host': []}}
+        spec = {'volume_id': 1,
+                'source_volid': None,
+                'snapshot_id': None,
+                'image_id': None,
+                'source_replicaid': None,
+                'consistencygroup_id': None}
+
+        scheduler_casts = []
+        task = create_volume.VolumeCastTask(
+            fake_scheduler_rpc_api(None, self),
+            fake_volume_api(None, self),
+            fake_db(),
+            scheduler_casts=scheduler_casts)
+
+        task._cast_create_volume(self.ctxt, spec, props)
+        self.assertEqual([(spec, props)], scheduler_casts)
@@ -15,12 +15,20 @@
 
 
 import datetime
+import time
 
+import eventlet
+import mock
 from oslo.config import cfg
+from sqlalchemy import event
+from testtools import content
 
 from cinder import context
 from cinder import db
+from cinder.db.sqlalchemy import api as sqlalchemy_api
+from cinder.db.sqlalchemy import models
 from cinder import exception
+from cinder.openstack.common import timeutils
 from cinder.openstack.common import uuidutils
 from cinder.quota import ReservableResource
 from cinder import test
@@ -304,6 +312,16 @@ class DBAPIVolumeTestCase(BaseTest):
                              db.volume_data_get_for_host(
                                  self.ctxt, 'h%d' % i))
 
+    def test_volume_data_get_for_all_hosts(self):
+        for i in xrange(3):
+            for j in xrange(i + 1):
+                db.volume_create(self.ctxt, {'host': 'h%d' % i, 'size': 100})
+        self.assertEqual({'h0': (1, 100), 'h1': (2, 200), 'h2': (3, 300)},
+                         db.volume_data_get_for_all_hosts(self.ctxt))
+        self.assertEqual({'h0': 1, 'h1': 2, 'h2': 3},
+                         db.volume_data_get_for_all_hosts(self.ctxt,
+                                                          count_only=True))
+
     def test_volume_data_get_for_project(self):
         for i in xrange(3):
             for j in xrange(3):
@@ -370,6 +388,54 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualListsOfObjects(volumes[2:], db.volume_get_all(
                                         self.ctxt, 2, 2, 'id', None))
 
+    def test_volume_get_all_columns(self):
+        for i in xrange(1, 5):
+            db.volume_create(self.ctxt, {'id': i, 'display_name': 'v%d' % i,
+                                         'project_id': 'p%d' % (i % 2),
+                                         'metadata': {'a': 'b'}})
+
+        volumes = db.volume_get_all(self.ctxt, 1, 2, 'id', 'asc',
+                                    columns=('id', 'display_name'))
+        self.assertEqual([{'id': '2', 'display_name': 'v2'},
+                          {'id': '3', 'display_name': 'v3'}], volumes)
+
+        volumes = db.volume_get_all_by_project(
+            self.ctxt, 'p1', None, None, 'id', 'desc',
+            filters={'metadata': {'a': 'b'}}, columns=('id',))
+        self.assertEqual([{'id': '3'}, {'id': '1'}], volumes)
+
+    def test_volume_status_get(self):
+        volume = db.volume_create(self.ctxt, {'status': 'creating',
+                                              'project_id': 'project1'})
+        self.assertEqual('creating',
+                         db.volume_status_get(self.ctxt, volume['id']))
+
+        ctxt = context.RequestContext('user1', 'project2')
+        self.assertRaises(exception.VolumeNotFound, db.volume_status_get,
+                          ctxt, volume['id'])
+        db.volume_destroy(self.ctxt, volume['id'])
+        self.assertRaises(exception.VolumeNotFound, db.volume_status_get,
+                          self.ctxt, volume['id'])
+
+    def test_volume_get_all_changes_since(self):
+        for i in xrange(1, 4):
+            db.volume_create(self.ctxt, {
+                'id': i, 'project_id': 'p1',
+                'created_at': datetime.datetime(2014, 1, 1, 0, 0, i)})
+        db.volume_update(self.ctxt, 1,
+                         {'updated_at': datetime.datetime(2014, 2, 1)})
+        changes_since = datetime.datetime(2014, 1, 1, 0, 0, 2)
+
+        volumes = db.volume_get_all(self.ctxt, None, None, 'id', 'asc',
+                                    filters={'changes-since': changes_since})
+        self.assertEqual(['1', '2', '3'], [volume['id'] for volume in volumes])
+
+        changes_since = datetime.datetime(2014, 1, 1, 0, 0, 3)
+        volumes = db.volume_get_all_by_project(
+            self.ctxt, 'p1', None, None, 'id', 'asc',
+            filters={'changes-since': changes_since}, columns=('id',))
+        self.assertEqual([{'id': '1'}, {'id': '3'}], volumes)
+
     def test_volume_get_all_by_host(self):
         volumes = []
         for i in xrange(3):
@@ -741,6 +807,81 @@ class DBAPISnapshotTestCase(BaseTest):
                                         db.snapshot_get_all(self.ctxt),
                                         ignored_keys=['metadata', 'volume'])
 
+    def _create_snapshots(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        db.volume_create(self.ctxt, {'id': 2})
+        snapshots = []
+        for i, (volume_id, project_id, status) in enumerate(
+                [(1, 'p1', 'available'), (1, 'p2', 'available'),
+                 (2, 'p1', 'creating'), (2, 'p1', 'available')]):
+            created_at = datetime.datetime(2014, 1, 1, 0, 0, i)
+            snapshots.append(db.snapshot_create(
+                self.ctxt, {'id': str(i), 'volume_id': volume_id,
+                            'project_id': project_id, 'status': status,
+                            'created_at': created_at}))
+        return snapshots
+
+    def _assertSnapshotIds(self, ids, snapshots):
+        self.assertEqual(ids, [snapshot['id'] for snapshot in snapshots])
+
+    def test_snapshot_get_all_filters(self):
+        self._create_snapshots()
+        self._assertSnapshotIds(
+            ['3', '0'], db.snapshot_get_all(
+                self.ctxt, filters={'status': 'available',
+                                    'project_id': 'p1'}))
+        self._assertSnapshotIds(
+            ['3', '2', '1'], db.snapshot_get_all(
+                self.ctxt, filters={'id': ['1', '2', '3']}))
+        self._assertSnapshotIds(
+            [], db.snapshot_get_all(self.ctxt, filters={'status': 'error'}))
+
+    def test_snapshot_get_all_changes_since(self):
+        snapshots = self._create_snapshots()
+        db.snapshot_update(self.ctxt, snapshots[0]['id'],
+                           {'updated_at': datetime.datetime(2014, 2, 1)})
+        changes_since = datetime.datetime(2014, 1, 1, 0, 0, 2)
+
+        self._assertSnapshotIds(
+            ['3', '2', '0'], db.snapshot_get_all(
+                self.ctxt, filters={'changes-since': changes_since}))
+        self._assertSnapshotIds(
+            ['3', '0'], db.snapshot_get_all_by_project(
+                self.ctxt, 'p1', filters={'changes-since': changes_since,
+                                          'status': 'available'}))
+
+    def test_snapshot_get_all_invalid_filters(self):
+        self._create_snapshots()
+        self.assertEqual([], db.snapshot_get_all(
+            self.ctxt, filters={'fake': 'value'}))
+        self.assertEqual([], db.snapshot_get_all(
+            self.ctxt, filters={'volume': 'value'}))
+
+    def test_snapshot_get_all_paginate(self):
+        self._create_snapshots()
+        self._assertSnapshotIds(
+            ['3', '2'], db.snapshot_get_all(self.ctxt, limit=2))
+        self._assertSnapshotIds(
+            ['1', '0'], db.snapshot_get_all(self.ctxt, marker='2', limit=2))
+        self._assertSnapshotIds(
+            ['2', '3'], db.snapshot_get_all(self.ctxt, marker='1',
+                                            sort_key='id', sort_dir='asc'))
+        self.assertRaises(exception.SnapshotNotFound, db.snapshot_get_all,
+                          self.ctxt, marker='fake')
+
+    def test_snapshot_get_all_by_project(self):
+        self._create_snapshots()
+        self._assertSnapshotIds(
+            ['3', '2', '0'], db.snapshot_get_all_by_project(self.ctxt, 'p1'))
+        self._assertSnapshotIds(
+            ['2'], db.snapshot_get_all_by_project(
+                self.ctxt, 'p1', filters={'volume_id': '2',
+                                          'status': 'creating'}))
+        # The project_id argument takes precedence over the filters
+        self._assertSnapshotIds(
+            ['3', '2', '0'], db.snapshot_get_all_by_project(
+                self.ctxt, 'p1', filters={'project_id': 'p2'}))
+
     def test_snapshot_metadata_get(self):
         metadata = {'a': 'b', 'c': 'd'}
         db.volume_create(self.ctxt, {'id': 1})
@@ -975,6 +1116,30 @@ class DBAPIReservationTestCase(BaseTest):
                              self.ctxt,
                              'project1'))
 
+    def test_reservation_expire_batches(self):
+        for project_id in ('project1', 'project2', 'project3'):
+            _quota_reserve(self.ctxt, project_id)
+        # A reservation which has not expired yet
+        usage = db.quota_usage_get(self.ctxt, 'project1', 'volumes')
+        sqlalchemy_api._reservation_create(
+            self.ctxt, 'unexpired', usage, 'project1', 'volumes', 3,
+            datetime.datetime.utcnow() + datetime.timedelta(days=1),
+            session=sqlalchemy_api.get_session())
+
+        self.assertEqual(6, db.reservation_expire(self.ctxt, batch_size=4))
+
+        for project_id in ('project1', 'project2', 'project3'):
+            expected = {'project_id': project_id,
+                        'volumes': {'reserved': 0, 'in_use': 0},
+                        'gigabytes': {'reserved': 0, 'in_use': 0}}
+            self.assertEqual(expected, db.quota_usage_get_all_by_project(
+                self.ctxt, project_id))
+        reservations = sqlalchemy_api.model_query(
+            self.ctxt, models.Reservation, read_deleted='no').all()
+        self.assertEqual(['unexpired'],
+                         [reservation.uuid for reservation in reservations])
+        self.assertEqual(0, db.reservation_expire(self.ctxt, batch_size=4))
+
 
 class DBAPIQuotaClassTestCase(BaseTest):
 
@@ -1079,6 +1244,65 @@ class DBAPIQuotaTestCase(BaseTest):
                           'volumes': {'reserved': 1, 'in_use': 0}},
                          quota_usage)
 
+    def test_quota_reserve_locks_requested_usages(self):
+        resources = dict((name, ReservableResource(name, '_sync_%s' % name))
+                         for name in ('volumes', 'gigabytes'))
+        quotas = {'volumes': 10, 'gigabytes': 100}
+        expire = datetime.datetime.utcnow()
+        db.quota_reserve(self.ctxt, resources, quotas,
+                         {'volumes': 1, 'gigabytes': 10}, expire, None, 0,
+                         project_id='project1')
+        session = sqlalchemy_api.get_session()
+        with session.begin():
+            usages = sqlalchemy_api._get_quota_usages(
+                self.ctxt, session, 'project1', resources=['volumes'])
+        self.assertEqual(['volumes'], usages.keys())
+
+        with mock.patch.object(sqlalchemy_api, '_get_quota_usages',
+                               wraps=sqlalchemy_api._get_quota_usages) as get:
+            db.quota_reserve(self.ctxt, resources, quotas, {'volumes': 1},
+                             expire, None, 0, project_id='project1')
+        get.assert_called_once_with(self.ctxt, mock.ANY, 'project1',
+                                    resources=['volumes'])
+
+    def test_quota_reserve_shares_sync_queries(self):
+        with mock.patch.object(
+                sqlalchemy_api, '_volume_data_get_for_project',
+                wraps=sqlalchemy_api._volume_data_get_for_project) as get:
+            _quota_reserve(self.ctxt, 'project1')
+        # volumes and gigabytes are both refreshed from the same query
+        self.assertEqual(1, get.call_count)
+
+    def test_quota_reserve_concurrent(self):
+        callers = 50
+        resources = dict((name, ReservableResource(name, '_sync_%s' % name))
+                         for name in ('volumes', 'gigabytes'))
+        quotas = {'volumes': callers, 'gigabytes': callers * 10}
+        deltas = {'volumes': 1, 'gigabytes': 10}
+        expire = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+
+        def reserve(_caller):
+            return db.quota_reserve(self.ctxt, resources, quotas, deltas,
+                                    expire, None, 0, project_id='project1')
+
+        pool = eventlet.GreenPool(callers)
+        start_time = time.time()
+        reservations = list(pool.imap(reserve, xrange(callers)))
+        elapsed = max(time.time() - start_time, 0.001)
+        self.addDetail('reserve_throughput', content.text_content(
+            '%d callers: %.1f reservations/s' % (callers, callers / elapsed)))
+
+        self.assertEqual(callers * 2, len(set(uuid
+                                              for reservation in reservations
+                                              for uuid in reservation)))
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': callers, 'in_use': 0},
+                          'gigabytes': {'reserved': callers * 10,
+                                        'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+        self.assertRaises(exception.OverQuota, reserve, callers)
+
     def test_quota_destroy(self):
         db.quota_create(self.ctxt, 'project1', 'resource1', 41)
         self.assertIsNone(db.quota_destroy(self.ctxt, 'project1',
@@ -1174,7 +1398,10 @@ class DBAPIBackupTestCase(BaseTest):
             'service_metadata': 'metadata',
             'service': 'service',
             'size': 1000,
-            'object_count': 100}
+            'object_count': 100,
+            'parent_id': 'parent',
+            'throughput': 1000,
+            'compression_ratio': 2.5}
         if one:
             return base_values
 
@@ -1245,3 +1472,153 @@ class DBAPIBackupTestCase(BaseTest):
     def test_backup_not_found(self):
         self.assertRaises(exception.BackupNotFound, db.backup_get, self.ctxt,
                           'notinbase')
+
+
+class DBAPIImageVolumeCacheTestCase(BaseTest):
+
+    """Tests for db.api.image_volume_cache_* methods."""
+
+    def _create_entries(self):
+        entries = []
+        for i, (image_id, host) in enumerate([('image1', 'host1'),
+                                              ('image2', 'host1'),
+                                              ('image1', 'host2')]):
+            entries.append(db.image_volume_cache_create(
+                self.ctxt, host, image_id, 'checksum', 'volume%d' % i, i + 1))
+        return entries
+
+    def test_image_volume_cache_create(self):
+        entry = db.image_volume_cache_create(self.ctxt, 'host1', 'image1',
+                                             'checksum', 'volume1', 10)
+        self.assertEqual('host1', entry['host'])
+        self.assertEqual('image1', entry['image_id'])
+        self.assertEqual('checksum', entry['image_checksum'])
+        self.assertEqual('volume1', entry['volume_id'])
+        self.assertEqual(10, entry['size'])
+        self.assertIsNotNone(entry['last_used'])
+
+    def test_image_volume_cache_get_and_update_last_used(self):
+        entries = self._create_entries()
+        timeutils.set_time_override(entries[0]['last_used'] +
+                                    datetime.timedelta(minutes=1))
+        self.addCleanup(timeutils.clear_time_override)
+
+        entry = db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'image1', 'host1')
+        self.assertEqual('volume0', entry['volume_id'])
+        self.assertEqual(timeutils.utcnow(), entry['last_used'])
+        self.assertIsNone(db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'image2', 'host2'))
+
+    def test_image_volume_cache_get_all_for_host(self):
+        self._create_entries()
+        timeutils.set_time_override(timeutils.utcnow() +
+                                    datetime.timedelta(minutes=1))
+        self.addCleanup(timeutils.clear_time_override)
+        db.image_volume_cache_get_and_update_last_used(self.ctxt, 'image1',
+                                                       'host1')
+
+        entries = db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')
+        self.assertEqual(['volume1', 'volume0'],
+                         [entry['volume_id'] for entry in entries])
+
+    def test_image_volume_cache_delete(self):
+        self._create_entries()
+        self.assertEqual('volume1', db.image_volume_cache_get_by_volume_id(
+            self.ctxt, 'volume1')['volume_id'])
+
+        db.image_volume_cache_delete(self.ctxt, 'volume1')
+        self.assertIsNone(db.image_volume_cache_get_by_volume_id(
+            self.ctxt, 'volume1'))
+        self.assertEqual(1, len(db.image_volume_cache_get_all_for_host(
+            self.ctxt, 'host1')))
+
+
+class DBAPIQueryPlanTestCase(BaseTest):
+    """Checks that hot queries use indexes rather than table scans."""
+
+    def _query_plans(self, func, *args, **kwargs):
+        """Run func and return the SQLite query plans of its statements."""
+        engine = sqlalchemy_api.get_engine()
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            func(*args, **kwargs)
+        finally:
+            event.remove(engine, 'before_cursor_execute',
+                         before_cursor_execute)
+
+        plans = []
+        for statement, parameters in statements:
+            # Transaction control statements have no query plan
+            if not statement.startswith('SELECT'):
+                continue
+            rows = engine.execute('EXPLAIN QUERY PLAN ' + statement,
+                                  parameters).fetchall()
+            plans.append('\n'.join(row['detail'] for row in rows))
+        return '\n'.join(plans)
+
+    def _assertUsesIndexes(self, plan, *indexes):
+        for index in indexes:
+            self.assertIn('USING INDEX %s ' % index, plan)
+
+    def _assertNoScan(self, plan, table):
+        self.assertNotRegexpMatches(plan, r'SCAN (TABLE )?%s\b' % table)
+
+    def test_volume_get_all_by_host(self):
+        plan = self._query_plans(db.volume_get_all_by_host, self.ctxt,
+                                 'host1')
+        self._assertUsesIndexes(plan, 'volumes_host_deleted_idx',
+                                'volume_metadata_volume_id_deleted_idx',
+                                'volume_admin_metadata_volume_id_deleted_idx')
+        self._assertNoScan(plan, 'volumes')
+
+    def test_volume_get_all_columns(self):
+        plan = self._query_plans(db.volume_get_all_by_project, self.ctxt,
+                                 'project1', None, 100, 'created_at', 'desc',
+                                 columns=('id', 'display_name'))
+        self._assertUsesIndexes(plan, 'volumes_project_id_deleted_idx')
+        self.assertNotIn('volume_metadata', plan)
+        self.assertNotIn('volume_types', plan)
+
+    def test_volume_data_get_for_host(self):
+        plan = self._query_plans(db.volume_data_get_for_host, self.ctxt,
+                                 'host1')
+        self._assertUsesIndexes(plan, 'volumes_host_deleted_idx')
+        self._assertNoScan(plan, 'volumes')
+
+    def test_volume_data_get_for_project(self):
+        plan = self._query_plans(db.volume_data_get_for_project, self.ctxt,
+                                 'project1')
+        self._assertUsesIndexes(plan, 'volumes_project_id_deleted_idx')
+        self._assertNoScan(plan, 'volumes')
+
+    def test_snapshot_get_all_for_volume(self):
+        plan = self._query_plans(db.snapshot_get_all_for_volume, self.ctxt,
+                                 'volume1')
+        self._assertUsesIndexes(plan, 'snapshots_volume_id_deleted_idx',
+                                'snapshot_metadata_snapshot_id_deleted_idx')
+        self._assertNoScan(plan, 'snapshots')
+
+    def test_snapshot_data_get_for_project(self):
+        plan = self._query_plans(db.snapshot_data_get_for_project,
+                                 self.ctxt, 'project1')
+        self._assertUsesIndexes(plan, 'snapshots_project_id_deleted_idx')
+        self._assertNoScan(plan, 'snapshots')
+
+    def test_backup_get_all_by_host(self):
+        plan = self._query_plans(db.backup_get_all_by_host, self.ctxt,
+                                 'host1')
+        self._assertUsesIndexes(plan, 'backups_host_deleted_idx')
+        self._assertNoScan(plan, 'backups')
+
+    def test_backup_get_all_by_project(self):
+        plan = self._query_plans(db.backup_get_all_by_project, self.ctxt,
+                                 'project1')
+        self._assertUsesIndexes(plan, 'backups_project_id_deleted_idx')
+        self._assertNoScan(plan, 'backups')
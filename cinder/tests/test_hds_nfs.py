@@ -123,6 +123,7 @@ class HDSNFSDriverTest(test.TestCase):
         self.configuration.nfs_shares_config = self.shares_file
         self.configuration.nfs_mount_point_base = '/opt/stack/cinder/mnt'
         self.configuration.nfs_mount_options = None
+        self.configuration.nfs_allocation_rescan_interval = 0
 
         self.driver = nfs.HDSNFSDriver(configuration=self.configuration)
         self.driver.do_setup("")
@@ -18,7 +18,11 @@ import shutil
 import string
 import tempfile
 
+import eventlet
+import mock
+
 from cinder.brick.iscsi import iscsi
+from cinder.openstack.common import processutils as putils
 from cinder import test
 from cinder.volume import driver
 
@@ -60,7 +64,7 @@ class TargetAdminTestCase(object):
         pass
 
     def fake_get_target(obj, iqn):
-        return 1
+        return '1'
 
     def get_script_params(self):
         return {'tid': self.tid,
@@ -123,10 +127,243 @@ class TgtAdmTestCase(test.TestCase, TargetAdminTestCase):
         self.flags(volumes_dir=self.persist_tempdir)
         self.script_template = "\n".join([
             'tgt-admin --update %(target_name)s',
-            'tgt-admin --delete %(target_name)s',
             'tgt-admin --force '
             '--delete %(target_name)s',
-            'tgtadm --lld iscsi --op show --mode target'])
+            'tgtadm --lld iscsi --op show --mode target --tid %(tid)s'])
+
+    TGT_ADMIN_SHOW = """Target 1: iqn.2011-09.org.foo.bar:volume-exported
+    System information:
+        Driver: iscsi
+        State: ready
+    LUN information:
+        LUN: 0
+            Type: controller
+        LUN: 1
+            Type: disk
+            Backing store path: /dev/vg/volume-exported
+Target 2: iqn.2011-09.org.foo.bar:volume-nolun
+    LUN information:
+        LUN: 0
+            Type: controller
+Target 3: iqn.2011-09.org.foo.bar:volume-nofile
+    LUN information:
+        LUN: 0
+            Type: controller
+        LUN: 1
+            Type: disk
+"""
+
+    def _get_show_target_helper(self):
+        target_helper = self.driver.get_target_helper(self.db)
+        target_helper.set_execute(
+            lambda *cmd, **kwargs: (self.TGT_ADMIN_SHOW, ''))
+        return target_helper
+
+    def test_get_targets(self):
+        target_helper = self._get_show_target_helper()
+        self.assertEqual(
+            {'iqn.2011-09.org.foo.bar:volume-exported':
+                {'tid': '1', 'luns': [0, 1]},
+             'iqn.2011-09.org.foo.bar:volume-nolun':
+                {'tid': '2', 'luns': [0]},
+             'iqn.2011-09.org.foo.bar:volume-nofile':
+                {'tid': '3', 'luns': [0, 1]}},
+            target_helper._get_targets())
+
+    def test_remove_iscsi_target_silent_failure(self):
+        target_helper = self.driver.get_target_helper(self.db)
+
+        def fake_execute(*cmd, **kwargs):
+            self.cmds.append(string.join(cmd))
+            if cmd[0] == 'tgtadm':
+                return 'Target 1: %s' % self.target_name, ''
+            return '', ''
+
+        target_helper.set_execute(fake_execute)
+        open(os.path.join(self.persist_tempdir, self.vol_name), 'w').close()
+        target_helper.remove_iscsi_target(self.tid, self.lun, self.vol_id,
+                                          self.vol_name)
+        self.verify_cmds(['tgt-admin --force --delete %s' % self.target_name,
+                          'tgtadm --lld iscsi --op show --mode target '
+                          '--tid 1',
+                          'tgt-admin --delete %s' % self.target_name])
+
+    def test_inventory(self):
+        self.stubs.UnsetAll()
+        target_helper = self._get_show_target_helper()
+        with mock.patch.object(target_helper, '_execute',
+                               wraps=target_helper._execute) as execute:
+            self.assertEqual(
+                '1',
+                target_helper._get_target(
+                    'iqn.2011-09.org.foo.bar:volume-exported'))
+            self.assertTrue(target_helper._verify_backing_lun(
+                'iqn.2011-09.org.foo.bar:volume-exported', '1'))
+            self.assertFalse(target_helper._verify_backing_lun(
+                'iqn.2011-09.org.foo.bar:volume-nolun', '2'))
+            target_helper.show_target(
+                1, iqn='iqn.2011-09.org.foo.bar:volume-nofile')
+        self.assertEqual(1, execute.call_count)
+
+    def _create_on_loaded_inventory(self, new_tid):
+        self.stubs.UnsetAll()
+        target_helper = self.driver.get_target_helper(self.db)
+        new_target = """Target %s: %s
+    LUN information:
+        LUN: 0
+            Type: controller
+        LUN: 1
+            Type: disk
+""" % (new_tid, self.target_name)
+
+        created = []
+
+        def fake_execute(*cmd, **kwargs):
+            self.cmds.append(string.join(cmd))
+            if cmd[:2] == ('tgt-admin', '--update'):
+                created.append(new_target)
+            elif cmd[:2] == ('tgt-admin', '--show'):
+                return self.TGT_ADMIN_SHOW + ''.join(created), ''
+            elif cmd[0] == 'tgtadm' and cmd[-1] == new_tid:
+                return ''.join(created), ''
+            return '', ''
+
+        target_helper.set_execute(fake_execute)
+        target_helper.inventory.refresh()
+        self.clear_cmds()
+        self.assertEqual(new_tid, target_helper.create_iscsi_target(
+            self.target_name, self.tid, self.lun, self.path))
+        self.assertEqual({'tid': new_tid, 'luns': [0, 1]},
+                         target_helper.inventory.cached()[self.target_name])
+
+    def test_create_iscsi_target_on_loaded_inventory(self):
+        self._create_on_loaded_inventory('4')
+        self.verify_cmds(['tgt-admin --update %s' % self.target_name,
+                          'tgtadm --lld iscsi --op show --mode target '
+                          '--tid 4'])
+
+    def test_create_iscsi_target_reusing_tid(self):
+        # The new target didn't get the tid after the highest one, so the
+        # targets are listed again.
+        self._create_on_loaded_inventory('5')
+        self.verify_cmds(['tgt-admin --update %s' % self.target_name,
+                          'tgtadm --lld iscsi --op show --mode target '
+                          '--tid 4',
+                          'tgt-admin --show'])
+
+    def test_ensure_exports(self):
+        target_helper = self._get_show_target_helper()
+        open(os.path.join(self.persist_tempdir, 'volume-exported'),
+             'w').close()
+        exports = []
+        for name in ('exported', 'nolun', 'nofile', 'missing'):
+            volume = {'id': name,
+                      'name': 'volume-%s' % name,
+                      'provider_location': None}
+            exports.append((volume,
+                            'iqn.2011-09.org.foo.bar:volume-%s' % name,
+                            '/dev/vg/volume-%s' % name))
+
+        with mock.patch.object(target_helper, 'ensure_export',
+                               side_effect=[None, None, Exception()]) as ex:
+            failures = target_helper.ensure_exports(None, exports, 'vg',
+                                                    None)
+        self.assertEqual(['nolun', 'nofile', 'missing'],
+                         [call[0][1]['id'] for call in ex.call_args_list])
+        self.assertEqual(['missing'], failures.keys())
+
+
+class TargetInventoryTestCase(test.TestCase):
+
+    def setUp(self):
+        super(TargetInventoryTestCase, self).setUp()
+        self.list_targets = mock.Mock(return_value={'iqn1': {'tid': '1'}})
+        self.inventory = iscsi.TargetInventory(self.list_targets)
+
+    def test_get_lists_targets_once(self):
+        self.assertEqual({'tid': '1'}, self.inventory.get('iqn1'))
+        self.assertEqual({'tid': '1'}, self.inventory.get('iqn1'))
+        self.assertEqual(1, self.list_targets.call_count)
+
+    def test_get_missing_lists_targets_again(self):
+        self.assertIsNone(self.inventory.get('iqn2'))
+        self.list_targets.return_value = {'iqn2': {'tid': '2'}}
+        self.assertEqual({'tid': '2'}, self.inventory.get('iqn2'))
+        self.assertEqual(2, self.list_targets.call_count)
+
+    def test_add_and_remove(self):
+        self.inventory.get('iqn1')
+        self.inventory.add('iqn2', {'tid': '2'})
+        self.inventory.remove('iqn1')
+        self.list_targets.return_value = {}
+        self.assertEqual({'tid': '2'}, self.inventory.get('iqn2'))
+        self.assertEqual(1, self.list_targets.call_count)
+        self.assertIsNone(self.inventory.get('iqn1'))
+
+    def test_invalidate(self):
+        self.inventory.get('iqn1')
+        self.inventory.invalidate()
+        self.inventory.get('iqn1')
+        self.assertEqual(2, self.list_targets.call_count)
+
+    def test_refresh_racing_with_add(self):
+        def list_targets():
+            self.inventory.add('iqn2', {'tid': '2'})
+            return {'iqn1': {'tid': '1'}}
+
+        self.list_targets.side_effect = list_targets
+        self.assertEqual({'tid': '1'}, self.inventory.get('iqn1'))
+        self.assertEqual({'tid': '2'}, self.inventory.get('iqn2'))
+        self.assertEqual(1, self.list_targets.call_count)
+
+    def test_refresh_racing_with_remove(self):
+        def list_targets():
+            self.inventory.remove('iqn1')
+            return {'iqn1': {'tid': '1'}, 'iqn2': {'tid': '2'}}
+
+        self.list_targets.side_effect = list_targets
+        self.assertEqual({'tid': '2'}, self.inventory.get('iqn2'))
+        self.assertEqual({'iqn2': {'tid': '2'}}, self.inventory.cached())
+        self.assertEqual(1, self.list_targets.call_count)
+
+    def test_refresh_racing_with_invalidate(self):
+        def list_targets():
+            self.inventory.invalidate()
+            return {'iqn1': {'tid': '1'}}
+
+        self.list_targets.side_effect = list_targets
+        self.assertEqual({'tid': '1'}, self.inventory.get('iqn1'))
+        self.assertIsNone(self.inventory.cached())
+
+    def test_concurrent_lookups_share_one_refresh(self):
+        def list_targets():
+            eventlet.sleep(0)
+            return {'iqn1': {'tid': '1'}}
+
+        self.list_targets.side_effect = list_targets
+        threads = [eventlet.spawn(self.inventory.get, 'iqn1')
+                   for i in range(3)]
+        self.assertEqual([{'tid': '1'}] * 3,
+                         [thread.wait() for thread in threads])
+        self.assertEqual(1, self.list_targets.call_count)
+
+    def test_failed_refresh_wakes_waiters(self):
+        def list_targets():
+            eventlet.sleep(0)
+            raise putils.ProcessExecutionError()
+
+        def get():
+            try:
+                self.inventory.get('iqn1')
+            except putils.ProcessExecutionError:
+                return 'failed'
+
+        self.list_targets.side_effect = list_targets
+        threads = [eventlet.spawn(get) for i in range(2)]
+        self.assertEqual(['failed'] * 2,
+                         [thread.wait() for thread in threads])
+        self.assertEqual(1, self.list_targets.call_count)
+        self.assertIsNone(self.inventory.cached())
 
 
 class IetAdmTestCase(test.TestCase, TargetAdminTestCase):
@@ -1126,3 +1126,131 @@ class TestMigrations(test.TestCase):
             self.assertNotIn('replication_status', volumes.c)
             self.assertNotIn('replication_extended_status', volumes.c)
             self.assertNotIn('replication_driver_data', volumes.c)
+
+    def test_migration_027(self):
+        """Test adding parent_id column to backups table."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.db_initial_version())
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 26)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 27)
+
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertIsInstance(backups.c.parent_id.type,
+                                  sqlalchemy.types.VARCHAR)
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 26)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertNotIn('parent_id', backups.c)
+
+    def test_migration_028(self):
+        """Test adding throughput and compression_ratio to backups."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.db_initial_version())
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 27)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 28)
+
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertIsInstance(backups.c.throughput.type,
+                                  sqlalchemy.types.BIGINT)
+            self.assertIsInstance(backups.c.compression_ratio.type,
+                                  sqlalchemy.types.FLOAT)
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 27)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertNotIn('throughput', backups.c)
+            self.assertNotIn('compression_ratio', backups.c)
+
+    def test_migration_029(self):
+        """Test adding indexes for the volume, snapshot and backup queries."""
+        indexes = [('volumes', 'volumes_host_deleted_idx'),
+                   ('volumes', 'volumes_project_id_deleted_idx'),
+                   ('snapshots', 'snapshots_volume_id_deleted_idx'),
+                   ('backups', 'backups_volume_id_deleted_idx'),
+                   ('volume_metadata',
+                    'volume_metadata_volume_id_deleted_idx'),
+                   ('snapshot_metadata',
+                    'snapshot_metadata_snapshot_id_deleted_idx')]
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.db_initial_version())
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 28)
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 29)
+
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+            for table_name, index_name in indexes:
+                table = sqlalchemy.Table(table_name, metadata, autoload=True)
+                self.assertIn(index_name,
+                              [idx.name for idx in table.indexes])
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 28)
+
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+            for table_name, index_name in indexes:
+                table = sqlalchemy.Table(table_name, metadata, autoload=True)
+                self.assertNotIn(index_name,
+                                 [idx.name for idx in table.indexes])
+
+    def test_migration_030(self):
+        """Test adding image_volume_cache_entries table."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.db_initial_version())
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 29)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 30)
+
+            self.assertTrue(engine.dialect.has_table(
+                engine.connect(), "image_volume_cache_entries"))
+            cache = sqlalchemy.Table('image_volume_cache_entries',
+                                     metadata,
+                                     autoload=True)
+            self.assertIsInstance(cache.c.id.type,
+                                  sqlalchemy.types.INTEGER)
+            self.assertIsInstance(cache.c.host.type,
+                                  sqlalchemy.types.VARCHAR)
+            self.assertIsInstance(cache.c.image_id.type,
+                                  sqlalchemy.types.VARCHAR)
+            self.assertIsInstance(cache.c.image_checksum.type,
+                                  sqlalchemy.types.VARCHAR)
+            self.assertIsInstance(cache.c.volume_id.type,
+                                  sqlalchemy.types.VARCHAR)
+            self.assertIsInstance(cache.c.size.type,
+                                  sqlalchemy.types.INTEGER)
+            self.assertIsInstance(cache.c.last_used.type,
+                                  self.time_type[engine.name])
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 29)
+
+            self.assertFalse(engine.dialect.has_table(
+                engine.connect(), "image_volume_cache_entries"))
@@ -46,6 +46,7 @@ def create_configuration():
     configuration.append_config_values(mox.IgnoreArg())
     configuration.nfs_mount_point_base = '/mnt/test'
     configuration.nfs_mount_options = None
+    configuration.nfs_allocation_rescan_interval = 0
     return configuration
 
 
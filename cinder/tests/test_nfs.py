@@ -18,6 +18,8 @@
 import errno
 import os
 
+import eventlet
+import fixtures
 import mock
 import mox as mox_lib
 from mox import IgnoreArg
@@ -109,6 +111,117 @@ class RemoteFsDriverTestCase(test.TestCase):
         mox.VerifyAll()
 
 
+class AllocationLedgerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(AllocationLedgerTestCase, self).setUp()
+        self.scan = mock.Mock(return_value={'volume-1': 1024})
+        self.ledger = remotefs.AllocationLedger(self.scan)
+
+    def test_allocated_walks_once(self):
+        self.assertEqual(1024, self.ledger.allocated('share'))
+        self.assertEqual(1024, self.ledger.allocated('share'))
+        self.scan.assert_called_once_with('share')
+        self.assertIn('share', self.ledger)
+
+    def test_record_and_forget(self):
+        self.ledger.allocated('share')
+        self.ledger.record('share', 'volume-2', 2048)
+        self.ledger.record('share', 'volume-1', 4096)
+        self.assertEqual(6144, self.ledger.allocated('share'))
+        self.ledger.forget('share', 'volume-1')
+        self.ledger.forget('share', 'volume-3')
+        self.assertEqual(2048, self.ledger.allocated('share'))
+        self.assertEqual(1, self.scan.call_count)
+
+    def test_record_unknown_share(self):
+        self.ledger.record('share', 'volume-2', 2048)
+        self.assertNotIn('share', self.ledger)
+        self.assertEqual(1024, self.ledger.allocated('share'))
+
+    def test_invalidate(self):
+        self.ledger.allocated('share')
+        self.ledger.allocated('other-share')
+        self.ledger.invalidate('share')
+        self.assertNotIn('share', self.ledger)
+        self.assertIn('other-share', self.ledger)
+        self.ledger.invalidate()
+        self.assertNotIn('other-share', self.ledger)
+        self.assertEqual(1024, self.ledger.allocated('share'))
+        self.assertEqual(3, self.scan.call_count)
+
+    @mock.patch('time.time')
+    def test_max_age(self, mock_time):
+        self.ledger.max_age = 60
+        mock_time.return_value = 100
+        self.ledger.allocated('share')
+        mock_time.return_value = 159
+        self.ledger.allocated('share')
+        self.assertEqual(1, self.scan.call_count)
+        mock_time.return_value = 160
+        self.ledger.allocated('share')
+        self.assertEqual(2, self.scan.call_count)
+
+    def test_walk_racing_with_change(self):
+        def _scan(share):
+            self.ledger.record(share, 'volume-2', 2048)
+            return {'volume-1': 1024}
+
+        self.scan.side_effect = _scan
+        self.assertEqual(3072, self.ledger.allocated('share'))
+        self.assertIn('share', self.ledger)
+        self.ledger.forget('share', 'volume-2')
+        self.assertEqual(1024, self.ledger.allocated('share'))
+        self.scan.assert_called_once_with('share')
+
+    def test_walk_racing_with_forget(self):
+        def _scan(share):
+            self.ledger.forget(share, 'volume-1')
+            return {'volume-1': 1024, 'volume-2': 2048}
+
+        self.scan.side_effect = _scan
+        self.assertEqual(2048, self.ledger.allocated('share'))
+        self.assertIn('share', self.ledger)
+
+    def test_walk_racing_with_invalidate(self):
+        def _scan(share):
+            self.ledger.invalidate(share)
+            return {'volume-1': 1024}
+
+        self.scan.side_effect = _scan
+        self.assertEqual(1024, self.ledger.allocated('share'))
+        self.assertNotIn('share', self.ledger)
+
+    def test_concurrent_lookups_share_one_walk(self):
+        def _scan(share):
+            eventlet.sleep(0)
+            return {'volume-1': 1024}
+
+        self.scan.side_effect = _scan
+        threads = [eventlet.spawn(self.ledger.allocated, 'share')
+                   for i in range(3)]
+        self.assertEqual([1024] * 3, [thread.wait() for thread in threads])
+        self.scan.assert_called_once_with('share')
+
+    def test_failed_walk_wakes_waiters(self):
+        def _scan(share):
+            eventlet.sleep(0)
+            raise OSError(errno.EIO, 'I/O error')
+
+        def _allocated():
+            try:
+                self.ledger.allocated('share')
+            except OSError as exc:
+                return exc.errno
+
+        self.scan.side_effect = _scan
+        threads = [eventlet.spawn(_allocated) for i in range(2)]
+        self.assertEqual([errno.EIO] * 2,
+                         [thread.wait() for thread in threads])
+        self.scan.assert_called_once_with('share')
+        self.assertNotIn('share', self.ledger)
+
+
 class NfsDriverTestCase(test.TestCase):
     """Test case for NFS driver."""
 
@@ -136,6 +249,7 @@ class NfsDriverTestCase(test.TestCase):
         self.configuration.nfs_oversub_ratio = 1.0
         self.configuration.nfs_mount_point_base = self.TEST_MNT_POINT_BASE
         self.configuration.nfs_mount_options = None
+        self.configuration.nfs_allocation_rescan_interval = 0
         self.configuration.volume_dd_blocksize = '1M'
         self._driver = nfs.NfsDriver(configuration=self.configuration)
         self._driver.shares = {}
@@ -211,8 +325,7 @@ class NfsDriverTestCase(test.TestCase):
         stat_avail = 2129984
         stat_output = '1 %d %d' % (stat_total_size, stat_avail)
 
-        du_used = 490560
-        du_output = '%d /mnt' % du_used
+        allocated = 490560
 
         mox.StubOutWithMock(drv, '_get_mount_point_for_share')
         drv._get_mount_point_for_share(self.TEST_NFS_EXPORT1).\
@@ -223,14 +336,13 @@ class NfsDriverTestCase(test.TestCase):
                      self.TEST_MNT_POINT,
                      run_as_root=True).AndReturn((stat_output, None))
 
-        drv._execute('du', '-sb', '--apparent-size',
-                     '--exclude', '*snapshot*',
-                     self.TEST_MNT_POINT,
-                     run_as_root=True).AndReturn((du_output, None))
+        mox.StubOutWithMock(drv._allocation_ledger, 'allocated')
+        drv._allocation_ledger.allocated(self.TEST_NFS_EXPORT1).\
+            AndReturn(allocated)
 
         mox.ReplayAll()
 
-        self.assertEqual((stat_total_size, stat_avail, du_used),
+        self.assertEqual((stat_total_size, stat_avail, allocated),
                          drv._get_capacity_info(self.TEST_NFS_EXPORT1))
 
         mox.VerifyAll()
@@ -244,8 +356,7 @@ class NfsDriverTestCase(test.TestCase):
         stat_avail = 2129984
         stat_output = '1 %d %d' % (stat_total_size, stat_avail)
 
-        du_used = 490560
-        du_output = '%d /mnt' % du_used
+        allocated = 490560
 
         mox.StubOutWithMock(drv, '_get_mount_point_for_share')
         drv._get_mount_point_for_share(self.TEST_NFS_EXPORT_SPACES).\
@@ -256,18 +367,79 @@ class NfsDriverTestCase(test.TestCase):
                      self.TEST_MNT_POINT_SPACES,
                      run_as_root=True).AndReturn((stat_output, None))
 
-        drv._execute('du', '-sb', '--apparent-size',
-                     '--exclude', '*snapshot*',
-                     self.TEST_MNT_POINT_SPACES,
-                     run_as_root=True).AndReturn((du_output, None))
+        mox.StubOutWithMock(drv._allocation_ledger, 'allocated')
+        drv._allocation_ledger.allocated(self.TEST_NFS_EXPORT_SPACES).\
+            AndReturn(allocated)
 
         mox.ReplayAll()
 
-        self.assertEqual((stat_total_size, stat_avail, du_used),
+        self.assertEqual((stat_total_size, stat_avail, allocated),
                          drv._get_capacity_info(self.TEST_NFS_EXPORT_SPACES))
 
         mox.VerifyAll()
 
+    def test_scan_share_allocations(self):
+        drv = self._driver
+        mount_point = self.useFixture(fixtures.TempDir()).path
+
+        def _create_file(path, size):
+            with open(os.path.join(mount_point, path), 'w') as f:
+                f.truncate(size)
+
+        os.mkdir(os.path.join(mount_point, 'dir'))
+        os.mkdir(os.path.join(mount_point, 'snapshots'))
+        _create_file('volume-1', 1024)
+        _create_file('volume-1.snapshot-1', 512)
+        _create_file(os.path.join('dir', 'volume-2'), 2048)
+        _create_file(os.path.join('snapshots', 'volume-3'), 4096)
+
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               return_value=mount_point):
+            self.assertEqual({'volume-1': 1024,
+                              os.path.join('dir', 'volume-2'): 2048},
+                             drv._scan_share_allocations(
+                                 self.TEST_NFS_EXPORT1))
+
+    def test_scan_share_allocations_off_the_hub(self):
+        drv = self._driver
+        mount_point = self.useFixture(fixtures.TempDir()).path
+        get_ident = eventlet.patcher.original('thread').get_ident
+        walk = os.walk
+        walk_threads = []
+
+        def _walk(*args, **kwargs):
+            walk_threads.append(get_ident())
+            return walk(*args, **kwargs)
+
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               return_value=mount_point):
+            with mock.patch('os.walk', side_effect=_walk):
+                self.assertEqual({}, drv._scan_share_allocations(
+                    self.TEST_NFS_EXPORT1))
+        self.assertEqual(1, len(walk_threads))
+        self.assertNotEqual(get_ident(), walk_threads[0])
+
+    @mock.patch('os.walk')
+    def test_scan_share_allocations_unreadable(self, mock_walk):
+        drv = self._driver
+
+        def _walk(top, onerror=None):
+            onerror(OSError(errno.EACCES, 'Permission denied', top))
+            return []
+
+        mock_walk.side_effect = _walk
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               return_value=self.TEST_MNT_POINT):
+            with mock.patch.object(drv, '_execute',
+                                   return_value=('490560 /mnt', '')) as \
+                    mock_execute:
+                self.assertEqual({None: 490560},
+                                 drv._scan_share_allocations(
+                                     self.TEST_NFS_EXPORT1))
+        mock_execute.assert_called_once_with(
+            'du', '-sb', '--apparent-size', '--exclude', '*snapshot*',
+            self.TEST_MNT_POINT, run_as_root=True)
+
     def test_load_shares_config(self):
         mox = self._mox
         drv = self._driver
@@ -564,6 +736,55 @@ class NfsDriverTestCase(test.TestCase):
 
         mox.VerifyAll()
 
+    def _walked_ledger(self, volume):
+        drv = self._driver
+        drv._allocation_ledger = remotefs.AllocationLedger(
+            mock.Mock(return_value={'volume-1': units.Gi}))
+        drv._allocation_ledger.allocated(volume['provider_location'])
+        return drv._allocation_ledger
+
+    def test_create_volume_records_allocation(self):
+        drv = self._driver
+        volume = {'name': 'volume-123', 'size': self.TEST_SIZE_IN_GB}
+        ledger = self._walked_ledger(
+            {'provider_location': self.TEST_NFS_EXPORT1})
+
+        with mock.patch.object(drv, '_ensure_shares_mounted'):
+            with mock.patch.object(drv, '_find_share',
+                                   return_value=self.TEST_NFS_EXPORT1):
+                with mock.patch.object(drv, '_do_create_volume'):
+                    drv.create_volume(volume)
+
+        self.assertEqual((1 + self.TEST_SIZE_IN_GB) * units.Gi,
+                         ledger.allocated(self.TEST_NFS_EXPORT1))
+
+    def test_create_volume_failure_invalidates_allocation(self):
+        drv = self._driver
+        volume = {'name': 'volume-123', 'size': self.TEST_SIZE_IN_GB}
+        ledger = self._walked_ledger(
+            {'provider_location': self.TEST_NFS_EXPORT1})
+
+        with mock.patch.object(drv, '_ensure_shares_mounted'):
+            with mock.patch.object(drv, '_find_share',
+                                   return_value=self.TEST_NFS_EXPORT1):
+                with mock.patch.object(drv, '_do_create_volume',
+                                       side_effect=OSError()):
+                    self.assertRaises(OSError, drv.create_volume, volume)
+
+        self.assertNotIn(self.TEST_NFS_EXPORT1, ledger)
+
+    def test_delete_volume_forgets_allocation(self):
+        drv = self._driver
+        volume = {'name': 'volume-1',
+                  'provider_location': self.TEST_NFS_EXPORT1}
+        ledger = self._walked_ledger(volume)
+
+        with mock.patch.object(drv, '_ensure_share_mounted'):
+            with mock.patch.object(drv, '_delete'):
+                drv.delete_volume(volume)
+
+        self.assertEqual(0, ledger.allocated(self.TEST_NFS_EXPORT1))
+
     def test_delete_should_ensure_share_mounted(self):
         """delete_volume should ensure that corresponding share is mounted."""
         mox = self._mox
@@ -703,6 +924,22 @@ class NfsDriverTestCase(test.TestCase):
 
                         resize.assert_called_once_with(path, newSize)
 
+    def test_extend_volume_records_allocation(self):
+        drv = self._driver
+        volume = {'id': '80ee16b6-75d2-4d54-9539-ffc1b4b0fb10', 'size': 1,
+                  'name': 'volume-1', 'provider_location': 'nfs_share'}
+        ledger = self._walked_ledger(volume)
+
+        with mock.patch.object(image_utils, 'resize_image'):
+            with mock.patch.object(drv, 'local_path', return_value='path'):
+                with mock.patch.object(drv, '_is_share_eligible',
+                                       return_value=True):
+                    with mock.patch.object(drv, '_is_file_size_equal',
+                                           return_value=True):
+                        drv.extend_volume(volume, 3)
+
+        self.assertEqual(3 * units.Gi, ledger.allocated('nfs_share'))
+
     def test_extend_volume_failure(self):
         """Error during extend operation."""
         drv = self._driver
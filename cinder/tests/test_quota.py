@@ -1197,6 +1197,87 @@ class DbQuotaDriverTestCase(test.TestCase):
         self.assertEqual(self.calls, [('quota_destroy_all_by_project',
                                       ('test_project')), ])
 
+    def test_expire(self):
+        self.flags(reservation_expire_batch_size=100)
+        with mock.patch.object(sqa_api, 'reservation_expire',
+                               return_value=3) as reservation_expire:
+            self.assertEqual(3, self.driver.expire('context'))
+        reservation_expire.assert_called_once_with('context', batch_size=100)
+
+    def test_get_class_quotas_cached_per_request(self):
+        self._stub_quota_class_get_all_by_name()
+        self._stub_volume_type_get_all()
+        ctxt = FakeContext('test_project', 'test_class')
+        for i in range(3):
+            self.driver.get_class_quotas(ctxt, quota.QUOTAS.resources,
+                                         'test_class', defaults=False)
+        self.assertEqual(['quota_class_get_all_by_name'], self.calls)
+
+        self.driver.get_class_quotas(FakeContext('test_project', None),
+                                     quota.QUOTAS.resources,
+                                     'test_class', defaults=False)
+        self.assertEqual(['quota_class_get_all_by_name'] * 2, self.calls)
+
+    def test_destroy_all_by_project_invalidates_limits(self):
+        self.stubs.Set(db, 'quota_destroy_all_by_project',
+                       lambda context, project_id: None)
+        with mock.patch.object(quota.LIMIT_CACHE,
+                               'invalidate') as invalidate:
+            self.driver.destroy_all_by_project(None, 'test_project')
+        invalidate.assert_called_once_with()
+
+
+class QuotaLimitCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(QuotaLimitCacheTestCase, self).setUp()
+        self.cache = quota.QuotaLimitCache()
+        self.load = mock.Mock(side_effect=lambda: {'volumes': 10})
+
+        patcher = mock.patch('time.time', return_value=1000)
+        self.mock_time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_request_scoped(self):
+        ctxt = FakeContext('test_project', None)
+        self.assertEqual({'volumes': 10},
+                         self.cache.get(ctxt, ('project', 'a'), self.load))
+        self.assertEqual({'volumes': 10},
+                         self.cache.get(ctxt, ('project', 'a'), self.load))
+        self.assertEqual(1, self.load.call_count)
+
+        # Without a TTL nothing is shared between requests.
+        self.cache.get(FakeContext('test_project', None), ('project', 'a'),
+                       self.load)
+        self.assertEqual(2, self.load.call_count)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(2, self.cache.misses)
+
+    def test_get_without_context(self):
+        self.cache.get(None, ('default',), self.load)
+        self.cache.get(None, ('default',), self.load)
+        self.assertEqual(2, self.load.call_count)
+
+    def test_get_ttl(self):
+        self.flags(quota_limit_cache_ttl=30)
+        self.cache.get(FakeContext('p1', None), ('default',), self.load)
+        self.cache.get(FakeContext('p2', None), ('default',), self.load)
+        self.assertEqual(1, self.load.call_count)
+
+        self.mock_time.return_value = 1030
+        self.cache.get(FakeContext('p3', None), ('default',), self.load)
+        self.assertEqual(2, self.load.call_count)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(2, self.cache.misses)
+
+    def test_invalidate(self):
+        self.flags(quota_limit_cache_ttl=30)
+        ctxt = FakeContext('test_project', None)
+        self.cache.get(ctxt, ('default',), self.load)
+        self.cache.invalidate()
+        self.cache.get(ctxt, ('default',), self.load)
+        self.cache.get(FakeContext('p2', None), ('default',), self.load)
+        self.assertEqual(2, self.load.call_count)
+
 
 class FakeSession(object):
     def begin(self):
@@ -1226,7 +1307,8 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
         def make_sync(res_name):
             def fake_sync(context, project_id, volume_type_id=None,
-                          volume_type_name=None, session=None):
+                          volume_type_name=None, session=None,
+                          sync_data=None):
                 self.sync_called.add(res_name)
                 if res_name in self.usages:
                     if self.usages[res_name].in_use < 0:
@@ -1253,7 +1335,8 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         def fake_get_session():
             return FakeSession()
 
-        def fake_get_quota_usages(context, session, project_id):
+        def fake_get_quota_usages(context, session, project_id,
+                                  resources=None):
             return self.usages.copy()
 
         def fake_quota_usage_create(context, project_id, resource, in_use,
@@ -19,6 +19,7 @@
 import math
 import os
 import tempfile
+import time
 
 import mock
 
@@ -30,6 +31,7 @@ from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
 from cinder.openstack.common import units
 from cinder import test
+from cinder.tests import fake_rados
 from cinder.tests.image import fake as fake_image
 from cinder.tests.test_volume import DriverTestCase
 from cinder.volume import configuration as conf
@@ -144,6 +146,7 @@ class RBDTestCase(test.TestCase):
         self.cfg.rbd_user = None
         self.cfg.volume_dd_blocksize = '1M'
         self.cfg.rbd_store_chunk_size = 4
+        self.cfg.rados_connection_pool_size = 4
 
         mock_exec = mock.Mock()
         mock_exec.return_value = ('', '')
@@ -818,6 +821,128 @@ class RBDTestCase(test.TestCase):
         self.mock_rados.Rados.shutdown.assert_called_once()
 
 
+class RADOSConnectionPoolTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RADOSConnectionPoolTestCase, self).setUp()
+        fake_rados.reset()
+        self.addCleanup(fake_rados.reset)
+        patcher = mock.patch.dict(driver._rados_connection_pools)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.cfg = mock.Mock(spec=conf.Configuration)
+        self.cfg.rbd_pool = 'rbd'
+        self.cfg.rbd_ceph_conf = '/etc/ceph/ceph.conf'
+        self.cfg.rbd_user = 'cinder'
+        self.cfg.rados_connect_timeout = -1
+        self.cfg.rados_connection_pool_size = 2
+        self.driver = driver.RBDDriver(configuration=self.cfg,
+                                       rados=fake_rados, rbd=mock.Mock())
+
+    def _build_pool(self, max_size=2):
+        return driver.RADOSConnectionPool(
+            fake_rados, lambda: self.driver._open_rados_connection('rbd'),
+            max_size)
+
+    def test_get_reuses_connection(self):
+        pool = self._build_pool()
+        client, ioctx = pool.get()
+        pool.put(client, ioctx)
+
+        self.assertEqual((client, ioctx), pool.get())
+        self.assertEqual([client], fake_rados.CLIENTS)
+        self.assertEqual('cinder', client.rados_id)
+        self.assertEqual('/etc/ceph/ceph.conf', client.conffile)
+        self.assertEqual('rbd', ioctx.name)
+
+    def test_put_over_max_size(self):
+        pool = self._build_pool(max_size=1)
+        connections = [pool.get(), pool.get()]
+        for client, ioctx in connections:
+            pool.put(client, ioctx)
+
+        self.assertEqual('connected', connections[0][0].state)
+        self.assertEqual('shutdown', connections[1][0].state)
+        self.assertTrue(connections[1][1].closed)
+
+    def test_pooling_disabled(self):
+        pool = self._build_pool(max_size=0)
+        client, ioctx = pool.get()
+        pool.put(client, ioctx)
+
+        self.assertEqual('shutdown', client.state)
+        pool.get()
+        self.assertEqual(2, len(fake_rados.CLIENTS))
+
+    def test_reconnect_after_failure(self):
+        pool = self._build_pool()
+        client, ioctx = pool.get()
+        client.broken = True
+        pool.put(client, ioctx, failed=True)
+
+        new_client, new_ioctx = pool.get()
+        self.assertIsNot(client, new_client)
+        self.assertEqual('shutdown', client.state)
+
+    def test_keep_healthy_after_failure(self):
+        pool = self._build_pool()
+        client, ioctx = pool.get()
+        pool.put(client, ioctx, failed=True)
+
+        self.assertEqual((client, ioctx), pool.get())
+
+    def test_health_check_when_idle(self):
+        pool = self._build_pool()
+        client, ioctx = pool.get()
+        pool.put(client, ioctx)
+        client.broken = True
+
+        # Recently used clients are not checked.
+        self.assertEqual((client, ioctx), pool.get())
+        pool.put(client, ioctx)
+        with mock.patch.object(driver, 'time') as mock_time:
+            mock_time.time.return_value = (
+                time.time() + pool.HEALTH_CHECK_INTERVAL)
+            self.assertIsNot(client, pool.get()[0])
+
+    def test_close(self):
+        pool = self._build_pool()
+        client, ioctx = pool.get()
+        pool.put(client, ioctx)
+        pool.close()
+
+        self.assertEqual('shutdown', client.state)
+        self.assertIsNot(client, pool.get()[0])
+
+    def test_get_rados_connection_pool(self):
+        pool = self.driver._get_rados_connection_pool()
+        self.assertIs(pool, self.driver._get_rados_connection_pool('rbd'))
+        self.assertIsNot(pool,
+                         self.driver._get_rados_connection_pool('other'))
+        self.assertEqual(2, pool.max_size)
+
+    def test_radosclient_shares_connections(self):
+        with driver.RADOSClient(self.driver) as client:
+            pass
+        with driver.RADOSClient(self.driver, 'rbd') as other_client:
+            self.assertIs(client.cluster, other_client.cluster)
+        with driver.RADOSClient(self.driver, 'other') as other_client:
+            self.assertEqual('other', other_client.ioctx.name)
+        self.assertEqual(2, len(fake_rados.CLIENTS))
+
+    def test_radosclient_failure(self):
+        def use_client():
+            with driver.RADOSClient(self.driver) as client:
+                client.cluster.broken = True
+                raise fake_rados.Error()
+
+        self.assertRaises(fake_rados.Error, use_client)
+        with driver.RADOSClient(self.driver) as client:
+            self.assertFalse(client.cluster.broken)
+        self.assertEqual(2, len(fake_rados.CLIENTS))
+
+
 class RBDImageIOWrapperTestCase(test.TestCase):
     def setUp(self):
         super(RBDImageIOWrapperTestCase, self).setUp()
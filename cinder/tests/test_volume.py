@@ -39,6 +39,7 @@ from cinder.brick.local_dev import lvm as brick_lvm
 from cinder import context
 from cinder import db
 from cinder import exception
+from cinder.image import cache as image_cache
 from cinder.image import image_utils
 from cinder import keymgr
 from cinder.openstack.common import fileutils
@@ -62,6 +63,7 @@ import cinder.volume
 from cinder.volume import configuration as conf
 from cinder.volume import driver
 from cinder.volume.drivers import lvm
+from cinder.volume.flows.api import create_volume
 from cinder.volume.manager import VolumeManager
 from cinder.volume import rpcapi as volume_rpcapi
 from cinder.volume import utils as volutils
@@ -291,6 +293,48 @@ class VolumeTestCase(BaseVolumeTestCase):
         self.volume.delete_volume(self.context, vol3['id'])
         self.volume.delete_volume(self.context, vol4['id'])
 
+    def test_init_host_export_failure(self):
+        """init_host sets the volumes which fail to be exported to error."""
+        vol0 = tests_utils.create_volume(self.context, status='available',
+                                         size=0, host=CONF.host)
+        vol1 = tests_utils.create_volume(self.context, status='in-use',
+                                         size=0, host=CONF.host)
+        with mock.patch.object(self.volume.driver.target_helper,
+                               'ensure_export',
+                               side_effect=[None, Exception('boom')]) as ex:
+            self.volume.init_host()
+        self.assertEqual(2, ex.call_count)
+        failed_id = ex.call_args[0][1]['id']
+        exported_id = (set([vol0['id'], vol1['id']]) - set([failed_id])).pop()
+
+        self.assertEqual('error', db.volume_get(self.context,
+                                                failed_id)['status'])
+        self.assertNotEqual('error', db.volume_get(self.context,
+                                                   exported_id)['status'])
+        self.volume.delete_volume(self.context, vol0['id'])
+        self.volume.delete_volume(self.context, vol1['id'])
+
+    def test_init_host_parallel_exports(self):
+        """init_host splits the volumes between the export workers."""
+        self.flags(volume_service_inithost_export_workers=2)
+        volume_ids = set()
+        for i in range(3):
+            volume_ids.add(tests_utils.create_volume(
+                self.context, status='available', size=0,
+                host=CONF.host)['id'])
+        with mock.patch.object(self.volume.driver, 'ensure_exports',
+                               return_value={}) as ensure_exports:
+            self.volume.init_host()
+
+        self.assertEqual(2, ensure_exports.call_count)
+        chunks = [call[0][1] for call in ensure_exports.call_args_list]
+        self.assertEqual([2, 1], [len(chunk) for chunk in chunks])
+        self.assertEqual(volume_ids,
+                         set(volume['id'] for chunk in chunks
+                             for volume in chunk))
+        for volume_id in volume_ids:
+            self.volume.delete_volume(self.context, volume_id)
+
     @mock.patch.object(QUOTAS, 'reserve')
     @mock.patch.object(QUOTAS, 'commit')
     @mock.patch.object(QUOTAS, 'rollback')
@@ -457,6 +501,53 @@ class VolumeTestCase(BaseVolumeTestCase):
                           None,
                           test_meta)
 
+    @mock.patch('eventlet.greenthread.sleep')
+    def test_wait_status(self, mock_sleep):
+        volume_api = cinder.volume.api.API()
+        volume = tests_utils.create_volume(self.context, status='creating')
+        statuses = iter(['creating', 'downloading', 'error'])
+
+        def fake_sleep(seconds):
+            db.volume_update(self.context, volume['id'],
+                             {'status': next(statuses)})
+
+        mock_sleep.side_effect = fake_sleep
+        self.assertEqual('error', volume_api.wait_status(
+            self.context, volume, ['available', 'error'], 10))
+        self.assertEqual([0.25, 0.5, 1.0],
+                         [call[0][0] for call in mock_sleep.call_args_list])
+
+    @mock.patch('eventlet.greenthread.sleep')
+    def test_wait_status_changed(self, mock_sleep):
+        volume_api = cinder.volume.api.API()
+        volume = tests_utils.create_volume(self.context, status='creating')
+        mock_sleep.side_effect = lambda seconds: db.volume_update(
+            self.context, volume['id'], {'status': 'available'})
+        self.assertEqual('available',
+                         volume_api.wait_status(self.context, volume))
+        self.assertEqual(1, mock_sleep.call_count)
+
+    @mock.patch('eventlet.greenthread.sleep')
+    def test_wait_status_deleted(self, mock_sleep):
+        volume_api = cinder.volume.api.API()
+        volume = tests_utils.create_volume(self.context, status='deleting')
+        mock_sleep.side_effect = lambda seconds: db.volume_destroy(
+            self.context, volume['id'])
+        self.assertEqual('deleted',
+                         volume_api.wait_status(self.context, volume))
+
+    @mock.patch('eventlet.greenthread.sleep')
+    def test_wait_status_timeout(self, mock_sleep):
+        self.flags(volume_wait_status_max_timeout=1)
+        volume_api = cinder.volume.api.API()
+        volume = tests_utils.create_volume(self.context, status='creating')
+        with mock.patch.object(cinder.volume.api, 'time') as mock_time:
+            mock_time.time.side_effect = [0, 0.5, 1]
+            self.assertEqual('creating',
+                             volume_api.wait_status(self.context, volume,
+                                                    ['available'], 30))
+        mock_sleep.assert_called_once_with(0.25)
+
     def test_create_volume_uses_default_availability_zone(self):
         """Test setting availability_zone correctly during volume create."""
         volume_api = cinder.volume.api.API()
@@ -485,6 +576,72 @@ class VolumeTestCase(BaseVolumeTestCase):
                                    'description')
         self.assertEqual(volume['availability_zone'], 'default-az')
 
+    def test_create_volumes_single_scheduler_cast(self):
+        """Test several volumes are scheduled with one scheduler cast."""
+        volume_api = cinder.volume.api.API()
+
+        with mock.patch.object(volume_api.scheduler_rpcapi,
+                               'create_volume') as mock_create_volume:
+            with mock.patch.object(volume_api.scheduler_rpcapi,
+                                   'create_volumes') as mock_create_volumes:
+                volumes = volume_api.create_volumes(self.context, 3, 1,
+                                                    'name', 'description')
+
+        self.assertEqual(3, len(volumes))
+        self.assertFalse(mock_create_volume.called)
+        self.assertEqual(1, mock_create_volumes.call_count)
+        request_spec_list = mock_create_volumes.call_args[0][2]
+        self.assertEqual([volume['id'] for volume in volumes],
+                         [spec['volume_id'] for spec in request_spec_list])
+
+    def test_create_volumes_failure_deletes_created_volumes(self):
+        """Test a bulk create failing part way creates no volume."""
+        volume_api = cinder.volume.api.API()
+        create = volume_api._create
+        created = []
+
+        def fake_create(*args, **kwargs):
+            if len(created) == 2:
+                raise exception.VolumeLimitExceeded(allowed=2)
+            created.append(create(*args, **kwargs))
+            return created[-1]
+
+        with mock.patch.object(volume_api.scheduler_rpcapi,
+                               'create_volumes') as mock_create_volumes:
+            with mock.patch.object(volume_api, '_create',
+                                   side_effect=fake_create):
+                self.assertRaises(exception.VolumeLimitExceeded,
+                                  volume_api.create_volumes, self.context,
+                                  3, 1, 'name', 'description')
+
+        self.assertFalse(mock_create_volumes.called)
+        for volume in created:
+            self.assertRaises(exception.VolumeNotFound, db.volume_get,
+                              self.context, volume['id'])
+
+    def test_create_volumes_from_snapshot_cast_after_all_created(self):
+        """Test volumes sent to the snapshot host are sent once created."""
+        volume_api = cinder.volume.api.API()
+        volume_src = tests_utils.create_volume(
+            self.context, availability_zone=CONF.storage_availability_zone,
+            host=CONF.host)
+        snapshot = self._create_snapshot(volume_src['id'])
+        snapshot = db.snapshot_update(self.context, snapshot['id'],
+                                      {'status': 'available'})
+        casts = []
+
+        def fake_cast(*args, **kwargs):
+            casts.append(args[4]['volume_id'])
+
+        with mock.patch.object(create_volume, 'cast_to_host',
+                               side_effect=fake_cast) as mock_cast:
+            volumes = volume_api.create_volumes(self.context, 2, 1, 'name',
+                                                'description',
+                                                snapshot=snapshot)
+
+        self.assertEqual(2, mock_cast.call_count)
+        self.assertEqual([volume['id'] for volume in volumes], casts)
+
     def test_create_volume_with_volume_type(self):
         """Test volume creation with default volume type."""
         def fake_reserve(context, expire=None, project_id=None, **deltas):
@@ -2148,6 +2305,52 @@ class VolumeTestCase(BaseVolumeTestCase):
         self.assertEqual(volume['bootable'], True)
         self.volume.delete_volume(self.context, volume['id'])
 
+    def test_create_volume_from_image_cache(self):
+        """Test volumes of a cached image are cloned from its volume."""
+        self.flags(cinder_internal_tenant_project_id='internal-project',
+                   cinder_internal_tenant_user_id='internal-user')
+        self.volume.image_volume_cache = image_cache.ImageVolumeCache(
+            db, mock.Mock())
+        image_id = 'c905cedb-7281-47e4-8a62-f26bc5fc4c77'
+
+        volume_ids = []
+        with contextlib.nested(
+            mock.patch.object(self.volume.driver, 'copy_image_to_volume'),
+            mock.patch.object(self.volume.driver, 'create_cloned_volume',
+                              return_value=None)
+        ) as (copy_image_to_volume, create_cloned_volume):
+            for i in range(2):
+                volume_id = tests_utils.create_volume(
+                    self.context, **self.volume_params)['id']
+                self.volume.create_volume(self.context, volume_id,
+                                          image_id=image_id)
+                volume_ids.append(volume_id)
+
+        # The image is only downloaded for the first volume, which is then
+        # cloned into the cache, and the second volume is cloned from it.
+        self.assertEqual(1, copy_image_to_volume.call_count)
+        entries = db.image_volume_cache_get_all_for_host(self.context,
+                                                         CONF.host)
+        self.assertEqual(1, len(entries))
+        image_volume = db.volume_get(self.context, entries[0]['volume_id'])
+        self.assertEqual('internal-project', image_volume['project_id'])
+        self.assertEqual('available', image_volume['status'])
+        self.assertEqual(2, create_cloned_volume.call_count)
+        cache_clone, volume_clone = create_cloned_volume.call_args_list
+        self.assertEqual(image_volume['id'], cache_clone[0][0]['id'])
+        self.assertEqual(volume_ids[0], cache_clone[0][1]['id'])
+        self.assertEqual(volume_ids[1], volume_clone[0][0]['id'])
+        self.assertEqual(image_volume['id'], volume_clone[0][1]['id'])
+        for volume_id in volume_ids:
+            volume = db.volume_get(self.context, volume_id)
+            self.assertEqual('available', volume['status'])
+            self.assertTrue(volume['bootable'])
+
+        # Deleting the cached volume removes it from the cache.
+        self.volume.delete_volume(self.context, image_volume['id'])
+        self.assertEqual([], db.image_volume_cache_get_all_for_host(
+            self.context, CONF.host))
+
     def test_create_volume_from_image_exception(self):
         """Verify that create volume from a non-existing image, the volume
         status is 'error' and is not bootable.
@@ -3332,6 +3535,8 @@ class GetActiveByWindowTestCase(BaseVolumeTestCase):
             datetime.datetime(1, 3, 1, 1, 1, 1),
             datetime.datetime(1, 4, 1, 1, 1, 1),
             project_id='p1')
+        # The query does not define an order.
+        volumes.sort(key=lambda volume: volume.id)
         self.assertEqual(len(volumes), 3)
         self.assertEqual(volumes[0].id, u'2')
         self.assertEqual(volumes[1].id, u'3')
@@ -3362,6 +3567,8 @@ class GetActiveByWindowTestCase(BaseVolumeTestCase):
             datetime.datetime(1, 3, 1, 1, 1, 1),
             datetime.datetime(1, 4, 1, 1, 1, 1),
             project_id='p1')
+        # The query does not define an order.
+        snapshots.sort(key=lambda snapshot: snapshot.id)
         self.assertEqual(len(snapshots), 3)
         self.assertEqual(snapshots[0].id, u'2')
         self.assertEqual(snapshots[0].volume.id, u'1')
@@ -15,8 +15,11 @@
 
 """Tests For miscellaneous util methods used with volume."""
 
+import errno
 import os
 import re
+import shutil
+import tempfile
 
 import mock
 from oslo.config import cfg
@@ -204,6 +207,29 @@ class ClearVolumeTestCase(test.TestCase):
 
 class CopyVolumeTestCase(test.TestCase):
 
+    def setUp(self):
+        super(CopyVolumeTestCase, self).setUp()
+        patcher = mock.patch.dict(volume_utils._odirect_support, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.src = os.path.join(self.tempdir, 'src')
+        self.dest = os.path.join(self.tempdir, 'dest')
+
+    def _write_src(self, extents, size=None):
+        """Write random data at the given (offset, length) extents."""
+        with open(self.src, 'wb') as src:
+            for offset, length in extents:
+                src.seek(offset)
+                src.write(os.urandom(length))
+            if size is not None:
+                src.truncate(size)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
     def test_copy_volume_dd_iflag_and_oflag(self):
         def fake_utils_execute(*cmd, **kwargs):
             if 'if=/dev/zero' in cmd and 'iflag=direct' in cmd:
@@ -217,6 +243,157 @@ class CopyVolumeTestCase(test.TestCase):
                                  CONF.volume_dd_blocksize, sync=True,
                                  ionice=None, execute=fake_utils_execute)
 
+    def test_copy_volume_dd_caches_odirect_support(self):
+        self._write_src([(0, 1024)])
+        shutil.copy(self.src, self.dest)
+        cmds = []
+
+        def fake_utils_execute(*cmd, **kwargs):
+            cmds.append(cmd)
+            if 'count=0' in cmd and 'iflag=direct' in cmd:
+                raise processutils.ProcessExecutionError()
+
+        for i in range(2):
+            volume_utils.copy_volume(self.src, self.dest, 1,
+                                     CONF.volume_dd_blocksize,
+                                     execute=fake_utils_execute)
+
+        probes = [cmd for cmd in cmds if 'count=0' in cmd]
+        self.assertEqual(2, len(probes))
+        copies = [cmd for cmd in cmds if 'count=0' not in cmd]
+        self.assertEqual(2, len(copies))
+        for cmd in copies:
+            self.assertNotIn('iflag=direct', cmd)
+            self.assertIn('oflag=direct', cmd)
+
+    def test_copy_volume_invalid_engine(self):
+        self.flags(volume_copy_engine='fake')
+        self.assertRaises(exception.InvalidConfigurationValue,
+                          volume_utils.copy_volume, self.src, self.dest, 1,
+                          CONF.volume_dd_blocksize)
+
+    def test_copy_volume_native(self):
+        self.flags(volume_copy_engine='native')
+        self._write_src([(0, 3 * 1024 * 1024 + 100)])
+        execute = mock.Mock()
+        progress = mock.Mock()
+
+        volume_utils.copy_volume(self.src, self.dest, 4,
+                                 CONF.volume_dd_blocksize, sync=True,
+                                 execute=execute, progress_callback=progress)
+
+        self.assertFalse(execute.called)
+        self.assertEqual(self._read(self.src), self._read(self.dest))
+        progress.assert_called_with(3 * 1024 * 1024 + 100,
+                                    3 * 1024 * 1024 + 100)
+
+    def test_copy_volume_native_large_blocksize(self):
+        self.flags(volume_copy_engine='native')
+        self._write_src([(0, 9 * 1024 * 1024 + 100)])
+
+        volume_utils.copy_volume(self.src, self.dest, 10, '8M', sync=True)
+
+        self.assertEqual(self._read(self.src), self._read(self.dest))
+
+    def test_copy_volume_native_stops_at_size(self):
+        self.flags(volume_copy_engine='native')
+        self._write_src([(0, 3 * 1024 * 1024)])
+
+        volume_utils.copy_volume(self.src, self.dest, 1,
+                                 CONF.volume_dd_blocksize)
+
+        self.assertEqual(self._read(self.src)[:1024 * 1024],
+                         self._read(self.dest))
+
+    def test_copy_volume_native_skips_holes(self):
+        self.flags(volume_copy_engine='native')
+        mib = 1024 * 1024
+        self._write_src([(0, 4096), (8 * mib, mib)], size=16 * mib)
+
+        with mock.patch.object(volume_utils, '_find_data',
+                               wraps=volume_utils._find_data) as find_data:
+            volume_utils.copy_volume(self.src, self.dest, 16,
+                                     CONF.volume_dd_blocksize)
+            self.assertTrue(find_data.called)
+
+        self.assertEqual(self._read(self.src), self._read(self.dest))
+        dest_stat = os.stat(self.dest)
+        self.assertEqual(16 * mib, dest_stat.st_size)
+        self.assertTrue(dest_stat.st_blocks * 512 < 4 * mib)
+
+    def test_copy_volume_native_from_dev_zero(self):
+        self.flags(volume_copy_engine='native')
+        with open(self.dest, 'wb') as dest:
+            dest.write(os.urandom(1024))
+
+        volume_utils.copy_volume('/dev/zero', self.dest, 2,
+                                 CONF.volume_dd_blocksize, sync=True)
+
+        self.assertEqual('\0' * 2 * 1024 * 1024, self._read(self.dest))
+
+    def test_copy_volume_native_falls_back_to_dd(self):
+        self.flags(volume_copy_engine='native')
+        execute = mock.Mock()
+        with mock.patch.object(volume_utils, '_open_for_copy',
+                               side_effect=OSError(errno.EACCES, 'denied')):
+            volume_utils.copy_volume(self.src, self.dest, 1,
+                                     CONF.volume_dd_blocksize,
+                                     execute=execute)
+        args, kwargs = execute.call_args
+        self.assertEqual('dd', args[0])
+        self.assertIn('if=%s' % self.src, args)
+
+    def test_copy_volume_native_uses_dd_for_ionice(self):
+        self.flags(volume_copy_engine='native')
+        execute = mock.Mock()
+        volume_utils.copy_volume(self.src, self.dest, 1,
+                                 CONF.volume_dd_blocksize,
+                                 execute=execute, ionice='-c3')
+        args, kwargs = execute.call_args
+        self.assertEqual(('ionice', '-c3', 'dd'), args[:3])
+
+    def test_copy_volume_native_rate_limited(self):
+        self.flags(volume_copy_engine='native')
+        self._write_src([(0, 1024 * 1024)])
+        limiter = mock.Mock()
+
+        volume_utils.copy_volume(self.src, self.dest, 1,
+                                 CONF.volume_dd_blocksize,
+                                 rate_limiter=limiter)
+
+        limiter.throttle.assert_called_once_with(1024 * 1024)
+
+    def test_open_for_copy_caches_odirect_support(self):
+        self._write_src([(0, 1024)])
+        real_open = os.open
+
+        def fake_open(path, flags, *args):
+            if flags & os.O_DIRECT:
+                raise OSError(errno.EINVAL, 'Invalid argument')
+            return real_open(path, flags, *args)
+
+        with mock.patch.object(os, 'open', side_effect=fake_open) as m_open:
+            for i in range(2):
+                os.close(volume_utils._open_for_copy(self.src, os.O_RDONLY))
+        self.assertEqual(3, m_open.call_count)
+
+
+class CopyRateLimiterTestCase(test.TestCase):
+
+    @mock.patch('eventlet.greenthread.sleep')
+    @mock.patch('time.time')
+    def test_throttle(self, mock_time, mock_sleep):
+        limiter = volume_utils.CopyRateLimiter(1024)
+
+        mock_time.return_value = 100
+        limiter.throttle(2048)
+        mock_sleep.assert_called_once_with(2.0)
+
+        mock_sleep.reset_mock()
+        mock_time.return_value = 103
+        limiter.throttle(1024)
+        self.assertFalse(mock_sleep.called)
+
 
 class BlkioCgroupTestCase(test.TestCase):
 
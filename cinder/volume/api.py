@@ -22,7 +22,9 @@ Handles all requests relating to volumes.
 import collections
 import datetime
 import functools
+import time
 
+from eventlet import greenthread
 from oslo.config import cfg
 
 from cinder import context
@@ -61,11 +63,27 @@ az_cache_time_opt = cfg.IntOpt('az_cache_duration',
                                help='Cache volume availability zones in '
                                     'memory for the provided duration in '
                                     'seconds')
+max_count_opt = cfg.IntOpt('max_volumes_per_request',
+                           default=100,
+                           help='Maximum number of identical volumes a '
+                                'single create request may ask for')
+wait_status_opts = [
+    cfg.IntOpt('volume_wait_status_max_timeout',
+               default=60,
+               help='Maximum number of seconds an API request may wait for '
+                    'the status of a volume to change'),
+    cfg.FloatOpt('volume_wait_status_max_interval',
+                 default=2.0,
+                 help='Maximum number of seconds between two checks of the '
+                      'status of a volume that an API request waits for'),
+]
 
 CONF = cfg.CONF
 CONF.register_opt(volume_host_opt)
 CONF.register_opt(volume_same_az_opt)
 CONF.register_opt(az_cache_time_opt)
+CONF.register_opt(max_count_opt)
+CONF.register_opts(wait_status_opts)
 
 CONF.import_opt('glance_core_properties', 'cinder.image.glance')
 CONF.import_opt('storage_availability_zone', 'cinder.volume.manager')
@@ -88,6 +106,19 @@ def wrap_check_policy(func):
     return wrapped
 
 
+def _parse_changes_since(filters):
+    """Convert the changes-since filter, if any, to a naive UTC datetime."""
+    if filters.get('changes-since'):
+        try:
+            changes_since = timeutils.parse_isotime(filters['changes-since'])
+        except ValueError:
+            msg = _('changes-since param must be an ISO 8601 time')
+            raise exception.InvalidInput(reason=msg)
+        filters['changes-since'] = timeutils.normalize_time(changes_since)
+    else:
+        filters.pop('changes-since', None)
+
+
 def check_policy(context, action, target_obj=None):
     target = {
         'project_id': context.project_id,
@@ -154,6 +185,65 @@ class API(base.Base):
                availability_zone=None, source_volume=None,
                scheduler_hints=None, backup_source_volume=None,
                source_replica=None, consistencygroup=None):
+        return self._create(context, size, name, description,
+                            snapshot=snapshot, image_id=image_id,
+                            volume_type=volume_type, metadata=metadata,
+                            availability_zone=availability_zone,
+                            source_volume=source_volume,
+                            scheduler_hints=scheduler_hints,
+                            backup_source_volume=backup_source_volume,
+                            source_replica=source_replica,
+                            consistencygroup=consistencygroup)
+
+    def create_volumes(self, context, count, size, name, description,
+                       **kwargs):
+        """Create several identical volumes.
+
+        The volumes which go through the scheduler are sent to it with a
+        single cast, so that it filters the hosts once for all of them.
+        Takes the same keyword arguments as create().
+        """
+        scheduler_casts = []
+        volume_casts = []
+        volumes = []
+        try:
+            for i in xrange(count):
+                volumes.append(self._create(context, size, name, description,
+                                            scheduler_casts=scheduler_casts,
+                                            volume_casts=volume_casts,
+                                            **kwargs))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # None of the volumes was sent to be created yet, delete
+                # those already created (e.g. when a later one ran over
+                # quota) so that the request creates all or none of them.
+                for volume in volumes:
+                    try:
+                        self.delete(context, volume)
+                    except Exception:
+                        LOG.exception(_("Failed to delete volume %s of a "
+                                        "failed bulk create"), volume['id'])
+
+        for host, request_spec, filter_properties in volume_casts:
+            create_volume.cast_to_host(context, self.db, self.volume_rpcapi,
+                                       host, request_spec, filter_properties)
+        if scheduler_casts:
+            request_spec_list = [request_spec for request_spec, _props
+                                 in scheduler_casts]
+            filter_properties = scheduler_casts[0][1]
+            self.scheduler_rpcapi.create_volumes(
+                context,
+                CONF.volume_topic,
+                request_spec_list,
+                filter_properties=filter_properties)
+        return volumes
+
+    def _create(self, context, size, name, description, snapshot=None,
+                image_id=None, volume_type=None, metadata=None,
+                availability_zone=None, source_volume=None,
+                scheduler_hints=None, backup_source_volume=None,
+                source_replica=None, consistencygroup=None,
+                scheduler_casts=None, volume_casts=None):
 
         if volume_type and consistencygroup:
             cg_voltypeids = consistencygroup.get('volume_type_id')
@@ -214,7 +304,9 @@ class API(base.Base):
                                                  self.db,
                                                  self.image_service,
                                                  availability_zones,
-                                                 create_what)
+                                                 create_what,
+                                                 scheduler_casts,
+                                                 volume_casts)
         except Exception:
             LOG.exception(_("Failed to create api volume flow"))
             raise exception.CinderException(
@@ -313,8 +405,45 @@ class API(base.Base):
             raise exception.VolumeNotFound(volume_id=volume_id)
         return volume
 
+    @wrap_check_policy
+    def wait_status(self, context, volume, statuses=None, timeout=None):
+        """Wait for the status of a volume to change.
+
+        Waits until the volume reaches one of statuses, or any other status
+        than its current one if statuses is empty, for at most timeout
+        seconds, capped to volume_wait_status_max_timeout.  Only the status
+        is read from the database, at intervals growing up to
+        volume_wait_status_max_interval.
+
+        :returns: the last status of the volume, 'deleted' if it is gone
+        """
+        max_timeout = CONF.volume_wait_status_max_timeout
+        if timeout is None or timeout > max_timeout:
+            timeout = max_timeout
+        deadline = time.time() + timeout
+
+        if statuses:
+            done = lambda status: status in statuses
+        else:
+            done = lambda status: status != volume['status']
+
+        status = volume['status']
+        interval = min(0.25, CONF.volume_wait_status_max_interval)
+        while not done(status):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            greenthread.sleep(min(interval, remaining))
+            interval = min(interval * 2, CONF.volume_wait_status_max_interval)
+            try:
+                status = self.db.volume_status_get(context, volume['id'])
+            except exception.VolumeNotFound:
+                return 'deleted'
+        return status
+
     def get_all(self, context, marker=None, limit=None, sort_key='created_at',
-                sort_dir='desc', filters=None, viewable_admin_meta=False):
+                sort_dir='desc', filters=None, viewable_admin_meta=False,
+                columns=None):
         check_policy(context, 'get_all')
         if filters is None:
             filters = {}
@@ -329,6 +458,8 @@ class API(base.Base):
             msg = _('limit param must be an integer')
             raise exception.InvalidInput(reason=msg)
 
+        _parse_changes_since(filters)
+
         # Non-admin shouldn't see temporary target of a volume migration, add
         # unique filter data to reflect that only volumes with a NULL
         # 'migration_status' or a 'migration_status' that does not start with
@@ -343,7 +474,8 @@ class API(base.Base):
             # Need to remove all_tenants to pass the filtering below.
             del filters['all_tenants']
             volumes = self.db.volume_get_all(context, marker, limit, sort_key,
-                                             sort_dir, filters=filters)
+                                             sort_dir, filters=filters,
+                                             columns=columns)
         else:
             if viewable_admin_meta:
                 context = context.elevated()
@@ -351,7 +483,8 @@ class API(base.Base):
                                                         context.project_id,
                                                         marker, limit,
                                                         sort_key, sort_dir,
-                                                        filters=filters)
+                                                        filters=filters,
+                                                        columns=columns)
 
         return volumes
 
@@ -365,31 +498,40 @@ class API(base.Base):
         rv = self.db.volume_get(context, volume_id)
         return dict(rv.iteritems())
 
-    def get_all_snapshots(self, context, search_opts=None):
+    def get_all_snapshots(self, context, search_opts=None, marker=None,
+                          limit=None, sort_key='created_at',
+                          sort_dir='desc'):
         check_policy(context, 'get_all_snapshots')
 
         search_opts = search_opts or {}
 
+        try:
+            if limit is not None:
+                limit = int(limit)
+                if limit < 0:
+                    msg = _('limit param must be positive')
+                    raise exception.InvalidInput(reason=msg)
+        except ValueError:
+            msg = _('limit param must be an integer')
+            raise exception.InvalidInput(reason=msg)
+
+        _parse_changes_since(search_opts)
+
+        if search_opts:
+            LOG.debug("Searching by: %s" % search_opts)
+
         if (context.is_admin and 'all_tenants' in search_opts):
             # Need to remove all_tenants to pass the filtering below.
             del search_opts['all_tenants']
-            snapshots = self.db.snapshot_get_all(context)
+            snapshots = self.db.snapshot_get_all(context, filters=search_opts,
+                                                 marker=marker, limit=limit,
+                                                 sort_key=sort_key,
+                                                 sort_dir=sort_dir)
         else:
             snapshots = self.db.snapshot_get_all_by_project(
-                context, context.project_id)
-
-        if search_opts:
-            LOG.debug("Searching by: %s" % search_opts)
-
-            results = []
-            not_found = object()
-            for snapshot in snapshots:
-                for opt, value in search_opts.iteritems():
-                    if snapshot.get(opt, not_found) != value:
-                        break
-                else:
-                    results.append(snapshot)
-            snapshots = results
+                context, context.project_id, filters=search_opts,
+                marker=marker, limit=limit, sort_key=sort_key,
+                sort_dir=sort_dir)
         return snapshots
 
     @wrap_check_policy
@@ -113,6 +113,12 @@ volume_opts = [
                default=0,
                help='The upper limit of bandwidth of volume copy. '
                     '0 => unlimited'),
+    cfg.StrOpt('volume_copy_engine',
+               default='dd',
+               help='How volumes are copied and cleared: dd runs dd '
+                    'through rootwrap, native copies within the volume '
+                    'service when it may open both devices and falls back '
+                    'to dd otherwise'),
     cfg.StrOpt('iscsi_write_cache',
                default='on',
                help='Sets the behavior of the iSCSI target to either '
@@ -127,6 +133,20 @@ volume_opts = [
                default=None,
                help='The path to the client certificate for verification, '
                     'if the driver supports it.'),
+    cfg.BoolOpt('image_volume_cache_enabled',
+                default=False,
+                help='Keep a volume of the images that volumes are created '
+                     'from on this backend, and clone new volumes of the '
+                     'same image from it. The cached volumes are owned by '
+                     'the Cinder internal tenant, which must be configured.'),
+    cfg.IntOpt('image_volume_cache_max_size_gb',
+               default=0,
+               help='Maximum total size in GB of the image volume cache of '
+                    'this backend. 0 => unlimited'),
+    cfg.IntOpt('image_volume_cache_max_count',
+               default=0,
+               help='Maximum number of volumes in the image volume cache of '
+                    'this backend. 0 => unlimited'),
 ]
 
 # for backward compatibility
@@ -785,6 +805,23 @@ class VolumeDriver(object):
         """Synchronously recreates an export for a volume."""
         raise NotImplementedError()
 
+    def ensure_exports(self, context, volumes):
+        """Synchronously recreates the exports of several volumes.
+
+        Drivers which can tell which exports are missing in one go should
+        override this to only recreate those.
+
+        :returns: a dict of the exceptions raised recreating the exports,
+                  keyed by volume id
+        """
+        failures = {}
+        for volume in volumes:
+            try:
+                self.ensure_export(context, volume)
+            except Exception as ex:
+                failures[volume['id']] = ex
+        return failures
+
     def create_export(self, context, volume):
         """Exports the volume.
 
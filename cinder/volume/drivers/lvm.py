@@ -527,12 +527,15 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
                                   'creation for target: %s') % iscsi_name)
         return tid
 
-    def ensure_export(self, context, volume):
-        volume_name = volume['name']
+    def _get_export_names(self, volume):
         iscsi_name = "%s%s" % (self.configuration.iscsi_target_prefix,
-                               volume_name)
+                               volume['name'])
         volume_path = "/dev/%s/%s" % (self.configuration.volume_group,
-                                      volume_name)
+                                      volume['name'])
+        return iscsi_name, volume_path
+
+    def ensure_export(self, context, volume):
+        iscsi_name, volume_path = self._get_export_names(volume)
         # NOTE(jdg): For TgtAdm case iscsi_name is the ONLY param we need
         # should clean this all up at some point in the future
         model_update = self.target_helper.ensure_export(
@@ -544,6 +547,15 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
         if model_update:
             self.db.volume_update(context, volume['id'], model_update)
 
+    def ensure_exports(self, context, volumes):
+        exports = [(volume,) + self._get_export_names(volume)
+                   for volume in volumes]
+        return self.target_helper.ensure_exports(
+            context,
+            exports,
+            self.configuration.volume_group,
+            self.configuration)
+
     def create_export(self, context, volume):
         return self._create_export(context, volume)
 
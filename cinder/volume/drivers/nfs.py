@@ -14,14 +14,17 @@
 #    under the License.
 
 import errno
+import fnmatch
 import os
 
+from eventlet import tpool
 from oslo.config import cfg
 
 from cinder.brick.remotefs import remotefs as remotefs_brick
 from cinder import exception
 from cinder.i18n import _
 from cinder.image import image_utils
+from cinder.openstack.common import excutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import processutils as putils
 from cinder.openstack.common import units
@@ -58,12 +61,50 @@ volume_opts = [
                default=None,
                help=('Mount options passed to the nfs client. See section '
                      'of the nfs man page for details.')),
+    cfg.IntOpt('nfs_allocation_rescan_interval',
+               default=3600,
+               help=('Seconds after which the files of nfs shares are walked '
+                     'again to account for their allocated space, seeing '
+                     'the files created by other hosts. The space allocated '
+                     'by the volumes of the driver is accounted for as they '
+                     'are created, extended and deleted. 0 to only walk '
+                     'shares when the driver starts or fails to change '
+                     'them.')),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(volume_opts)
 
 
+def _walk_share(mount_point):
+    """Return the apparent size of the files under mount_point but
+    snapshots, keyed by path relative to mount_point.
+
+    :raises OSError: if a directory can't be listed
+    """
+    allocations = {}
+
+    def _raise(exc):
+        raise exc
+
+    for dirpath, dirnames, filenames in os.walk(mount_point, onerror=_raise):
+        dirnames[:] = [name for name in dirnames
+                       if not fnmatch.fnmatch(name, '*snapshot*')]
+        for name in filenames:
+            if fnmatch.fnmatch(name, '*snapshot*'):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                size = os.lstat(path).st_size
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    raise
+                # Deleted while walking the share.
+                continue
+            allocations[os.path.relpath(path, mount_point)] = size
+    return allocations
+
+
 class NfsDriver(remotefs.RemoteFSDriver):
     """NFS based cinder driver. Creates file on NFS share for using it
     as block device on hypervisor.
@@ -90,6 +131,9 @@ class NfsDriver(remotefs.RemoteFSDriver):
             'nfs', root_helper, execute=execute,
             nfs_mount_point_base=self.base,
             nfs_mount_options=opts)
+        self._allocation_ledger = remotefs.AllocationLedger(
+            self._scan_share_allocations,
+            max_age=self.configuration.nfs_allocation_rescan_interval)
 
     def set_execute(self, execute):
         super(NfsDriver, self).set_execute(execute)
@@ -126,6 +170,7 @@ class NfsDriver(remotefs.RemoteFSDriver):
             raise exception.NfsException(msg)
 
         self.shares = {}  # address : options
+        self._allocation_ledger.invalidate()
 
         # Check if mount.nfs is installed
         try:
@@ -236,11 +281,33 @@ class NfsDriver(remotefs.RemoteFSDriver):
         total_available = block_size * blocks_avail
         total_size = block_size * blocks_total
 
-        du, _ = self._execute('du', '-sb', '--apparent-size', '--exclude',
-                              '*snapshot*', mount_point, run_as_root=True)
-        total_allocated = float(du.split()[0])
+        total_allocated = float(self._allocation_ledger.allocated(nfs_share))
         return total_size, total_available, total_allocated
 
+    def _scan_share_allocations(self, nfs_share):
+        """Walk the NFS share for the allocation ledger.
+
+        The walk stats every file of the share, which isn't green, so it
+        runs in a native thread rather than blocking the hub.
+
+        :returns: the apparent size of each file of the share but snapshots,
+                  keyed by path relative to the mount point
+        """
+
+        mount_point = self._get_mount_point_for_share(nfs_share)
+        try:
+            return tpool.execute(_walk_share, mount_point)
+        except OSError as exc:
+            LOG.warn(_("Unable to walk %(share)s, counting its allocated "
+                       "space as root: %(error)s"),
+                     {'share': nfs_share, 'error': exc})
+            du, _err = self._execute('du', '-sb', '--apparent-size',
+                                     '--exclude', '*snapshot*', mount_point,
+                                     run_as_root=True)
+            # The files aren't known one by one, the space allocated to
+            # those deleted is accounted for until the next walk.
+            return {None: int(du.split()[0])}
+
     def _get_mount_point_base(self):
         return self.base
 
@@ -255,7 +322,12 @@ class NfsDriver(remotefs.RemoteFSDriver):
                                               % (volume['id'], new_size))
         path = self.local_path(volume)
         LOG.info(_('Resizing file to %sG...'), new_size)
-        image_utils.resize_image(path, new_size)
+        try:
+            image_utils.resize_image(path, new_size)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._invalidate_allocation(volume['provider_location'])
+        self._record_allocation(volume, new_size)
         if not self._is_file_size_equal(path, new_size):
             raise exception.ExtendVolumeError(
                 reason='Resizing image file failed.')
@@ -14,11 +14,13 @@
 """RADOS Block Device Driver"""
 
 from __future__ import absolute_import
+import functools
 import io
 import json
 import math
 import os
 import tempfile
+import time
 import urllib
 
 from oslo.config import cfg
@@ -78,13 +80,102 @@ rbd_opts = [
     cfg.IntOpt('rados_connect_timeout', default=-1,
                help=_('Timeout value (in seconds) used when connecting to '
                       'ceph cluster. If value < 0, no timeout is set and '
-                      'default librados value is used.'))
+                      'default librados value is used.')),
+    cfg.IntOpt('rados_connection_pool_size', default=4,
+               help=_('Maximum number of idle connections to the ceph '
+                      'cluster kept open for reuse, for each RADOS client '
+                      'name, ceph configuration file and pool. Set to 0 to '
+                      'connect for every operation.'))
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(rbd_opts)
 
 
+class RADOSConnectionPool(object):
+    """Pool of connected RADOS clients, each with an ioctx of one pool.
+
+    Connecting to a ceph cluster handshakes with its monitors, so instead of
+    shutting clients down, their users give them back to the pool, which
+    keeps up to max_size of them for the next users.  Clients given back
+    after a failure, and clients idle for a while, are checked before being
+    reused, so that broken clients are replaced with new ones.
+    """
+
+    # Seconds a client may stay idle before being checked again.
+    HEALTH_CHECK_INTERVAL = 60
+
+    def __init__(self, rados, connect, max_size):
+        self._rados = rados
+        self._connect = connect
+        self.max_size = max_size
+        self._idle = []
+
+    def get(self):
+        """Return a (client, ioctx) tuple, connecting one if none is idle."""
+        while self._idle:
+            client, ioctx, idle_since = self._idle.pop()
+            if self._is_healthy(client, ioctx, idle_since):
+                return client, ioctx
+            self._close(client, ioctx)
+        return self._connect()
+
+    def put(self, client, ioctx, failed=False):
+        """Give a client back, failed if it was used by a failed operation.
+
+        The client is shut down if the pool is full.
+        """
+        if len(self._idle) >= self.max_size:
+            self._close(client, ioctx)
+        else:
+            idle_since = None if failed else time.time()
+            self._idle.append((client, ioctx, idle_since))
+
+    def close(self):
+        """Shut down the idle clients."""
+        while self._idle:
+            client, ioctx, idle_since = self._idle.pop()
+            self._close(client, ioctx)
+
+    def _is_healthy(self, client, ioctx, idle_since):
+        if client.state != 'connected':
+            return False
+        if (idle_since is not None and
+                time.time() - idle_since < self.HEALTH_CHECK_INTERVAL):
+            return True
+        try:
+            ioctx.get_stats()
+        except self._rados.Error as exc:
+            LOG.warn(_("Reconnecting to ceph cluster after error: %s") % exc)
+            return False
+        return True
+
+    def _close(self, client, ioctx):
+        # closing an ioctx cannot raise an exception
+        ioctx.close()
+        # shutdown cannot raise an exception
+        client.shutdown()
+
+
+_rados_connection_pools = {}
+
+
+def get_rados_connection_pool(rados, user, conf, pool, connect, max_size):
+    """Return the connection pool of a ceph user, conf file and pool.
+
+    Pools are shared by all the drivers of the process, connect is only
+    used to create the pool the first time it is needed.  They are also
+    keyed by the rados library, so that drivers given another library,
+    such as a test double, don't share connections.
+    """
+    key = (rados, user, conf, pool)
+    conn_pool = _rados_connection_pools.get(key)
+    if conn_pool is None:
+        conn_pool = RADOSConnectionPool(rados, connect, max_size)
+        _rados_connection_pools[key] = conn_pool
+    return conn_pool
+
+
 class RBDImageMetadata(object):
     """RBD image metadata to be used with RBDImageIOWrapper."""
     def __init__(self, image, pool, user, conf):
@@ -213,11 +304,12 @@ class RBDVolumeProxy(object):
                                            read_only=read_only)
         except driver.rbd.Error:
             LOG.exception(_("error opening rbd image %s"), name)
-            driver._disconnect_from_rados(client, ioctx)
+            driver._disconnect_from_rados(client, ioctx, pool, failed=True)
             raise
         self.driver = driver
         self.client = client
         self.ioctx = ioctx
+        self.pool = pool
 
     def __enter__(self):
         return self
@@ -226,7 +318,9 @@ class RBDVolumeProxy(object):
         try:
             self.volume.close()
         finally:
-            self.driver._disconnect_from_rados(self.client, self.ioctx)
+            self.driver._disconnect_from_rados(
+                self.client, self.ioctx, self.pool,
+                failed=value is not None)
 
     def __getattr__(self, attrib):
         return getattr(self.volume, attrib)
@@ -236,13 +330,16 @@ class RADOSClient(object):
     """Context manager to simplify error handling for connecting to ceph."""
     def __init__(self, driver, pool=None):
         self.driver = driver
+        self.pool = pool
         self.cluster, self.ioctx = driver._connect_to_rados(pool)
 
     def __enter__(self):
         return self
 
     def __exit__(self, type_, value, traceback):
-        self.driver._disconnect_from_rados(self.cluster, self.ioctx)
+        self.driver._disconnect_from_rados(
+            self.cluster, self.ioctx, self.pool,
+            failed=value is not None)
 
 
 class RBDDriver(driver.VolumeDriver):
@@ -286,17 +383,30 @@ class RBDDriver(driver.VolumeDriver):
             args.extend(['--conf', self.configuration.rbd_ceph_conf])
         return args
 
+    def _get_rados_connection_pool(self, pool=None):
+        if pool is not None:
+            pool = strutils.safe_encode(pool)
+        else:
+            pool = self.configuration.rbd_pool
+        return get_rados_connection_pool(
+            self.rados, self.configuration.rbd_user,
+            self.configuration.rbd_ceph_conf, pool,
+            functools.partial(self._open_rados_connection, pool),
+            self.configuration.rados_connection_pool_size)
+
     def _connect_to_rados(self, pool=None):
+        return self._get_rados_connection_pool(pool).get()
+
+    def _disconnect_from_rados(self, client, ioctx, pool=None, failed=False):
+        self._get_rados_connection_pool(pool).put(client, ioctx,
+                                                  failed=failed)
+
+    def _open_rados_connection(self, pool):
         LOG.debug("opening connection to ceph cluster (timeout=%s)." %
                   (self.configuration.rados_connect_timeout))
 
         client = self.rados.Rados(rados_id=self.configuration.rbd_user,
                                   conffile=self.configuration.rbd_ceph_conf)
-        if pool is not None:
-            pool = strutils.safe_encode(pool)
-        else:
-            pool = self.configuration.rbd_pool
-
         try:
             if self.configuration.rados_connect_timeout >= 0:
                 client.connect(timeout=
@@ -311,11 +421,6 @@ class RBDDriver(driver.VolumeDriver):
             client.shutdown()
             raise exception.VolumeBackendAPIException(data=str(exc))
 
-    def _disconnect_from_rados(self, client, ioctx):
-        # closing an ioctx cannot raise an exception
-        ioctx.close()
-        client.shutdown()
-
     def _get_backup_snaps(self, rbd_image):
         """Get list of any backup snapshots that exist on this volume.
 
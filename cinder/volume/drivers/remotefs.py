@@ -19,11 +19,14 @@ import json
 import os
 import re
 import tempfile
+import time
 
+from eventlet import event
 from oslo.config import cfg
 
 from cinder import exception
 from cinder.image import image_utils
+from cinder.openstack.common import excutils
 from cinder.openstack.common.gettextutils import _
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import processutils as putils
@@ -55,6 +58,107 @@ CONF = cfg.CONF
 CONF.register_opts(nas_opts)
 
 
+class _Walk(object):
+    """A walk of a share in progress."""
+
+    def __init__(self):
+        # (name, size) for each file changed while the share is walked,
+        # with a size of None for a deleted file.
+        self.changes = []
+        # Set when the share is invalidated while it is walked.
+        self.invalidated = False
+        self.done = event.Event()
+
+
+class AllocationLedger(object):
+    """Apparent size allocated to the files of remote shares.
+
+    Walking a share with thousands of volume files on every volume create
+    is slow, so the ledger walks each share once, with the scan callable
+    returning the apparent size of each file of the share, and then
+    follows the files the driver creates, resizes and deletes.  Drivers
+    invalidate a share when an operation on it fails, and a share is
+    walked again once its walk is older than max_age seconds, if set, so
+    that files changed behind the driver's back are eventually seen.
+
+    Only one walk of a share runs at a time, later lookups wait for it,
+    and the files changed while it runs are applied to its result.
+    """
+
+    def __init__(self, scan, max_age=0):
+        self._scan = scan
+        self.max_age = max_age
+        # share: (time of the walk, {file: apparent size in bytes})
+        self._shares = {}
+        # share: _Walk
+        self._walks = {}
+
+    def rebuild(self, share):
+        """Walk share again and return the size of its files."""
+        walk = self._walks.get(share)
+        if walk is not None:
+            return walk.done.wait()
+
+        walk = self._walks[share] = _Walk()
+        started_at = time.time()
+        try:
+            files = self._scan(share)
+        except Exception as exc:
+            with excutils.save_and_reraise_exception():
+                del self._walks[share]
+                walk.done.send_exception(exc)
+
+        del self._walks[share]
+        for name, size in walk.changes:
+            if size is None:
+                files.pop(name, None)
+            else:
+                files[name] = size
+        if not walk.invalidated:
+            self._shares[share] = (started_at, files)
+        walk.done.send(files)
+        return files
+
+    def _files(self, share):
+        if share in self._shares:
+            scanned_at, files = self._shares[share]
+            if not self.max_age or time.time() - scanned_at < self.max_age:
+                return files
+        return self.rebuild(share)
+
+    def __contains__(self, share):
+        return share in self._shares
+
+    def allocated(self, share):
+        """Return the apparent size allocated on share, in bytes."""
+        return sum(self._files(share).values())
+
+    def record(self, share, name, size):
+        """Record that the file name of share now has size bytes."""
+        if share in self._walks:
+            self._walks[share].changes.append((name, size))
+        if share in self._shares:
+            self._shares[share][1][name] = size
+
+    def forget(self, share, name):
+        """Record that the file name of share was deleted."""
+        if share in self._walks:
+            self._walks[share].changes.append((name, None))
+        if share in self._shares:
+            self._shares[share][1].pop(name, None)
+
+    def invalidate(self, share=None):
+        """Walk share, or all of the shares, again on their next lookup."""
+        if share is None:
+            self._shares.clear()
+            walks = self._walks.values()
+        else:
+            self._shares.pop(share, None)
+            walks = [self._walks[share]] if share in self._walks else []
+        for walk in walks:
+            walk.invalidated = True
+
+
 class RemoteFSDriver(driver.VolumeDriver):
     """Common base for drivers that work like NFS."""
 
@@ -67,6 +171,9 @@ class RemoteFSDriver(driver.VolumeDriver):
         super(RemoteFSDriver, self).__init__(*args, **kwargs)
         self.shares = {}
         self._mounted_shares = []
+        # Drivers accounting for the allocation of their shares without
+        # walking them set an AllocationLedger.
+        self._allocation_ledger = None
 
     def check_for_setup_error(self):
         """Just to override parent behavior."""
@@ -114,7 +221,12 @@ class RemoteFSDriver(driver.VolumeDriver):
 
         LOG.info(_('casted to %s') % volume['provider_location'])
 
-        self._do_create_volume(volume)
+        try:
+            self._do_create_volume(volume)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._invalidate_allocation(volume['provider_location'])
+        self._record_allocation(volume)
 
         return {'provider_location': volume['provider_location']}
 
@@ -170,7 +282,12 @@ class RemoteFSDriver(driver.VolumeDriver):
 
         mounted_path = self.local_path(volume)
 
-        self._delete(mounted_path)
+        try:
+            self._delete(mounted_path)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._invalidate_allocation(volume['provider_location'])
+        self._forget_allocation(volume)
 
     def ensure_export(self, ctx, volume):
         """Synchronously recreates an export for a logical volume."""
@@ -192,6 +309,38 @@ class RemoteFSDriver(driver.VolumeDriver):
         """
         pass
 
+    def _record_allocation(self, volume, size_in_gib=None):
+        """Record the apparent size of the file of volume in the ledger.
+
+        :param size_in_gib: size of the volume, when it's being resized
+        """
+        ledger = self._allocation_ledger
+        if ledger is None:
+            return
+        share = volume['provider_location']
+        if share not in ledger:
+            # The file is seen by the walk of the share on its lookup.
+            ledger.invalidate(share)
+            return
+        try:
+            size = os.path.getsize(self.local_path(volume))
+        except OSError:
+            # The file may not be readable by cinder, its apparent size
+            # is the size of the volume but for format overhead.
+            size = (size_in_gib or volume['size']) * units.Gi
+        ledger.record(share, volume['name'], size)
+
+    def _forget_allocation(self, volume):
+        """Drop the file of a deleted volume from the ledger."""
+        if self._allocation_ledger is not None:
+            self._allocation_ledger.forget(volume['provider_location'],
+                                           volume['name'])
+
+    def _invalidate_allocation(self, share):
+        """Walk share again, the state of its files is unknown."""
+        if self._allocation_ledger is not None:
+            self._allocation_ledger.invalidate(share)
+
     def _delete(self, path):
         # Note(lpetrut): this method is needed in order to provide
         # interoperability with Windows as it will be overridden.
@@ -673,10 +673,18 @@ class VolumeCastTask(flow_utils.CinderTask):
     This which will signal a transition of the api workflow to another child
     and/or related workflow on another component.
 
+    When a scheduler_casts list is given the scheduler cast is not sent, the
+    request is appended to that list instead so that the caller can schedule
+    several volumes with a single cast.  Likewise, when a volume_casts list
+    is given, requests sent straight to a volume host are appended to it as
+    (host, request_spec, filter_properties) for the caller to send with
+    cast_to_host().
+
     Reversion strategy: N/A
     """
 
-    def __init__(self, scheduler_rpcapi, volume_rpcapi, db):
+    def __init__(self, scheduler_rpcapi, volume_rpcapi, db,
+                 scheduler_casts=None, volume_casts=None):
         requires = ['image_id', 'scheduler_hints', 'snapshot_id',
                     'source_volid', 'volume_id', 'volume_type',
                     'volume_properties', 'source_replicaid',
@@ -686,6 +694,8 @@ class VolumeCastTask(flow_utils.CinderTask):
         self.volume_rpcapi = volume_rpcapi
         self.scheduler_rpcapi = scheduler_rpcapi
         self.db = db
+        self.scheduler_casts = scheduler_casts
+        self.volume_casts = volume_casts
 
     def _cast_create_volume(self, context, request_spec, filter_properties):
         source_volid = request_spec['source_volid']
@@ -717,7 +727,11 @@ class VolumeCastTask(flow_utils.CinderTask):
             source_volume_ref = self.db.volume_get(context, source_replicaid)
             host = source_volume_ref['host']
 
-        if not host:
+        if not host and self.scheduler_casts is not None:
+            # Let the caller cast this volume to the scheduler together
+            # with the other volumes of the same request.
+            self.scheduler_casts.append((request_spec, filter_properties))
+        elif not host:
             # Cast to the scheduler and let it handle whatever is needed
             # to select the target host for this volume.
             self.scheduler_rpcapi.create_volume(
@@ -728,24 +742,11 @@ class VolumeCastTask(flow_utils.CinderTask):
                 image_id=image_id,
                 request_spec=request_spec,
                 filter_properties=filter_properties)
+        elif self.volume_casts is not None:
+            self.volume_casts.append((host, request_spec, filter_properties))
         else:
-            # Bypass the scheduler and send the request directly to the volume
-            # manager.
-            now = timeutils.utcnow()
-            values = {'host': host, 'scheduled_at': now}
-            volume_ref = self.db.volume_update(context, volume_id, values)
-            self.volume_rpcapi.create_volume(
-                context,
-                volume_ref,
-                volume_ref['host'],
-                request_spec,
-                filter_properties,
-                allow_reschedule=False,
-                snapshot_id=snapshot_id,
-                image_id=image_id,
-                source_volid=source_volid,
-                source_replicaid=source_replicaid,
-                consistencygroup_id=group_id)
+            cast_to_host(context, self.db, self.volume_rpcapi, host,
+                         request_spec, filter_properties)
 
     def execute(self, context, **kwargs):
         scheduler_hints = kwargs.pop('scheduler_hints', None)
@@ -770,9 +771,31 @@ class VolumeCastTask(flow_utils.CinderTask):
         LOG.error(_('Unexpected build error:'), exc_info=exc_info)
 
 
+def cast_to_host(context, db, volume_rpcapi, host, request_spec,
+                 filter_properties):
+    """Send a volume create request directly to the volume manager of host,
+    bypassing the scheduler.
+    """
+    now = timeutils.utcnow()
+    values = {'host': host, 'scheduled_at': now}
+    volume_ref = db.volume_update(context, request_spec['volume_id'], values)
+    volume_rpcapi.create_volume(
+        context,
+        volume_ref,
+        volume_ref['host'],
+        request_spec,
+        filter_properties,
+        allow_reschedule=False,
+        snapshot_id=request_spec['snapshot_id'],
+        image_id=request_spec['image_id'],
+        source_volid=request_spec['source_volid'],
+        source_replicaid=request_spec['source_replicaid'],
+        consistencygroup_id=request_spec['consistencygroup_id'])
+
+
 def get_flow(scheduler_rpcapi, volume_rpcapi, db_api,
              image_service_api, availability_zones,
-             create_what):
+             create_what, scheduler_casts=None, volume_casts=None):
     """Constructs and returns the api entrypoint flow.
 
     This flow will do the following:
@@ -800,7 +823,9 @@ def get_flow(scheduler_rpcapi, volume_rpcapi, db_api,
 
     # This will cast it out to either the scheduler or volume manager via
     # the rpc apis provided.
-    api_flow.add(VolumeCastTask(scheduler_rpcapi, volume_rpcapi, db_api))
+    api_flow.add(VolumeCastTask(scheduler_rpcapi, volume_rpcapi, db_api,
+                                scheduler_casts=scheduler_casts,
+                                volume_casts=volume_casts))
 
     # Now load (but do not run) the flow using the provided initial data.
     return taskflow.engines.load(api_flow, store=create_what)
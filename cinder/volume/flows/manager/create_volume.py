@@ -17,13 +17,16 @@ import taskflow.engines
 from taskflow.patterns import linear_flow
 from taskflow.utils import misc
 
+from cinder import context as cinder_context
 from cinder import exception
 from cinder import flow_utils
 from cinder.i18n import _
 from cinder.image import glance
+from cinder.openstack.common import excutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import processutils
 from cinder.openstack.common import timeutils
+from cinder import quota
 from cinder import utils
 from cinder.volume.flows import common
 from cinder.volume import utils as volume_utils
@@ -32,6 +35,7 @@ LOG = logging.getLogger(__name__)
 
 ACTION = 'volume:create'
 CONF = cfg.CONF
+QUOTAS = quota.QUOTAS
 
 # These attributes we will attempt to save for the volume if they exist
 # in the source image metadata.
@@ -329,10 +333,11 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
 
     default_provides = 'volume'
 
-    def __init__(self, db, driver):
+    def __init__(self, db, driver, image_volume_cache=None):
         super(CreateVolumeFromSpecTask, self).__init__(addons=[ACTION])
         self.db = db
         self.driver = driver
+        self.image_volume_cache = image_volume_cache
 
     def _handle_bootable_volume_glance_meta(self, context, volume_id,
                                             **kwargs):
@@ -567,6 +572,13 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
         # and clone status.
         model_update, cloned = self.driver.clone_image(
             volume_ref, image_location, image_id, image_meta)
+        internal_context = None
+        if not cloned and self.image_volume_cache:
+            internal_context = cinder_context.get_internal_tenant_context()
+            if internal_context:
+                model_update, cloned = self._create_from_image_cache(
+                    context, internal_context, volume_ref, image_id,
+                    image_meta)
         if not cloned:
             # TODO(harlowja): what needs to be rolled back in the clone if this
             # volume create fails?? Likely this should be a subflow or broken
@@ -588,12 +600,110 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                                'updates': updates})
             self._copy_image_to_volume(context, volume_ref,
                                        image_id, image_location, image_service)
+            if internal_context:
+                self._create_image_cache_volume_entry(internal_context,
+                                                      volume_ref, image_id,
+                                                      image_meta)
 
         self._handle_bootable_volume_glance_meta(context, volume_ref['id'],
                                                  image_id=image_id,
                                                  image_meta=image_meta)
         return model_update
 
+    def _create_from_image_cache(self, context, internal_context,
+                                 volume_ref, image_id, image_meta):
+        """Clones the volume from the cached volume of the image, if any.
+
+        Returns the model update of the volume and whether it was cloned.
+        """
+        cache_entry = self.image_volume_cache.get_entry(internal_context,
+                                                        volume_ref,
+                                                        image_id,
+                                                        image_meta)
+        if not cache_entry:
+            return None, False
+
+        image_volume_id = cache_entry['volume_id']
+
+        # Make sure the cached volume is not deleted while it is cloned.
+        @utils.synchronized('%s-delete_volume' % image_volume_id,
+                            external=True)
+        def _clone_locked():
+            try:
+                image_volume = self.db.volume_get(context, image_volume_id)
+            except exception.VolumeNotFound:
+                self.image_volume_cache.evict(internal_context, cache_entry)
+                return None, False
+            if image_volume['status'] != 'available':
+                return None, False
+            LOG.debug("Cloning volume %(volume_id)s from cached volume "
+                      "%(image_volume_id)s of image %(image_id)s." %
+                      {'volume_id': volume_ref['id'],
+                       'image_volume_id': image_volume_id,
+                       'image_id': image_id})
+            return self.driver.create_cloned_volume(volume_ref,
+                                                    image_volume), True
+
+        return _clone_locked()
+
+    def _create_image_cache_volume_entry(self, internal_context, volume_ref,
+                                         image_id, image_meta):
+        """Caches the image downloaded to volume_ref on its backend.
+
+        Failing to cache the image does not fail the volume creation.
+        """
+        try:
+            if not self.image_volume_cache.ensure_space(internal_context,
+                                                        volume_ref['size'],
+                                                        volume_ref['host']):
+                LOG.warn(_("Unable to make room in the image volume cache "
+                           "of %(host)s for image %(image_id)s.") %
+                         {'host': volume_ref['host'], 'image_id': image_id})
+                return
+            image_volume = self._clone_image_volume(internal_context,
+                                                    volume_ref, image_id)
+            self.image_volume_cache.create_cache_entry(internal_context,
+                                                       image_volume,
+                                                       image_id,
+                                                       image_meta)
+        except Exception as ex:
+            LOG.warn(_("Failed to cache image %(image_id)s in a volume: "
+                       "%(error)s") % {'image_id': image_id, 'error': ex})
+
+    def _clone_image_volume(self, context, volume_ref, image_id):
+        """Clones volume_ref into a new volume of the internal tenant."""
+        reserve_opts = {'volumes': 1, 'gigabytes': volume_ref['size']}
+        QUOTAS.add_volume_type_opts(context, reserve_opts,
+                                    volume_ref['volume_type_id'])
+        reservations = QUOTAS.reserve(context, **reserve_opts)
+        try:
+            image_volume = self.db.volume_create(context, {
+                'size': volume_ref['size'],
+                'host': volume_ref['host'],
+                'availability_zone': volume_ref['availability_zone'],
+                'volume_type_id': volume_ref['volume_type_id'],
+                'user_id': context.user_id,
+                'project_id': context.project_id,
+                'status': 'creating',
+                'attach_status': 'detached',
+                'display_name': 'image-%s' % image_id,
+            })
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                QUOTAS.rollback(context, reservations)
+        QUOTAS.commit(context, reservations)
+
+        try:
+            model_update = self.driver.create_cloned_volume(image_volume,
+                                                            volume_ref)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self.db.volume_update(context, image_volume['id'],
+                                      {'status': 'error'})
+        updates = dict(model_update or dict(), status='available',
+                       launched_at=timeutils.utcnow())
+        return self.db.volume_update(context, image_volume['id'], updates)
+
     def _create_raw_volume(self, context, volume_ref, **kwargs):
         return self.driver.create_volume(volume_ref)
 
@@ -706,7 +816,7 @@ def get_flow(context, db, driver, scheduler_rpcapi, host, volume_id,
              allow_reschedule, reschedule_context, request_spec,
              filter_properties, snapshot_id=None, image_id=None,
              source_volid=None, source_replicaid=None,
-             consistencygroup_id=None):
+             consistencygroup_id=None, image_volume_cache=None):
     """Constructs and returns the manager entrypoint flow.
 
     This flow will do the following:
@@ -748,7 +858,8 @@ def get_flow(context, db, driver, scheduler_rpcapi, host, volume_id,
 
     volume_flow.add(ExtractVolumeSpecTask(db),
                     NotifyVolumeActionTask(db, "create.start"),
-                    CreateVolumeFromSpecTask(db, driver),
+                    CreateVolumeFromSpecTask(db, driver,
+                                             image_volume_cache),
                     CreateVolumeOnFinishTask(db, "create.end"))
 
     # Now load (but do not run) the flow using the provided initial data.
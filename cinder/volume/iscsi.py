@@ -111,6 +111,22 @@ class _ExportMixin(object):
                                  old_name=old_name,
                                  write_cache=conf.iscsi_write_cache)
 
+    def ensure_exports(self, context, exports, vg_name, conf):
+        """Recreates the exports of several volumes.
+
+        :param exports: a list of (volume, iscsi_name, volume_path) tuples
+        :returns: a dict of the exceptions raised recreating the exports,
+                  keyed by volume id
+        """
+        failures = {}
+        for volume, iscsi_name, volume_path in exports:
+            try:
+                self.ensure_export(context, volume, iscsi_name, volume_path,
+                                   vg_name, conf)
+            except Exception as ex:
+                failures[volume['id']] = ex
+        return failures
+
     def _ensure_iscsi_targets(self, context, host, max_targets):
         """Ensure that target ids have been created in datastore."""
         # NOTE(jdg): tgtadm doesn't use the iscsi_targets table
@@ -200,7 +216,7 @@ class _ExportMixin(object):
         return old_name
 
 
-class TgtAdm(_ExportMixin, iscsi.TgtAdm):
+class _TgtAdmExportMixin(_ExportMixin):
 
     def _get_target_and_lun(self, context, volume, max_targets):
         lun = 1  # For tgtadm the controller is lun 0, dev starts at lun 1
@@ -213,6 +229,46 @@ class TgtAdm(_ExportMixin, iscsi.TgtAdm):
     def _get_target_for_ensure_export(self, context, volume_id):
         return 1
 
+    def ensure_exports(self, context, exports, vg_name, conf):
+        """Recreates only the exports which are missing from tgtd.
+
+        The targets are listed once, which also loads the target inventory,
+        instead of running tgt-admin twice for every export.
+        """
+        try:
+            targets = self.inventory.refresh()
+        except putils.ProcessExecutionError as ex:
+            LOG.warning(_("Failed to list iSCSI targets, recreating all "
+                          "exports: %s") % ex)
+            targets = {}
+        missing = [export for export in exports
+                   if not self._export_exists(targets, *export)]
+        LOG.debug("Recreating %(missing)d of %(total)d iSCSI exports." %
+                  {'missing': len(missing), 'total': len(exports)})
+        return super(_TgtAdmExportMixin, self).ensure_exports(context,
+                                                              missing,
+                                                              vg_name, conf)
+
+    def _export_exists(self, targets, volume, iscsi_name, volume_path):
+        # The backing store of a volume is LUN 1, LUN 0 is the controller.
+        target = targets.get(iscsi_name)
+        if target is None or 1 not in target['luns']:
+            return False
+        # ensure_export fixes the provider_location of volumes hit by
+        # https://bugs.launchpad.net/cinder/+bug/1065702
+        if (volume['provider_location'] is not None and
+                volume['name'] not in volume['provider_location']):
+            return False
+        # The target is only recreated after a restart of tgtd if its
+        # persistence file exists.
+        persist_file = os.path.join(self.volumes_dir,
+                                    iscsi_name.split(':')[1])
+        return os.path.exists(persist_file)
+
+
+class TgtAdm(_TgtAdmExportMixin, iscsi.TgtAdm):
+    pass
+
 
 class FakeIscsiHelper(_ExportMixin, iscsi.FakeIscsiHelper):
 
@@ -268,14 +324,5 @@ class IetAdm(_ExportMixin, iscsi.IetAdm):
     pass
 
 
-class ISERTgtAdm(_ExportMixin, iscsi.ISERTgtAdm):
-    def _get_target_and_lun(self, context, volume, max_targets):
-        lun = 1  # For tgtadm the controller is lun 0, dev starts at lun 1
-        iscsi_target = 0  # NOTE(jdg): Not used by tgtadm
-        return iscsi_target, lun
-
-    def _get_iscsi_target(self, context, vol_id):
-        return 0
-
-    def _get_target_for_ensure_export(self, context, volume_id):
-        return 1
+class ISERTgtAdm(_TgtAdmExportMixin, iscsi.ISERTgtAdm):
+    pass
@@ -47,6 +47,7 @@ from cinder import context
 from cinder import exception
 from cinder import flow_utils
 from cinder.i18n import _
+from cinder.image import cache as image_cache
 from cinder.image import glance
 from cinder import manager
 from cinder.openstack.common import excutils
@@ -84,6 +85,10 @@ volume_manager_opts = [
                 default=False,
                 help='Offload pending volume delete during '
                      'volume service startup'),
+    cfg.IntOpt('volume_service_inithost_export_workers',
+               default=1,
+               help='Number of green threads recreating the exports of '
+                    'volumes in parallel during volume service startup'),
     cfg.StrOpt('zoning_mode',
                default='none',
                help='FC Zoning mode configured'),
@@ -193,6 +198,23 @@ class VolumeManager(manager.SchedulerDependentManager):
                 LOG.error("Invalid JSON: %s" %
                           self.driver.configuration.extra_capabilities)
 
+        self.image_volume_cache = None
+        if self.driver.configuration.safe_get('image_volume_cache_enabled'):
+            max_cache_size = self.driver.configuration.safe_get(
+                'image_volume_cache_max_size_gb')
+            max_cache_entries = self.driver.configuration.safe_get(
+                'image_volume_cache_max_count')
+            # NOTE: cinder.volume.api imports this module, so the volume
+            # API is loaded by name.
+            volume_api = importutils.import_object(CONF.volume_api_class)
+            self.image_volume_cache = image_cache.ImageVolumeCache(
+                self.db,
+                volume_api,
+                max_cache_size,
+                max_cache_entries)
+            LOG.info(_('Image-volume cache enabled for host %s.') %
+                     self.host)
+
     def _add_to_threadpool(self, func, *args, **kwargs):
         self._tp.spawn_n(func, *args, **kwargs)
 
@@ -237,6 +259,31 @@ class VolumeManager(manager.SchedulerDependentManager):
         self.stats['pools'][pool]['allocated_capacity_gb'] = pool_sum
         self.stats['allocated_capacity_gb'] += volume['size']
 
+    def _ensure_exports(self, ctxt, volumes):
+        """Recreates the exports of volumes, in parallel if configured.
+
+        The volumes are split between at most
+        volume_service_inithost_export_workers green threads of the thread
+        pool, and those which fail to be exported are set to error.
+        """
+        workers = min(CONF.volume_service_inithost_export_workers,
+                      len(volumes))
+        if workers > 1:
+            threads = [self._tp.spawn(self.driver.ensure_exports, ctxt,
+                                      volumes[i::workers])
+                       for i in range(workers)]
+            failures = {}
+            for thread in threads:
+                failures.update(thread.wait())
+        else:
+            failures = self.driver.ensure_exports(ctxt, volumes)
+
+        for volume_id, export_ex in failures.iteritems():
+            LOG.error(_("Failed to re-export volume %(volume_id)s: "
+                        "%(error)s, setting to error state") %
+                      {'volume_id': volume_id, 'error': export_ex})
+            self.db.volume_update(ctxt, volume_id, {'status': 'error'})
+
     def init_host(self):
         """Do any initialization that needs to be run if this is a
            standalone service.
@@ -265,21 +312,13 @@ class VolumeManager(manager.SchedulerDependentManager):
         try:
             self.stats['pools'] = {}
             self.stats.update({'allocated_capacity_gb': 0})
+            export_volumes = []
             for volume in volumes:
                 # available volume should also be counted into allocated
                 if volume['status'] in ['in-use', 'available']:
                     # calculate allocated capacity for driver
                     self._count_allocated_capacity(ctxt, volume)
-
-                    try:
-                        self.driver.ensure_export(ctxt, volume)
-                    except Exception as export_ex:
-                        LOG.error(_("Failed to re-export volume %s: "
-                                    "setting to error state"), volume['id'])
-                        LOG.exception(export_ex)
-                        self.db.volume_update(ctxt,
-                                              volume['id'],
-                                              {'status': 'error'})
+                    export_volumes.append(volume)
                 elif volume['status'] == 'downloading':
                     LOG.info(_("volume %s stuck in a downloading state"),
                              volume['id'])
@@ -289,6 +328,7 @@ class VolumeManager(manager.SchedulerDependentManager):
                                           {'status': 'error'})
                 else:
                     LOG.info(_("volume %s: skipping export"), volume['id'])
+            self._ensure_exports(ctxt, export_volumes)
         except Exception as ex:
             LOG.error(_("Error encountered during "
                         "re-exporting phase of driver initialization: "
@@ -346,7 +386,8 @@ class VolumeManager(manager.SchedulerDependentManager):
                 allow_reschedule=allow_reschedule,
                 reschedule_context=context_saved,
                 request_spec=request_spec,
-                filter_properties=filter_properties)
+                filter_properties=filter_properties,
+                image_volume_cache=self.image_volume_cache)
         except Exception:
             LOG.exception(_("Failed to create manager volume flow"))
             raise exception.CinderException(
@@ -427,6 +468,14 @@ class VolumeManager(manager.SchedulerDependentManager):
             raise exception.InvalidVolume(
                 reason=_("volume is not local to this node"))
 
+        if self.image_volume_cache:
+            # Stop cloning new volumes from a cached image volume which is
+            # being deleted.
+            cache_entry = self.image_volume_cache.get_by_image_volume(
+                context, volume_id)
+            if cache_entry:
+                self.image_volume_cache.evict(context, cache_entry)
+
         self._notify_about_volume_usage(context, volume_ref, "delete.start")
         try:
             # NOTE(flaper87): Verify the driver is enabled
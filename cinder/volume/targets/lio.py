@@ -70,16 +70,16 @@ class LioAdm(TgtAdm):
             LOG.error(_('cinder-rtstool is not installed correctly'))
             raise
 
-    def _get_target(self, iqn):
+    def _get_targets(self):
         (out, err) = self._execute('cinder-rtstool',
                                    'get-targets',
                                    run_as_root=True)
-        lines = out.split('\n')
-        for line in lines:
-            if iqn in line:
-                return line
-
-        return None
+        targets = {}
+        for line in out.split('\n'):
+            line = line.strip()
+            if line:
+                targets[line] = {'tid': line}
+        return targets
 
     def create_iscsi_target(self, name, tid, lun, path,
                             chap_auth=None, **kwargs):
@@ -114,10 +114,14 @@ class LioAdm(TgtAdm):
             LOG.error(_("Failed to create iscsi target for volume "
                         "id:%s.") % vol_id)
             LOG.error(_("%s") % e)
+            self.inventory.invalidate()
 
             raise exception.ISCSITargetCreateFailed(volume_id=vol_id)
 
         iqn = '%s%s' % (self.iscsi_target_prefix, vol_id)
+        # rtstool names the target after the iqn, and fails if it can't
+        # create it.
+        self.inventory.add(iqn, {'tid': iqn})
         tid = self._get_target(iqn)
         if tid is None:
             LOG.error(_("Failed to create iscsi target for volume "
@@ -140,7 +144,9 @@ class LioAdm(TgtAdm):
             LOG.error(_("Failed to remove iscsi target for volume "
                         "id:%s.") % vol_id)
             LOG.error(_("%s") % e)
+            self.inventory.invalidate()
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
+        self.inventory.remove(iqn)
 
     def show_target(self, tid, iqn=None, **kwargs):
         if iqn is None:
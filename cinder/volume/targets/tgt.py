@@ -14,6 +14,7 @@
 import os
 import time
 
+from cinder.brick.iscsi import iscsi as brick_iscsi
 from cinder import exception
 from cinder.openstack.common import fileutils
 from cinder.openstack.common.gettextutils import _
@@ -50,38 +51,76 @@ class TgtAdm(iscsi.ISCSITarget):
     def __init__(self, *args, **kwargs):
         super(TgtAdm, self).__init__(*args, **kwargs)
         self.volumes_dir = self.configuration.safe_get('volumes_dir')
+        self.inventory = brick_iscsi.TargetInventory(self._get_targets)
 
     def _get_target(self, iqn):
-        (out, err) = self._execute('tgt-admin', '--show', run_as_root=True)
-        lines = out.split('\n')
-        for line in lines:
-            if iqn in line:
-                parsed = line.split()
-                tid = parsed[1]
-                return tid[:-1]
+        target = self.inventory.get(iqn)
+        if target is None:
+            return None
+        return target['tid']
 
-        return None
-
-    def _verify_backing_lun(self, iqn, tid):
-        backing_lun = True
-        capture = False
-        target_info = []
+    def _get_targets(self):
+        """Return the tid and LUNs of every target, from a single listing.
 
+        :returns: a dict of {'tid': tid, 'luns': [LUN numbers]} for each
+                  target, keyed by iqn
+        """
         (out, err) = self._execute('tgt-admin', '--show', run_as_root=True)
-        lines = out.split('\n')
-
-        for line in lines:
-            if iqn in line and "Target %s" % tid in line:
-                capture = True
-            if capture:
-                target_info.append(line)
-            if iqn not in line and 'Target ' in line:
-                capture = False
-
-        if '        LUN: 1' not in target_info:
-            backing_lun = False
+        return self._parse_targets(out)
+
+    @staticmethod
+    def _parse_targets(out):
+        targets = {}
+        luns = None
+        for line in out.split('\n'):
+            if line.startswith('Target '):
+                parsed = line.split()
+                luns = []
+                targets[parsed[2]] = {'tid': parsed[1][:-1], 'luns': luns}
+            elif luns is not None and line.strip().startswith('LUN: '):
+                luns.append(int(line.split(':')[1]))
+        return targets
+
+    def _target_exists(self, iqn, tid):
+        """Check if target tid is still iqn, without listing all targets."""
+        try:
+            (out, err) = self._execute('tgtadm', '--lld', 'iscsi',
+                                       '--op', 'show', '--mode', 'target',
+                                       '--tid', tid, run_as_root=True)
+        except putils.ProcessExecutionError:
+            return False
+        return iqn in out
+
+    def _get_new_target(self, iqn):
+        """Return the tid of the target tgt-admin --update made for iqn.
+
+        tgt-admin gives a new target the tid after the highest one, so
+        once the targets are listed only that target is shown and added
+        to the inventory, rather than listing all of them again.
+        """
+        targets = self.inventory.cached()
+        if targets is not None:
+            if iqn in targets:
+                return targets[iqn]['tid']
+            tids = [int(target['tid']) for target in targets.values()]
+            tid = str(max(tids or [0]) + 1)
+            try:
+                (out, err) = self._execute('tgtadm', '--lld', 'iscsi',
+                                           '--op', 'show', '--mode',
+                                           'target', '--tid', tid,
+                                           run_as_root=True)
+            except putils.ProcessExecutionError:
+                out = ''
+            target = self._parse_targets(out).get(iqn)
+            if target is not None:
+                self.inventory.add(iqn, target)
+                return tid
+        return self._get_target(iqn)
 
-        return backing_lun
+    def _verify_backing_lun(self, iqn, tid):
+        target = self.inventory.get(iqn)
+        return (target is not None and target['tid'] == tid and
+                1 in target['luns'])
 
     def _recreate_backing_lun(self, iqn, tid, name, path):
         LOG.warning(_('Attempting recreate of backing lun...'))
@@ -105,6 +144,9 @@ class TgtAdm(iscsi.ISCSITarget):
                         "iscsi backing lun for volume "
                         "id:%(vol_id)s: %(e)s")
                       % {'vol_id': name, 'e': e})
+        finally:
+            # The LUNs of the target changed, or failed to.
+            self.inventory.invalidate()
 
     def _iscsi_location(self, ip, target, iqn, lun=None):
         return "%s:%s,%s %s %s" % (ip, self.configuration.iscsi_port,
@@ -191,30 +233,18 @@ class TgtAdm(iscsi.ISCSITarget):
                                        run_as_root=True)
             LOG.debug("StdOut from tgt-admin --update: %s", out)
             LOG.debug("StdErr from tgt-admin --update: %s", err)
-
-            # Grab targets list for debug
-            # Consider adding a check for lun 0 and 1 for tgtadm
-            # before considering this as valid
-            (out, err) = self._execute('tgtadm',
-                                       '--lld',
-                                       'iscsi',
-                                       '--op',
-                                       'show',
-                                       '--mode',
-                                       'target',
-                                       run_as_root=True)
-            LOG.debug("Targets after update: %s" % out)
         except putils.ProcessExecutionError as e:
             LOG.warning(_("Failed to create iscsi target for volume "
                         "id:%(vol_id)s: %(e)s")
                         % {'vol_id': vol_id, 'e': e})
+            self.inventory.invalidate()
 
             #Don't forget to remove the persistent file we created
             os.unlink(volume_path)
             raise exception.ISCSITargetCreateFailed(volume_id=vol_id)
 
         iqn = '%s%s' % (self.iscsi_target_prefix, vol_id)
-        tid = self._get_target(iqn)
+        tid = self._get_new_target(iqn)
         if tid is None:
             LOG.error(_("Failed to create iscsi target for volume "
                         "id:%(vol_id)s. Please ensure your tgtd config file "
@@ -228,6 +258,10 @@ class TgtAdm(iscsi.ISCSITarget):
         # or something related, so we're going to add some code
         # here that verifies the backing lun (lun 1) was created
         # and we'll try and recreate it if it's not there
+        if not self._verify_backing_lun(iqn, tid):
+            # The target may have been listed before the update added the
+            # backing lun to it.
+            self.inventory.invalidate()
         if not self._verify_backing_lun(iqn, tid):
             try:
                 self._recreate_backing_lun(iqn, tid, name, path)
@@ -314,6 +348,7 @@ class TgtAdm(iscsi.ISCSITarget):
                             vol_uuid_file)
         else:
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
+        tid = self._get_target(iqn)
         try:
             # NOTE(vish): --force is a workaround for bug:
             #             https://bugs.launchpad.net/cinder/+bug/1159948
@@ -326,7 +361,10 @@ class TgtAdm(iscsi.ISCSITarget):
             LOG.error(_("Failed to remove iscsi target for volume "
                         "id:%(vol_id)s: %(e)s")
                       % {'vol_id': vol_id, 'e': e})
+            self.inventory.invalidate()
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
+        self.inventory.remove(iqn)
+
         # NOTE(jdg): There's a bug in some versions of tgt that
         # will sometimes fail silently when using the force flag
         #    https://bugs.launchpad.net/ubuntu/+source/tgt/+bug/1305343
@@ -337,7 +375,7 @@ class TgtAdm(iscsi.ISCSITarget):
         # which the force was aded for but it will however address
         # the cases pointed out in bug:
         #    https://bugs.launchpad.net/cinder/+bug/1304122
-        if self._get_target(iqn):
+        if tid is not None and self._target_exists(iqn, tid):
             try:
                 LOG.warning(_('Silent failure of target removal '
                               'detected, retry....'))
@@ -349,6 +387,7 @@ class TgtAdm(iscsi.ISCSITarget):
                 LOG.error(_("Failed to remove iscsi target for volume "
                             "id:%(vol_id)s: %(e)s")
                           % {'vol_id': vol_id, 'e': e})
+                self.inventory.invalidate()
                 raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
 
         # NOTE(jdg): This *should* be there still but incase
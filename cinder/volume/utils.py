@@ -15,9 +15,18 @@
 """Volume-related Utilities and helpers."""
 
 
+import ctypes
+import errno
+import fcntl
+import io
 import math
+import os
+import stat
+import time
 
 from Crypto.Random import random
+from eventlet import greenthread
+from eventlet import tpool
 from oslo.config import cfg
 
 from cinder.brick.local_dev import lvm as brick_lvm
@@ -36,6 +45,24 @@ CONF = cfg.CONF
 
 LOG = logging.getLogger(__name__)
 
+# lseek() whence values for finding data and holes in sparse files, which
+# the os module of Python 2 does not define.
+SEEK_DATA = 3
+SEEK_HOLE = 4
+
+# Alignment of the buffers, offsets and lengths of O_DIRECT I/O.
+DIRECT_IO_ALIGNMENT = 4096
+
+# Smallest buffer used by the native copy engine.
+NATIVE_COPY_BUFFER_SIZE = 4 * units.Mi
+
+# Seconds between progress reports of the native copy engine.
+COPY_PROGRESS_INTERVAL = 10
+
+# Whether O_DIRECT works, keyed by the kind of I/O and the device class of
+# the path it was checked on.
+_odirect_support = {}
+
 
 def null_safe_str(s):
     return str(s) if s else ''
@@ -285,18 +312,53 @@ def _calculate_count(size_in_m, blocksize):
     return blocksize, int(count)
 
 
-def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
-                execute=utils.execute, ionice=None):
+def _odirect_cache_key(path):
+    """Return the key of the device class of path, or None if unknown.
+
+    Devices are classed by their type and major number, files by the
+    filesystem they are on.
+    """
+    try:
+        path_stat = os.stat(path)
+    except OSError:
+        return None
+    if stat.S_ISBLK(path_stat.st_mode) or stat.S_ISCHR(path_stat.st_mode):
+        return (stat.S_IFMT(path_stat.st_mode), os.major(path_stat.st_rdev))
+    return ('fs', path_stat.st_dev)
+
+
+def check_for_odirect_support(src, dest, flag='oflag=direct',
+                              execute=utils.execute):
+    """Return whether dd can copy from src to dest with flag.
+
+    The result is cached for the device class of the path the flag applies
+    to, so that dd is only run for the first copy on each class.
+    """
+    path = src if flag == 'iflag=direct' else dest
+    key = _odirect_cache_key(path)
+    if key is not None and (flag, key) in _odirect_support:
+        return _odirect_support[(flag, key)]
+
+    try:
+        execute('dd', 'count=0', 'if=%s' % src, 'of=%s' % dest,
+                flag, run_as_root=True)
+        supported = True
+    except processutils.ProcessExecutionError:
+        supported = False
+
+    if key is not None:
+        _odirect_support[(flag, key)] = supported
+    return supported
+
+
+def _copy_volume_with_dd(srcstr, deststr, size_in_m, blocksize, sync,
+                         execute, ionice):
     # Use O_DIRECT to avoid thrashing the system buffer cache
     extra_flags = []
     # Check whether O_DIRECT is supported to iflag and oflag separately
     for flag in ['iflag=direct', 'oflag=direct']:
-        try:
-            execute('dd', 'count=0', 'if=%s' % srcstr, 'of=%s' % deststr,
-                    flag, run_as_root=True)
+        if check_for_odirect_support(srcstr, deststr, flag, execute):
             extra_flags.append(flag)
-        except processutils.ProcessExecutionError:
-            pass
 
     # If the volume is being unprovisioned then
     # request the data is persisted before returning,
@@ -317,9 +379,242 @@ def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
     if cgcmd:
         cmd = cgcmd + cmd
 
-    # Perform the copy
-    start_time = timeutils.utcnow()
     execute(*cmd, run_as_root=True)
+
+
+class CopyRateLimiter(object):
+    """Limits the average rate of a copy to bps_limit bytes per second.
+
+    The native copy engine calls throttle() with the number of bytes it
+    has just copied.  Any object with such a method can be passed to
+    copy_volume() instead.
+    """
+
+    def __init__(self, bps_limit):
+        self.bps_limit = bps_limit
+        self._start_time = None
+        self._copied = 0
+
+    def throttle(self, nbytes):
+        now = time.time()
+        if self._start_time is None:
+            self._start_time = now
+        self._copied += nbytes
+        delay = (self._copied / float(self.bps_limit) -
+                 (now - self._start_time))
+        if delay > 0:
+            greenthread.sleep(delay)
+
+
+def _aligned_buffer(size):
+    """Return a writable buffer of size bytes aligned for O_DIRECT I/O."""
+    raw = bytearray(size + DIRECT_IO_ALIGNMENT)
+    address = ctypes.addressof(ctypes.c_char.from_buffer(raw))
+    start = -address % DIRECT_IO_ALIGNMENT
+    return memoryview(raw)[start:start + size]
+
+
+def _align_up(value):
+    return value + (-value % DIRECT_IO_ALIGNMENT)
+
+
+def _open_for_copy(path, flags):
+    """Open path for copying, with O_DIRECT if its device class allows."""
+    key = ('O_DIRECT', _odirect_cache_key(path))
+    if _odirect_support.get(key, True):
+        try:
+            return os.open(path, flags | os.O_DIRECT)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            LOG.debug('O_DIRECT is not supported for %s' % path)
+            _odirect_support[key] = False
+    return os.open(path, flags)
+
+
+def _disable_odirect(fd):
+    """Turn off O_DIRECT for fd, returning whether it was on."""
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    if not flags & os.O_DIRECT:
+        return False
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+    return True
+
+
+def _direct_io(io_method, path, fd, data):
+    """Run a read or write of data, retrying without O_DIRECT on EINVAL.
+
+    Some filesystems accept O_DIRECT when opening files but fail the I/O.
+    """
+    try:
+        return tpool.execute(io_method, data)
+    except (IOError, OSError) as e:
+        if e.errno != errno.EINVAL or not _disable_odirect(fd):
+            raise
+    LOG.debug('O_DIRECT I/O failed for %s, retrying buffered' % path)
+    _odirect_support[('O_DIRECT', _odirect_cache_key(path))] = False
+    return tpool.execute(io_method, data)
+
+
+def _find_data(fd, offset):
+    """Return the (start, end) offsets of the next data at or after offset.
+
+    Returns None if there is no more data, and raises OSError if the file
+    does not support looking for holes.
+    """
+    try:
+        start = os.lseek(fd, offset, SEEK_DATA)
+    except OSError as e:
+        if e.errno == errno.ENXIO:
+            return None
+        raise
+    return start, os.lseek(fd, start, SEEK_HOLE)
+
+
+def _copy_volume_native(srcstr, deststr, src_fd, dest_fd, size_in_bytes,
+                        buffer_size, sync=False, sparse=False,
+                        rate_limiter=None, progress_callback=None):
+    """Copy size_in_bytes bytes from src_fd to dest_fd in this process.
+
+    Like dd, the copy stops early at the end of a regular source file.
+    Holes in regular source files are skipped instead of being copied as
+    zeroes when the destination is a regular file, which was truncated on
+    opening, or when sparse is set because the caller knows the
+    destination reads back as zeroes.  Returns the number of bytes copied.
+    """
+    reader = io.FileIO(src_fd, 'r', closefd=False)
+    writer = io.FileIO(dest_fd, 'w', closefd=False)
+    buf = _aligned_buffer(buffer_size)
+
+    src_stat = os.fstat(src_fd)
+    dest_is_file = stat.S_ISREG(os.fstat(dest_fd).st_mode)
+    total = size_in_bytes
+    skip_holes = False
+    if stat.S_ISREG(src_stat.st_mode):
+        total = min(total, src_stat.st_size)
+        skip_holes = sparse or dest_is_file
+
+    start_time = last_report = time.time()
+    offset = 0
+    copied = 0
+    hole_at_end = False
+    while offset < total:
+        end = total
+        if skip_holes:
+            try:
+                extent = _find_data(src_fd, offset)
+            except OSError:
+                LOG.debug('%s does not support finding holes' % srcstr)
+                skip_holes = False
+            else:
+                data_start = total
+                if extent is not None:
+                    data_start = offset + (extent[0] - offset) // \
+                        DIRECT_IO_ALIGNMENT * DIRECT_IO_ALIGNMENT
+                    end = min(total, _align_up(extent[1]))
+                if data_start >= total:
+                    hole_at_end = True
+                    break
+                if data_start != offset:
+                    offset = data_start
+                    os.lseek(dest_fd, offset, os.SEEK_SET)
+                # Looking for data and holes moves the file position.
+                os.lseek(src_fd, offset, os.SEEK_SET)
+
+        length = min(buffer_size, end - offset)
+        nread = _direct_io(reader.readinto, srcstr, src_fd,
+                           buf[:min(buffer_size, _align_up(length))])
+        if not nread:
+            break
+        nread = min(nread, length)
+        if nread % DIRECT_IO_ALIGNMENT:
+            _disable_odirect(dest_fd)
+        written = 0
+        while written < nread:
+            written += _direct_io(writer.write, deststr, dest_fd,
+                                  buf[written:nread])
+        if reader.tell() != offset + nread:
+            # More than length bytes were read to keep O_DIRECT aligned.
+            os.lseek(src_fd, offset + nread, os.SEEK_SET)
+        offset += nread
+        copied += nread
+
+        if rate_limiter is not None:
+            rate_limiter.throttle(nread)
+        now = time.time()
+        if now - last_report >= COPY_PROGRESS_INTERVAL:
+            last_report = now
+            LOG.debug('Copied %(copied)d of %(total)d bytes from %(src)s to '
+                      '%(dest)s at %(rate).2f MB/s' %
+                      {'copied': offset, 'total': total, 'src': srcstr,
+                       'dest': deststr,
+                       'rate': copied / units.Mi / (now - start_time)})
+            if progress_callback is not None:
+                progress_callback(offset, total)
+
+    if hole_at_end and dest_is_file:
+        os.ftruncate(dest_fd, total)
+    if sync:
+        tpool.execute(os.fdatasync, dest_fd)
+    if progress_callback is not None:
+        progress_callback(total, total)
+    return copied
+
+
+def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
+                execute=utils.execute, ionice=None, sparse=False,
+                rate_limiter=None, progress_callback=None):
+    """Copy size_in_m MiB from srcstr to deststr.
+
+    With volume_copy_engine set to native, the copy runs in this process
+    when it can open both paths and no ionice class is requested, and
+    falls back to dd otherwise.  sparse, rate_limiter and
+    progress_callback only apply to native copies, see
+    _copy_volume_native; dd copies are rate limited with a blkio cgroup.
+    """
+    engine = CONF.volume_copy_engine
+    if engine not in ('dd', 'native'):
+        raise exception.InvalidConfigurationValue(
+            option='volume_copy_engine',
+            value=engine)
+
+    start_time = timeutils.utcnow()
+    fds = None
+    if engine == 'native' and ionice is None:
+        try:
+            fds = [_open_for_copy(srcstr, os.O_RDONLY)]
+            fds.append(_open_for_copy(deststr,
+                                      os.O_WRONLY | os.O_CREAT | os.O_TRUNC))
+        except OSError as e:
+            for fd in fds or []:
+                os.close(fd)
+            fds = None
+            if e.errno not in (errno.EACCES, errno.EPERM):
+                raise
+            LOG.debug('Cannot open %(src)s and %(dest)s for copying, '
+                      'using dd: %(err)s' %
+                      {'src': srcstr, 'dest': deststr, 'err': e})
+
+    # Perform the copy
+    if fds is not None:
+        blocksize, count = _calculate_count(size_in_m, blocksize)
+        buffer_size = _align_up(max(NATIVE_COPY_BUFFER_SIZE,
+                                    strutils.string_to_bytes(
+                                        '%sB' % blocksize, return_int=True)))
+        if rate_limiter is None and CONF.volume_copy_bps_limit:
+            rate_limiter = CopyRateLimiter(CONF.volume_copy_bps_limit)
+        try:
+            _copy_volume_native(srcstr, deststr, fds[0], fds[1],
+                                int(size_in_m * units.Mi), buffer_size,
+                                sync=sync, sparse=sparse,
+                                rate_limiter=rate_limiter,
+                                progress_callback=progress_callback)
+        finally:
+            for fd in fds:
+                os.close(fd)
+    else:
+        _copy_volume_with_dd(srcstr, deststr, size_in_m, blocksize, sync,
+                             execute, ionice)
     duration = timeutils.delta_seconds(start_time, timeutils.utcnow())
 
     # NOTE(jdg): use a default of 1, mostly for unit test, but in
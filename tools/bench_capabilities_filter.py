@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Microbenchmark for the CapabilitiesFilter.
+
+Measures the per-host cost of checking a volume type with 20 extra specs
+against 1000 pools, once parsing the extra specs for every host (the way
+the filter used to work) and once with the compiled extra specs.
+
+    python tools/bench_capabilities_filter.py [--specs N] [--pools N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from cinder.openstack.common.scheduler.filters import capabilities_filter
+from cinder.openstack.common.scheduler.filters import extra_specs_ops
+
+
+class FakeHost(object):
+    def __init__(self, capabilities):
+        self.capabilities = capabilities
+
+
+# (requirement, matching capability value) templates
+_SPECS = [('>= %d', lambda i: i),
+          ('<= %d', lambda i: i),
+          ('== %d', lambda i: str(i)),
+          ('<is> True', lambda i: 'true'),
+          ('s== val%d', lambda i: 'val%d' % i),
+          ('<or> val%d <or> other', lambda i: 'val%d' % i),
+          ('<in> al', lambda i: 'val%d' % i),
+          ('val%d', lambda i: 'val%d' % i)]
+
+
+def _make_specs(count):
+    extra_specs = {}
+    capabilities = {'scoped': {}}
+    for i in range(count):
+        template, value = _SPECS[i % len(_SPECS)]
+        req = template % i if '%d' in template else template
+        # Alternate between top level and scoped capabilities.
+        if i % 2:
+            extra_specs['capabilities:scoped:opt%d' % i] = req
+            capabilities['scoped']['opt%d' % i] = value(i)
+        else:
+            extra_specs['opt%d' % i] = req
+            capabilities['opt%d' % i] = value(i)
+    return extra_specs, capabilities
+
+
+def _legacy_satisfies(capabilities, extra_specs):
+    """The uncompiled check, parsing every spec for every host."""
+    for key, req in extra_specs.iteritems():
+        scope = key.split(':')
+        if len(scope) > 1 and scope[0] != "capabilities":
+            continue
+        elif scope[0] == "capabilities":
+            del scope[0]
+        cap = capabilities
+        for index in range(len(scope)):
+            try:
+                cap = cap.get(scope[index], None)
+            except AttributeError:
+                return False
+            if cap is None:
+                return False
+        if not extra_specs_ops.match(cap, req):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--specs', type=int, default=20)
+    parser.add_argument('--pools', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    extra_specs, capabilities = _make_specs(args.specs)
+    hosts = [FakeHost(dict(capabilities)) for i in range(args.pools)]
+    resource_type = {'id': 'bench', 'updated_at': None,
+                     'extra_specs': extra_specs}
+    filter_properties = {'resource_type': resource_type}
+    filter_cls = capabilities_filter.CapabilitiesFilter
+
+    def legacy():
+        passed = [h for h in hosts
+                  if _legacy_satisfies(h.capabilities, extra_specs)]
+        assert len(passed) == args.pools
+
+    def compiled():
+        passed = list(filter_cls().filter_all(hosts, filter_properties))
+        assert len(passed) == args.pools
+
+    for name, func in (('legacy', legacy), ('compiled', compiled)):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('%-9s %8.2f ms/request %8.2f us/host' %
+              (name, best * 1000, best * 1e6 / args.pools))
+
+
+if __name__ == '__main__':
+    main()